@@ -0,0 +1,132 @@
+"""
+announcement.py -- Udacity conference server-side Python App Engine
+    incrementally maintained "nearly sold out" announcement
+
+    the conferences with 0 < seats <= ANNOUNCEMENT_SEATS_THRESHOLD are kept
+    in a single NearlySoldOut entity, updated when a registration or an
+    unregistration makes a conference cross the threshold; the announcement
+    text is cached in memcache and rebuilt from the entity on a miss, the
+    cron only reconciles the set one page of conferences at a time
+"""
+
+from google.appengine.api import memcache
+from google.appengine.api import taskqueue
+from google.appengine.datastore.datastore_query import Cursor
+from google.appengine.ext import ndb
+
+from models import Conference
+from settings import ANNOUNCEMENT_TPL
+from settings import ANNOUNCEMENT_SEATS_THRESHOLD
+from settings import ANNOUNCEMENT_BATCH
+from settings import MEMCACHE_ANNOUNCEMENTS_KEY
+
+import seat_counter
+
+
+class NearlySoldOut(ndb.Model):
+
+    '''NearlySoldOut -- the conferences that are nearly sold out and their
+    names, in the same order'''
+    conferences = ndb.KeyProperty(kind='Conference', repeated=True,
+                                  indexed=False)
+    names = ndb.StringProperty(repeated=True, indexed=False)
+
+    def announcement(self):
+        ''' returns the announcement text, empty if there are none '''
+        if not self.names:
+            return ""
+        return ANNOUNCEMENT_TPL % ', '.join(self.names)
+
+
+_KEY = ndb.Key(NearlySoldOut, 'announcement')
+
+
+def is_nearly_sold_out(seats):
+    return 0 < seats <= ANNOUNCEMENT_SEATS_THRESHOLD
+
+
+def _cache(nearly_sold_out):
+    ''' sets the announcement in memcache, an empty announcement is cached
+    too so getAnnouncement doesn't go to the datastore for it '''
+    text = nearly_sold_out.announcement()
+    memcache.set(MEMCACHE_ANNOUNCEMENTS_KEY, text)
+    return text
+
+
+@ndb.transactional()
+def _apply(changes):
+    ''' applies changes, a dict of conference key -> name or None (to
+    remove), returns the entity '''
+    nearly_sold_out = _KEY.get() or NearlySoldOut(key=_KEY)
+    current = dict(zip(nearly_sold_out.conferences, nearly_sold_out.names))
+    before = dict(current)
+    for conf_key, name in changes.items():
+        if name is None:
+            current.pop(conf_key, None)
+        else:
+            current[conf_key] = name
+    if current == before:
+        return nearly_sold_out
+    nearly_sold_out.conferences = current.keys()
+    nearly_sold_out.names = [current[key] for key in nearly_sold_out.conferences]
+    nearly_sold_out.put()
+    return nearly_sold_out
+
+
+def _update(conf, seats):
+    nearly_sold_out = _KEY.get() or NearlySoldOut(key=_KEY)
+    names = dict(zip(nearly_sold_out.conferences, nearly_sold_out.names))
+    if is_nearly_sold_out(seats):
+        if names.get(conf.key) == conf.name:
+            return
+        _cache(_apply({conf.key: conf.name}))
+    elif conf.key in names:
+        _cache(_apply({conf.key: None}))
+
+
+def update(conf, seats, before=None):
+    ''' called when the seats of conf changed to seats, the announcement
+    is only written when the conference crossed the threshold (or was
+    renamed while in it); inside a transaction this waits for the commit.
+    With before, the seats before the change, nothing is read or written
+    unless the conference crossed the threshold: most seat changes don't '''
+    if before is not None and \
+            is_nearly_sold_out(before) == is_nearly_sold_out(seats):
+        return
+    ndb.get_context().call_on_commit(
+        ndb.non_transactional(lambda: _update(conf, seats)))
+
+
+def get_announcement():
+    ''' returns the announcement text, from memcache or else from the
+    datastore (putting it back in memcache) '''
+    text = memcache.get(MEMCACHE_ANNOUNCEMENTS_KEY)
+    if text is None:
+        text = _cache(_KEY.get() or NearlySoldOut(key=_KEY))
+    return text
+
+
+def reconcile(cursor=None):
+    ''' checks one page of conferences against their seat counters and
+    fixes the set, chains a task for the next page; conferences that no
+    longer exist are dropped with the first page '''
+    conferences, next_cursor, more = Conference.query().fetch_page(
+        ANNOUNCEMENT_BATCH,
+        start_cursor=Cursor(urlsafe=cursor) if cursor else None)
+    seats = seat_counter.seats_available_multi(conferences)
+    changes = dict(
+        (conf.key, conf.name if is_nearly_sold_out(conf_seats) else None)
+        for conf, conf_seats in zip(conferences, seats))
+
+    if not cursor:
+        nearly_sold_out = _KEY.get()
+        if nearly_sold_out:
+            existing = ndb.get_multi(nearly_sold_out.conferences)
+            changes.update((key, None) for key, conf in zip(
+                nearly_sold_out.conferences, existing) if conf is None)
+
+    text = _cache(_apply(changes))
+    if more and next_cursor:
+        taskqueue.add(params={'cursor': next_cursor.urlsafe()},
+                      url='/tasks/reconcile_announcement')
+    return text
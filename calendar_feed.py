@@ -0,0 +1,232 @@
+"""
+calendar_feed.py -- Udacity conference server-side Python App Engine
+    iCalendar (.ics) feed of the conferences a user attends and of the
+    sessions in their wish list
+
+    calendar clients can't sign in, so the feed URL carries the profile key
+    and a secret stored on the Profile; the feed is written event by event
+    from batched fetches and never held as a whole document. Each feed has
+    a memcache entry with its secret and a digest of its items, which with
+    a generation bumped whenever a conference or a session changes makes
+    the ETag: a client polling an unchanged feed costs one memcache call
+"""
+
+import hashlib
+import hmac
+import time
+from datetime import datetime
+from datetime import timedelta
+from email.utils import formatdate
+
+from google.appengine.api import app_identity
+from google.appengine.api import memcache
+from google.appengine.ext import ndb
+from google.net.proto.ProtocolBuffer import ProtocolBufferDecodeError
+
+from settings import CALENDAR_BATCH
+from settings import CALENDAR_FEED_TIMEOUT
+from settings import MEMCACHE_CALENDAR_KEY
+from settings import MEMCACHE_CALENDAR_GENERATION_KEY
+
+import entity_cache
+import utils
+
+# content lines are folded at 75 octets, continuation lines start with a space
+_LINE_LENGTH = 75
+# how long a dropped entry can't be put back, so a reader that fetched the
+# items before the change can't cache them again
+_INVALIDATE_LOCK = 10
+
+
+def feed_url(prof):
+    ''' returns the URL of the feed of prof, which must have a secret '''
+    return 'https://%s/calendar/%s/%s.ics' % (
+        app_identity.get_default_version_hostname(), prof.key.urlsafe(),
+        prof.calendarSecret)
+
+
+def _entry_key(p_key):
+    return MEMCACHE_CALENDAR_KEY % p_key.urlsafe()
+
+
+def invalidate(p_key):
+    ''' the conferences or the wish list of p_key changed, drops the entry
+    of its feed once the current transaction commits '''
+    ndb.get_context().call_on_commit(lambda: memcache.delete(
+        _entry_key(p_key), seconds=_INVALIDATE_LOCK))
+
+
+def bump():
+    ''' a conference or a session changed, gives every feed a new ETag once
+    the current transaction commits (right away outside of one) '''
+    def set_generation():
+        memcache.set(MEMCACHE_CALENDAR_GENERATION_KEY, time.time())
+    ndb.get_context().call_on_commit(set_generation)
+
+
+def _items(prof):
+    ''' returns the sorted conference keys and session keys of the feed of
+    prof; a wish list item is keyed by the websafe key of its item '''
+    conferences = sorted(ndb.Key(urlsafe=wsck)
+                         for wsck in prof.conferenceKeysToAttend)
+    sessions = set(
+        ndb.Key(urlsafe=item_key.id()) for item_key in
+        ndb.Query(kind='WishListItem', ancestor=prof.key).iter(keys_only=True))
+    # not moved to WishListItem yet, see ApiHelper._moveWishList
+    if prof.wishList is not None:
+        sessions.update(prof.wishList.sessions)
+    return conferences, sorted(key for key in sessions
+                               if key.kind() == 'ConferenceSession')
+
+
+def _digest(items):
+    conferences, sessions = items
+    return hashlib.md5('\n'.join(
+        key.urlsafe() for key in conferences + sessions)).hexdigest()
+
+
+def lookup(websafe_profile_key, secret):
+    ''' returns (etag, last modified timestamp, items) of a feed, items is
+    None when the entry came from memcache (events() fetches them then);
+    returns None if there's no such feed or the secret doesn't match '''
+    try:
+        p_key = ndb.Key(urlsafe=websafe_profile_key)
+    except (ProtocolBufferDecodeError, TypeError):
+        return None
+    if p_key.kind() != 'Profile':
+        return None
+
+    entry_key = _entry_key(p_key)
+    cached = memcache.get_multi([entry_key, MEMCACHE_CALENDAR_GENERATION_KEY])
+    generation = cached.get(MEMCACHE_CALENDAR_GENERATION_KEY)
+    if generation is None:
+        # evicted, start a new one: every feed is sent once more
+        generation = time.time()
+        if not memcache.add(MEMCACHE_CALENDAR_GENERATION_KEY, generation):
+            generation = memcache.get(
+                MEMCACHE_CALENDAR_GENERATION_KEY) or generation
+
+    entry = cached.get(entry_key)
+    items = None
+    if entry is None:
+        prof = p_key.get()
+        if prof is None or not prof.calendarSecret:
+            return None
+        items = _items(prof)
+        entry = {'secret': str(prof.calendarSecret),
+                 'digest': _digest(items),
+                 'modified': time.time()}
+        memcache.add(entry_key, entry, time=CALENDAR_FEED_TIMEOUT)
+
+    if not hmac.compare_digest(entry['secret'], str(secret)):
+        return None
+    etag = '"%s-%d"' % (entry['digest'], int(generation * 1000))
+    return etag, max(entry['modified'], generation), items
+
+
+def _escape(text):
+    ''' escapes a TEXT value '''
+    return (text or u'').replace(u'\\', u'\\\\').replace(
+        u';', u'\\;').replace(u',', u'\\,').replace(
+        u'\r\n', u'\\n').replace(u'\n', u'\\n')
+
+
+def _line(name, value):
+    ''' returns a content line as utf-8, folded without splitting a
+    multibyte character '''
+    line = (u'%s:%s' % (name, value)).encode('utf-8')
+    folded = []
+    while len(line) > _LINE_LENGTH:
+        cut = _LINE_LENGTH - (1 if folded else 0)
+        while ord(line[cut]) & 0xC0 == 0x80:
+            cut -= 1
+        folded.append(line[:cut])
+        line = line[cut:]
+    folded.append(line)
+    return '\r\n '.join(folded) + '\r\n'
+
+
+def _event(key, stamp, start, end, summary, location, description):
+    return ''.join((
+        'BEGIN:VEVENT\r\n',
+        _line('UID', u'%s@%s' % (key.urlsafe(),
+                                 app_identity.get_application_id())),
+        _line('DTSTAMP', stamp),
+        _line(start[0], start[1]),
+        _line(end[0], end[1]),
+        _line('SUMMARY', _escape(summary)),
+        _line('LOCATION', _escape(location)),
+        _line('DESCRIPTION', _escape(description)),
+        'END:VEVENT\r\n'))
+
+
+def _conference_event(conf, stamp):
+    ''' a conference is an all day event, DTEND is the day after it ends '''
+    end = (conf.endDate or conf.startDate) + timedelta(days=1)
+    return _event(conf.key, stamp,
+                  ('DTSTART;VALUE=DATE', conf.startDate.strftime('%Y%m%d')),
+                  ('DTEND;VALUE=DATE', end.strftime('%Y%m%d')),
+                  conf.name, conf.city, conf.description)
+
+
+def _session_event(sess, conf, speaker, stamp):
+    ''' session times are local to the conference, written as floating
+    times '''
+    start = utils.combine_date(sess.startDate, sess.startTime)
+    end = start + timedelta(minutes=sess.duration)
+    location = u', '.join(value for value in (
+        conf and conf.name, conf and conf.city) if value)
+    description = u'\n\n'.join(value for value in (
+        speaker and speaker.displayName, sess.highlights) if value)
+    return _event(sess.key, stamp,
+                  ('DTSTART', start.strftime('%Y%m%dT%H%M%S')),
+                  ('DTEND', end.strftime('%Y%m%dT%H%M%S')),
+                  sess.name, location, description)
+
+
+def _batches(keys):
+    for i in xrange(0, len(keys), CALENDAR_BATCH):
+        yield keys[i:i + CALENDAR_BATCH]
+
+
+def events(p_key, items=None):
+    ''' yields the feed of p_key one batch of CALENDAR_BATCH conferences or
+    sessions at a time, use it as the app_iter of the response; deleted
+    conferences and sessions are left out '''
+    if items is None:
+        prof = p_key.get()
+        items = _items(prof) if prof else ([], [])
+    conferences, sessions = items
+    stamp = datetime.utcnow().strftime('%Y%m%dT%H%M%SZ')
+
+    yield ('BEGIN:VCALENDAR\r\n'
+           'VERSION:2.0\r\n'
+           'PRODID:-//%s//Conference Central//EN\r\n'
+           'CALSCALE:GREGORIAN\r\n'
+           'X-WR-CALNAME:Conference Central\r\n' %
+           app_identity.get_application_id())
+
+    for batch in _batches(conferences):
+        yield ''.join(_conference_event(conf, stamp)
+                      for conf in entity_cache.get_multi(batch)
+                      if conf and conf.startDate)
+
+    for batch in _batches(sessions):
+        batch_sessions = [sess for sess in entity_cache.get_multi(batch)
+                          if sess]
+        related_keys = list(set(
+            [sess.key.parent() for sess in batch_sessions] +
+            [sess.speakerKey for sess in batch_sessions if sess.speakerKey]))
+        related = dict(zip(related_keys,
+                           entity_cache.get_multi(related_keys)))
+        yield ''.join(
+            _session_event(sess, related[sess.key.parent()],
+                           related.get(sess.speakerKey), stamp)
+            for sess in batch_sessions)
+
+    yield 'END:VCALENDAR\r\n'
+
+
+def http_date(timestamp):
+    ''' returns timestamp formatted for the Last-Modified header '''
+    return formatdate(int(timestamp), usegmt=True)
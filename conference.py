@@ -13,7 +13,6 @@ import endpoints
 from protorpc import message_types
 from protorpc import remote
 
-from google.appengine.api import memcache
 from google.appengine.ext import ndb
 
 from models import ConflictException
@@ -21,13 +20,17 @@ from models import Profile
 from models import Conference
 
 from settings import WEB_CLIENT_ID
-from settings import MEMCACHE_ANNOUNCEMENTS_KEY
 from settings import ANDROID_CLIENT_ID
 from settings import IOS_CLIENT_ID
 from settings import ANDROID_AUDIENCE
-from settings import MEMCACHE_FEATURED_SPEAKER_KEY
 
-from utils import getUserId
+
+import announcement
+import calendar_feed
+import entity_cache
+import query_cache
+import seat_counter
+import timetable
 
 # by @Robert_Avram: - - - - - - - - - - - - -- - - - - - - - - - - - - - - - - - -
 # for the separation of concerns, the message classes were moved in messages_models
@@ -36,6 +39,7 @@ import message_models as mm
 
 from models import ConferenceSpeaker
 from models import ConferenceSession
+from models import SpeakerSessions
 
 # for easier readability and to eliminate confusion all of the helper methods
 # are abstracted into ApiHelper class
@@ -88,39 +92,36 @@ class ConferenceApi(remote.Service, ApiHelper):
     def getConference(self, request):
         """Return requested conference (by websafeConferenceKey)."""
         # get Conference object from request; bail if not found
-        conf = ndb.Key(urlsafe=request.websafeConferenceKey).get()
+        conf = entity_cache.get(ndb.Key(urlsafe=request.websafeConferenceKey))
         if not conf:
             raise endpoints.NotFoundException(
                 'No conference found with key: %s' % request.websafeConferenceKey)
-        prof = conf.key.parent().get()
-        # return ConferenceForm
+        # return ConferenceForm, the organizer displayName is stored on it
         # by @Robert_Avram: replaced the self._copyConferenceToForm with
         # conf.to_form
-        return conf.to_form(getattr(prof, 'displayName'))
+        return conf.to_form(None)
 
-    @endpoints.method(message_types.VoidMessage, mm.ConferenceForms,
+    @endpoints.method(mm.CONF_CREATED_REQUEST, mm.ConferenceForms,
                       path='getConferencesCreated',
                       http_method='POST', name='getConferencesCreated')
     def getConferencesCreated(self, request):
-        """Return conferences created by user."""
+        """Return conferences created by user, only the fields of the list
+        views if summary is set."""
         # make sure user is authed
-        user = endpoints.get_current_user()
-        if not user:
+        if not self.auth_user:
             raise endpoints.UnauthorizedException('Authorization required')
-        user_id = getUserId(user)
+        user_id = self.user_id
 
         # create ancestor query for all key matches for this user
-        confs = Conference.query(ancestor=ndb.Key(Profile, user_id))
-        prof = ndb.Key(Profile, user_id).get()
+        confs = Conference.query(ancestor=ndb.Key(Profile, user_id)).fetch(
+            projection=Conference.summary_fields() if request.summary
+            else None)
+        seats = seat_counter.seats_available_multi(confs)
         # return set of ConferenceForm objects per Conference
         # by @Robert_Avram: replaced the self._copyConferenceToForm with
         # conf.to_form
         return mm.ConferenceForms(
-            items=[
-                conf.to_form(
-                    getattr(
-                        prof,
-                        'displayName')) for conf in confs]
+            items=Conference.to_forms(confs, seats)
         )
 
     @endpoints.method(mm.ConferenceQueryForms, mm.ConferenceForms,
@@ -128,27 +129,40 @@ class ConferenceApi(remote.Service, ApiHelper):
                       http_method='POST',
                       name='queryConferences')
     def queryConferences(self, request):
-        """Query for conferences."""
-        conferences = self._getQuery(request)
-
-        # need to fetch organiser displayName from profiles
-        # get all keys and use get_multi for speed
-        organisers = [(ndb.Key(Profile, conf.organizerUserId))
-                      for conf in conferences]
-        profiles = ndb.get_multi(organisers)
-
-        # put display names in a dict for easier fetching
-        names = {}
-        for profile in profiles:
-            names[profile.key.id()] = profile.displayName
-
-        # return individual ConferenceForm object per Conference
-        # by @Robert_Avram: replaced the self._copyConferenceToForm with
-        # conf.to_form
-        return mm.ConferenceForms(
-            items=[conf.to_form(names[conf.organizerUserId]) for conf in
-                   conferences]
-        )
+        """Query for conferences, only the fields of the list views if
+        summary is set."""
+        filters = self._formatFilters(request.filters)[1]
+        # only the unfiltered summary is a projection query, the filters
+        # combine in too many ways to index each one with the projection
+        projection = None
+        if request.summary and not filters:
+            projection = Conference.summary_fields()
+
+        def query():
+            conferences, next_token = self._fetch_page(
+                self._getQuery(request), request, projection)
+
+            # the organiser displayName is stored on the conference; the
+            # seats available change with every registration, the cached
+            # forms carry the stored ones and the counters are read below
+            seats = [conf.seatsAvailable for conf in conferences]
+
+            # return individual ConferenceForm object per Conference
+            # by @Robert_Avram: replaced the self._copyConferenceToForm with
+            # conf.to_form
+            return mm.ConferenceForms(
+                items=Conference.to_forms(conferences, seats),
+                nextPageToken=next_token
+            )
+
+        # most requests repeat a few filter combinations, serve them from
+        # the result cache
+        forms = query_cache.cached_forms(filters, request.pageSize,
+                                         request.pageToken,
+                                         mm.ConferenceForms, query,
+                                         request.summary)
+        seat_counter.overlay_seats(forms.items)
+        return forms
 
 
 # - - - Profile objects - - - - - - - - - - - - - - - - - - -
@@ -172,60 +186,84 @@ class ConferenceApi(remote.Service, ApiHelper):
                       path='conference/announcement/get',
                       http_method='GET', name='getAnnouncement')
     def getAnnouncement(self, request):
-        """Return Announcement from memcache."""
-        return mm.StringMessage(
-            data=memcache.get(MEMCACHE_ANNOUNCEMENTS_KEY) or "")
+        """Return Announcement from memcache (or the datastore)."""
+        return mm.StringMessage(data=announcement.get_announcement())
 
 
 # - - - Registration - - - - - - - - - - - - - - - - - - - -
 
-    @ndb.transactional(xg=True)
     def _conferenceRegistration(self, request, reg=True):
         """Register or unregister user for selected conference."""
         retval = None
-        prof = self._getProfileFromUser()  # get user Profile
+        # make sure user is authed, the Profile is only read in the
+        # transaction that changes it
+        if not self.auth_user:
+            raise endpoints.UnauthorizedException('Authorization required')
+        wsck = request.websafeConferenceKey
 
         # check if conf exists given websafeConfKey
         # get conference; check that it exists
-        wsck = request.websafeConferenceKey
-        conf = ndb.Key(urlsafe=wsck).get()
+        conf = entity_cache.get(ndb.Key(urlsafe=wsck))
         if not conf:
             raise endpoints.NotFoundException(
                 'No conference found with key: %s' % wsck)
 
         # register
         if reg:
-            # check if user already registered otherwise add
-            if wsck in prof.conferenceKeysToAttend:
-                raise ConflictException(
-                    "You have already registered for this conference")
-
-            # check if seats avail
-            if conf.seatsAvailable <= 0:
+            # take a seat from the first seat counter shard that still has
+            # one, shards are tried in random order to spread the writes
+            for shard_key in seat_counter.candidate_shards(conf):
+                if self._takeSeat(shard_key, wsck):
+                    break
+            else:
                 raise ConflictException(
                     "There are no seats available.")
-
-            # register user, take away one seat
-            prof.conferenceKeysToAttend.append(wsck)
-            conf.seatsAvailable -= 1
+            self._seatsChanged(conf, -1)
             retval = True
 
-        # unregister
+        # unregister user if registered, add back one seat
         else:
-            # check if user already registered
-            if wsck in prof.conferenceKeysToAttend:
+            retval = self._releaseSeat(conf, wsck)
+            if retval:
+                self._seatsChanged(conf, 1)
 
-                # unregister user, add back one seat
-                prof.conferenceKeysToAttend.remove(wsck)
-                conf.seatsAvailable += 1
-                retval = True
-            else:
-                retval = False
+        return mm.BooleanMessage(data=retval)
+
+    @staticmethod
+    def _seatsChanged(conf, delta):
+        """Apply a committed seat change to the cached total and to the
+        nearly sold out announcement."""
+        seats = seat_counter.update_cached_seats(conf.key, delta)
+        if seats is None:
+            seats = seat_counter.seats_available(conf)
+        announcement.update(conf, seats, seats - delta)
 
-        # write things back to the datastore & return
+    @ndb.transactional(xg=True)
+    def _takeSeat(self, shard_key, wsck):
+        """Register the user taking a seat from one counter shard,
+        returns False if the shard ran out of seats."""
+        prof = self.context.profile_for_update(self._newProfile)
+        if wsck in prof.conferenceKeysToAttend:
+            raise ConflictException(
+                "You have already registered for this conference")
+        if not seat_counter.take_seat(shard_key):
+            return False
+        prof.conferenceKeysToAttend.append(wsck)
         prof.put()
-        conf.put()
-        return mm.BooleanMessage(data=retval)
+        calendar_feed.invalidate(prof.key)
+        return True
+
+    @ndb.transactional(xg=True)
+    def _releaseSeat(self, conf, wsck):
+        """Unregister the user giving back a seat to a counter shard."""
+        prof = self.context.profile_for_update()
+        if not prof or wsck not in prof.conferenceKeysToAttend:
+            return False
+        seat_counter.release_seat(conf.key)
+        prof.conferenceKeysToAttend.remove(wsck)
+        prof.put()
+        calendar_feed.invalidate(prof.key)
+        return True
 
     @endpoints.method(message_types.VoidMessage, mm.ConferenceForms,
                       path='conferences/attending',
@@ -236,23 +274,22 @@ class ConferenceApi(remote.Service, ApiHelper):
         conf_keys = [ndb.Key(urlsafe=wsck)
                      for wsck in prof.conferenceKeysToAttend]
         conferences = ndb.get_multi(conf_keys)
-
-        # get organizers
-        organisers = [ndb.Key(Profile, conf.organizerUserId)
-                      for conf in conferences]
-        profiles = ndb.get_multi(organisers)
-
-        # put display names in a dict for easier fetching
-        names = {}
-        for profile in profiles:
-            names[profile.key.id()] = profile.displayName
+        seats = seat_counter.seats_available_multi(conferences)
 
         # return set of ConferenceForm objects per Conference
         # by @Robert_Avram: replaced the self._copyConferenceToForm with
         # conf.to_form
-        return mm.ConferenceForms(items=[conf.to_form(names[conf.organizerUserId])
-                                         for conf in conferences]
-                                  )
+        return mm.ConferenceForms(
+            items=Conference.to_forms(conferences, seats))
+
+    @endpoints.method(message_types.VoidMessage, mm.StringMessage,
+                      path='profile/calendar',
+                      http_method='POST', name='getCalendarFeed')
+    def getCalendarFeed(self, request):
+        """Get the URL of the iCalendar feed of the conferences the user
+        attends and the sessions in their wish list; calendar clients can
+        subscribe to it without signing in, so keep it private."""
+        return self._getCalendarFeed()
 
     @endpoints.method(mm.CONF_GET_REQUEST, mm.BooleanMessage,
                       path='conference/{websafeConferenceKey}',
@@ -283,32 +320,46 @@ class ConferenceApi(remote.Service, ApiHelper):
         ''' Create Session to Conference, open only to the conference Organizer'''
         return self._createSession(request)
 
-    @endpoints.method(mm.CONF_GET_REQUEST, mm.ConferenceSessionForms,
+    @endpoints.method(mm.CONF_SESSIONS_REQUEST, mm.ConferenceSessionForms,
                       path="getConferenceSessions/{websafeConferenceKey}",
                       http_method="POST", name='getConferenceSessions')
     def getConferenceSessions(self, request):
-        ''' Create Session to Conference, open only to the conference Organizer'''
+        ''' Get the sessions of a conference, one page at a time; only the
+        fields of the list views if summary is set, the whole timetable
+        (grouped in slots, not paged) if timetable is set '''
 
         # get the conference
         confKey = self.get_websafe_key(
             request.websafeConferenceKey,
             "Conference")
-        conf = confKey.get()
-        if not conf:
+
+        # the timetable is kept for the conference, it is only built (and
+        # the conference looked up) when it is not in memcache
+        if request.timetable:
+            form = timetable.get_timetable(confKey)
+            if form is None:
+                raise endpoints.NotFoundException(
+                    "The conference you are looking for does not exist")
+            return form
+
+        conf_future = entity_cache.get_async(confKey)
+
+        # get one page of the sessions in this conference and their
+        # speakers while the conference is looked up
+        @ndb.tasklet
+        def sessions_page():
+            sessions, next_token = yield self._fetch_page_async(
+                ConferenceSession.query(ancestor=confKey), request,
+                ConferenceSession.SUMMARY_FIELDS if request.summary else None)
+            items = yield ConferenceSession.to_forms_async(sessions)
+            raise ndb.Return(mm.ConferenceSessionForms(
+                items=items, nextPageToken=next_token))
+        page_future = sessions_page()
+
+        if not conf_future.get_result():
             raise endpoints.NotFoundException(
                 "The conference you are looking for does not exist")
-
-        # get all the sessions in this conference
-        sessions = ConferenceSession.query(ancestor=confKey).fetch(500)
-
-        # make a list with all the speakers at the conferences in order
-        speaker_keys = []
-        for sess in sessions:
-            speaker_keys.append(sess.speakerKey)
-
-        speakers = ndb.get_multi(speaker_keys)
-        return mm.ConferenceSessionForms(
-            items=[sessions[i].to_form(speakers[i]) for i in range(len(sessions))])
+        return page_future.get_result()
 
     @endpoints.method(mm.CONF_SESSION_TYPE_REQUEST, mm.ConferenceSessionForms,
                       path="getConferenceSessionsByType/{websafeConferenceKey}",
@@ -325,7 +376,7 @@ class ConferenceApi(remote.Service, ApiHelper):
         confKey = self.get_websafe_key(
             request.websafeConferenceKey,
             "Conference")
-        conf = confKey.get()
+        conf = entity_cache.get(confKey)
         if not conf:
             raise endpoints.BadRequestException(
                 "This conference does not exist: %s" %
@@ -337,34 +388,40 @@ class ConferenceApi(remote.Service, ApiHelper):
         types = request.typeOfSession
         if types:
             q = q.filter(ConferenceSession.type.IN(types))
-        q = q.order(ConferenceSession.name)
-        sessions = q.fetch(100)
-        speaker_keys = []
-        for sess in q:
-            speaker_keys.append(sess.speakerKey)
-        speakers = ndb.get_multi(speaker_keys)
+        q = q.order(ConferenceSession.name, ConferenceSession.key)
+        sessions, next_token = self._fetch_page(q, request)
 
         return mm.ConferenceSessionForms(
-            items=[sessions[i].to_form(speakers[i]) for i in range(len(sessions))])
+            items=ConferenceSession.to_forms(sessions),
+            nextPageToken=next_token)
 
     @endpoints.method(mm.SPEAKER_SESSION_GET_REQUEST, mm.ConferenceSessionForms,
                       path="getSessionsBySpeaker/{websafeSpeakerKey}",
                       http_method="GET", name='getSessionsBySpeaker')
     def getSessionsBySpeaker(self, request):
-        '''Given a speaker, return all sessions given by this particular speaker, across all conferences'''
+        '''Given a speaker, return all sessions given by this particular speaker, across all conferences,
+        one page at a time'''
 
         speaker_key = self.get_websafe_key(
             request.websafeSpeakerKey,
             "ConferenceSpeaker")
-        speaker = speaker_key.get()
+        # the speaker is looked up while the keys of the page are queried
+        speaker_future = entity_cache.get_async(speaker_key)
+        q = ConferenceSession.query(
+            ConferenceSession.speakerKey == speaker_key)
+        page_future = self._fetch_page_async(
+            q.order(ConferenceSession.key), request, keys_only=True)
+        speaker = speaker_future.get_result()
         if not speaker:
             raise endpoints.NotFoundException(
                 "The speaker you are looking for was not found!")
 
-        sessions = ndb.get_multi(speaker.conferenceSessions)
+        keys, next_token = page_future.get_result()
+        sessions = [sess for sess in entity_cache.get_multi(keys) if sess]
 
         return mm.ConferenceSessionForms(
-            items=[sessions[i].to_form(speaker) for i in range(len(sessions))])
+            items=ConferenceSession.to_forms(sessions, [speaker]),
+            nextPageToken=next_token)
 
     @endpoints.method(mm.ConferenceSpeakerForm, mm.ConferenceSpeakerFormOut,
                       path="registerSpeaker",
@@ -380,29 +437,28 @@ class ConferenceApi(remote.Service, ApiHelper):
         ''' Register Conference Speaker'''
         return mm.BooleanMessage(data=self._add_session_to_wishlist(request))
 
-    @endpoints.method(message_types.VoidMessage, mm.ConferenceSpeakerForms,
+    @endpoints.method(mm.GET_SPEAKERS, mm.ConferenceSpeakerForms,
                       path="getSpeakers",
                       http_method="POST", name='getSpeakers')
-    def getSpeakers(self, unused_request):
-        ''' Get some Conference Speakers - this is a helper method
-        to query for some speakers in order to retrieve speaker keys -for testing purposes only'''
-        # query ConferenceSpeakers and get the first 100 records
-        speakers = ConferenceSpeaker.query().fetch(100)
+    def getSpeakers(self, request):
+        ''' Get the Conference Speakers by name, one page at a time - this is a helper method
+        to query for some speakers in order to retrieve speaker keys'''
+        q = ConferenceSpeaker.query().order(ConferenceSpeaker.displayName,
+                                            ConferenceSpeaker.key)
+        speakers, next_token = self._fetch_page(q, request)
         return mm.ConferenceSpeakerForms(
-            items=[speaker.to_form() for speaker in speakers])
+            items=ConferenceSpeaker.to_forms(speakers),
+            nextPageToken=next_token)
 
     @endpoints.method(mm.GET_SPEAKERS_BY_NAME, mm.ConferenceSpeakerForms,
                       path="getSpeakersByName",
                       http_method="POST", name='getSpeakersByName')
     def getSpeakersByName(self, request):
-        '''Given the full displayName of a speaker get Conference Speakers with that name'''
+        '''Given the displayName of a speaker get Conference Speakers with that name, one page at a time;
+        match is exact (default), prefix, autocomplete or fuzzy (typo tolerant)'''
         # ConferenceSpeaker allows for multiple speakers to have the same name,
         # eventually by adding more characteristics to the speaker we will be able to query more specifically
-        # for now, return the first 10 of that name we encounter.
-        speakers = ConferenceSpeaker.query(
-            ConferenceSpeaker.displayName == request.displayName).fetch(10)
-        return mm.ConferenceSpeakerForms(
-            items=[speaker.to_form() for speaker in speakers])
+        return self._getSpeakersByName(request)
 
     @endpoints.method(message_types.VoidMessage, mm.WishListForm,
                       path="getSessionsInWishList",
@@ -411,6 +467,14 @@ class ConferenceApi(remote.Service, ApiHelper):
         '''Get the sessions and the conferences in wish list of the current user'''
         return self._get_wishlist()
 
+    @endpoints.method(message_types.VoidMessage, mm.ScheduleForm,
+                      path="getWishListSchedule",
+                      http_method="GET", name='getWishListSchedule')
+    def getWishListSchedule(self, request):
+        '''Get the sessions in the wish list of the current user that can all be
+        attended, in order, and the ones that clash with them'''
+        return self._getWishListSchedule()
+
     @endpoints.method(mm.REMOVE_SESSION_POST_REQUEST, mm.BooleanMessage,
                       path="removeSessionFromWishList",
                       http_method="POST", name='removeSessionFromWishList')
@@ -429,7 +493,10 @@ class ConferenceApi(remote.Service, ApiHelper):
         takes in:
             afterTime - the hour block after which a user is unavailable
                         eg: 19 (for 7PM) - type(int);
-            exclude - types of sessions to exclude (max 3) type(str)'''
+            exclude - types of sessions to exclude (max 3) type(str)
+            engine - datastore (default) or columnar, the columnar engine
+                     searches the sessions of websafeConferenceKey and takes
+                     any number of exclude and include types'''
         return self._queryproblem(request)
 
     @endpoints.method(mm.QUERY_PROBLEM2, mm.ConferenceSessionForms_search,
@@ -448,20 +515,29 @@ class ConferenceApi(remote.Service, ApiHelper):
                       path="getConferencesBySpeaker",
                       http_method="GET", name='getConferencesBySpeaker')
     def getConferencesBySpeaker(self, request):
-        '''Given a speaker, returns all conferences that they will speak in'''
+        '''Given a speaker, returns all conferences that they will speak in,
+        one page at a time'''
 
         speaker_key = self.get_websafe_key(
             request.websafeSpeakerKey,
             "ConferenceSpeaker")
-        speaker = speaker_key.get()
-        if not speaker:
+        # the conferences are the parents of the speaker's SpeakerSessions
+        speaker_future = entity_cache.get_async(speaker_key)
+        q = SpeakerSessions.query(SpeakerSessions.speakerKey == speaker_key)
+        page_future = self._fetch_page_async(
+            q.order(SpeakerSessions.key), request, keys_only=True)
+        if not speaker_future.get_result():
             raise endpoints.NotFoundException(
                 "The speaker you are looking for was not found!")
 
-        conferences = ndb.get_multi(speaker.conferences)
+        keys, next_token = page_future.get_result()
+        conferences = [conf for conf in entity_cache.get_multi(
+            [key.parent() for key in keys]) if conf]
+        seats = seat_counter.seats_available_multi(conferences)
 
         return mm.ConferenceForms(
-            items=[conf.to_form(None) for conf in conferences])
+            items=Conference.to_forms(conferences, seats),
+            nextPageToken=next_token)
 
     @endpoints.method(mm.GET_SESSIONS_BY_SPEAKER_CONFERENCE, mm.ConferenceSessionForms,
                       path="getSessionsFromSpeakerAndConference",
@@ -472,34 +548,46 @@ class ConferenceApi(remote.Service, ApiHelper):
         speaker_key = self.get_websafe_key(
             request.websafeSpeakerKey,
             "ConferenceSpeaker")
-        speaker = speaker_key.get()
-        if not speaker:
-            raise endpoints.NotFoundException(
-                "The speaker you are looking for was not found!")
-
-        # get conference key and make sure we have a conference
+        # get conference key
         conf_key = self.get_websafe_key(
             request.websafeConferenceKey,
             "Conference")
-        conference = conf_key.get()
-        if not conference:
-            raise endpoints.NotFoundException(
-                "The conference you are looking for was not found!")
 
+        # the speaker, the conference and the sessions don't depend on each
+        # other so the three lookups run at the same time
+        speaker_future = entity_cache.get_async(speaker_key)
+        conf_future = entity_cache.get_async(conf_key)
         q = ConferenceSession.query(ancestor=conf_key)
         q = q.filter(ConferenceSession.speakerKey == speaker_key)
+        sessions_future = q.fetch_async(50)
 
-        sessions = q.fetch(50)
+        # make sure we have a speaker
+        speaker = speaker_future.get_result()
+        if not speaker:
+            raise endpoints.NotFoundException(
+                "The speaker you are looking for was not found!")
+
+        # make sure we have a conference
+        if not conf_future.get_result():
+            raise endpoints.NotFoundException(
+                "The conference you are looking for was not found!")
+
+        sessions = sessions_future.get_result()
 
         return mm.ConferenceSessionForms(
-            items=[sessions[i].to_form(speaker) for i in range(len(sessions))])
+            items=ConferenceSession.to_forms(sessions, [speaker]))
 
-    @endpoints.method(message_types.VoidMessage, mm.FeaturedSpeakerForm,
+    @endpoints.method(mm.FEATURED_SPEAKER_REQUEST, mm.FeaturedSpeakerForm,
                       path="getFeaturedSpeaker",
                       http_method="GET", name='getFeaturedSpeaker')
     def getFeaturedSpeaker(self, request):
-        '''Get featured speaker'''
-        fs = memcache.get(MEMCACHE_FEATURED_SPEAKER_KEY)
+        '''Get featured speaker of the conference websafeConferenceKey, or the
+        latest featured speaker if no conference is given'''
+        conf_key = None
+        if request.websafeConferenceKey:
+            conf_key = self.get_websafe_key(
+                request.websafeConferenceKey, "Conference")
+        fs = self._getFeaturedSpeaker(conf_key)
         if not fs:
             return mm.FeaturedSpeakerForm()
         return mm.FeaturedSpeakerForm(name=fs.get('name'),
@@ -507,6 +595,22 @@ class ConferenceApi(remote.Service, ApiHelper):
                                       conference=fs.get('conf'),
                                       conference_location=fs.get('conf_loc'))
 
+    @endpoints.method(mm.ImportRequest, mm.ImportForm,
+                      path="import",
+                      http_method="POST", name='importConferenceData')
+    def importConferenceData(self, request):
+        '''Import conferences, speakers and sessions in bulk, one JSON object
+        per line; the rows are imported by tasks, follow them with
+        getImport'''
+        return self._startImport(request)
+
+    @endpoints.method(mm.IMPORT_GET_REQUEST, mm.ImportForm,
+                      path="import/{websafeImportKey}",
+                      http_method="GET", name='getImport')
+    def getImport(self, request):
+        '''Get the progress and the row errors of a bulk import'''
+        return self._getImport(request)
+
 # - - - - - - - - - - - - end added_by @Robert_Avram- - - - - - - - - - - - - - - - - -
 
 
@@ -7,29 +7,60 @@ conference_helper.py -- Udacity conference server-side Python App Engine
 
 import endpoints
 from google.appengine.ext import ndb
+from google.appengine.api import datastore_errors
+from google.appengine.datastore.datastore_query import Cursor
 from google.appengine.api import search
 from google.appengine.api import taskqueue
 from google.appengine.api import memcache
 from google.net.proto.ProtocolBuffer import ProtocolBufferDecodeError
+from protorpc import messages
+from protorpc import protojson
 from webapp2 import cached_property
 
 from models import Conference
 from models import ConferenceSession
 from models import ConferenceSpeaker
+from models import FeaturedSpeaker
+from models import ImportJob
+from models import Migration
 from models import Profile
+from models import SpeakerSessions
+from models import WishList
+from models import WishListItem
 
-from settings import MEMCACHE_ANNOUNCEMENTS_KEY
 from settings import MEMCACHE_FEATURED_SPEAKER_KEY
-from settings import ANNOUNCEMENT_TPL
+from settings import MEMCACHE_CONF_FEATURED_SPEAKER_KEY
+from settings import MEMCACHE_WISHLIST_KEY
+from settings import MEMCACHE_WISHLIST_TIMEOUT
 from settings import DEFAULTS
 from settings import OPERATORS
 from settings import FIELDS
+from settings import PAGE_SIZE_DEFAULT
+from settings import PAGE_SIZE_MAX
+from settings import ORGANIZER_NAME_BATCH
+from settings import SPEAKER_BACKFILL_BATCH
+from settings import IMPORT_SESSION_BATCH
+from settings import IMPORT_PUT_BATCH
+from settings import SESSION_INDEX_NAME
 
 import message_models as mm
 
+import announcement
+import calendar_feed
+import collections
+import entity_cache
+import json
 import logging
+import query_cache
+import search_indexer
+import seat_counter
+import session_columns
+import speaker_index
+import timetable
 import utils
+import uuid
 from datetime import datetime
+from datetime import timedelta
 
 
 def user_required(handler):
@@ -39,6 +70,7 @@ def user_required(handler):
         # Make sure there is a user authenticated
         if not self.auth_user:
             raise endpoints.UnauthorizedException('Authorization Required')
+        self.context.prefetch_profile()
 
         # Make sure the current user has a profile in our DB
         if not self.user:
@@ -50,28 +82,121 @@ def user_required(handler):
     return check_login
 
 
+class RequestContext(object):
+
+    ''' the current user, their id and their Profile, each resolved at most
+    once per request; an endpoints service instance lives for one request
+    so BaseHandler keeps one context per instance '''
+
+    def __init__(self):
+        self._user_id_future = None
+        self._profile_future = None
+        # Profile reads from the datastore in this request, every one goes
+        # through the context; one is all a request should need
+        self.profile_gets = 0
+
+    @cached_property
+    def auth_user(self):
+        ''' the current endpoints user or None '''
+        return endpoints.get_current_user()
+
+    @cached_property
+    def user_id(self):
+        ''' the user id of auth_user, None when no user is logged in '''
+        return self.user_id_async().get_result()
+
+    def user_id_async(self):
+        ''' starts resolving user_id, so the token lookup can overlap other
+        lookups; returns its future '''
+        if self._user_id_future is None:
+            if 'user_id' in self.__dict__ or not self.auth_user:
+                # already resolved, or nobody is logged in
+                self._user_id_future = ndb.Future()
+                self._user_id_future.set_result(
+                    self.__dict__.get('user_id'))
+            else:
+                self._user_id_future = utils.getUserIdAsync(self.auth_user)
+        return self._user_id_future
+
+    @cached_property
+    def profile_key(self):
+        ''' the key of the user's Profile, None when no user is logged in '''
+        if self.user_id:
+            return ndb.Key(Profile, self.user_id)
+        return None
+
+    def prefetch_profile(self):
+        ''' starts resolving the user id and getting the Profile, so both
+        can overlap other lookups; returns the future, None when no user is
+        logged in '''
+        if self._profile_future is None and self.auth_user:
+            self._profile_future = self._get_profile_async()
+        return self._profile_future
+
+    @ndb.tasklet
+    def _get_profile_async(self):
+        user_id = yield self.user_id_async()
+        if not user_id:
+            raise ndb.Return(None)
+        self._count_profile_get()
+        profile = yield ndb.Key(Profile, user_id).get_async()
+        raise ndb.Return(profile)
+
+    def profile_for_update(self, create=None):
+        ''' gets the Profile in the current transaction, to change it, or
+        the Profile made by create() if there is none; the context keeps it
+        once the transaction commits '''
+        self._count_profile_get()
+        profile = self.profile_key.get()
+        if profile is None and create:
+            profile = create()
+        if profile is not None:
+            ndb.get_context().call_on_commit(
+                lambda: self.set_profile(profile))
+        return profile
+
+    def _count_profile_get(self):
+        self.profile_gets += 1
+        if self.profile_gets > 1:
+            logging.warning('Profile fetched %d times in one request',
+                            self.profile_gets)
+
+    @property
+    def profile(self):
+        ''' the user's Profile, None when there is none or no user '''
+        future = self.prefetch_profile()
+        return future.get_result() if future else None
+
+    def set_profile(self, profile):
+        ''' replaces the Profile of the context, once it was created '''
+        future = ndb.Future()
+        future.set_result(profile)
+        self._profile_future = future
+
+
 class BaseHandler(object):
 
     ''' Basic Handler functions that can be inherited by any api '''
     @cached_property
+    def context(self):
+        ''' the RequestContext of the current request '''
+        return RequestContext()
+
+    @property
     def user(self):
-        ''' helper function that computes and caches current user profile
-        relies on auth_user, returns Profile or None'''
-
-        # check if there is a current user logged in
-        if self.auth_user:
-            # get user_id of current logged in auth_user
-            user_id = utils.getUserId(self.auth_user)
-            p_key = ndb.Key(Profile, user_id)
-            # get Profile from datastore
-            return p_key.get()
-        else:
-            return None
+        ''' current user profile, relies on auth_user, returns Profile
+        or None'''
+        return self.context.profile
 
-    @cached_property
+    @property
     def auth_user(self):
-        ''' helper function that computes and caches current_user '''
-        return endpoints.get_current_user()
+        ''' current endpoints user or None '''
+        return self.context.auth_user
+
+    @property
+    def user_id(self):
+        ''' user id of auth_user, None when no user is logged in '''
+        return self.context.user_id
 
 
 class ApiHelper(BaseHandler):
@@ -94,6 +219,44 @@ class ApiHelper(BaseHandler):
                 modelkind)
         return s_key
 
+    @staticmethod
+    def _page_size(request):
+        ''' returns the validated request.pageSize, or the default '''
+        page_size = request.pageSize or PAGE_SIZE_DEFAULT
+        if page_size < 1 or page_size > PAGE_SIZE_MAX:
+            raise endpoints.BadRequestException(
+                "pageSize needs to be between 1 and %d" % PAGE_SIZE_MAX)
+        return page_size
+
+    @classmethod
+    @ndb.tasklet
+    def _fetch_page_async(cls, q, request, projection=None, keys_only=False):
+        ''' fetches the page of query q asked for by request.pageSize and
+        request.pageToken, returns a future for the entities (projected on
+        projection if given, only their keys if keys_only) and the token of
+        the next page (None when there are no more results) '''
+        page_size = cls._page_size(request)
+
+        cursor = None
+        if request.pageToken:
+            try:
+                cursor = Cursor(urlsafe=request.pageToken)
+            except datastore_errors.BadValueError:
+                raise endpoints.BadRequestException(
+                    'the pageToken received is not valid')
+
+        results, next_cursor, more = yield q.fetch_page_async(
+            page_size, start_cursor=cursor, projection=projection,
+            keys_only=keys_only)
+        next_token = next_cursor.urlsafe() if more and next_cursor else None
+        raise ndb.Return((results, next_token))
+
+    @classmethod
+    def _fetch_page(cls, q, request, projection=None, keys_only=False):
+        ''' blocking version of _fetch_page_async '''
+        return cls._fetch_page_async(
+            q, request, projection, keys_only).get_result()
+
     @user_required
     def _add_session_to_wishlist(self, request):
         ''' adds a session to the user's wishlist '''
@@ -104,34 +267,103 @@ class ApiHelper(BaseHandler):
             'ConferenceSession')
 
         # check if the session exists in the db
-        session = s_key.get()
+        session = entity_cache.get(s_key)
         if not session:
             raise endpoints.NotFoundException(
                 'The session you want to add does not exist')
 
-        # make sure the keys are not in the wishList already
-        if session.key.parent() not in self.user.wishList.conferences:
-            # if this conference doesn't exist in the wishList,
-            # add it since the session belongs to it
-            self.user.wishList.conferences.append(session.key.parent())
-            # this also implies that this session does not exist in the
-            # wishList
-            self.user.wishList.sessions.append(session.key)
-            self.user.put()
-        elif session.key not in self.user.wishList.sessions:
-            self.user.wishList.sessions.append(session.key)
-            self.user.put()
-        else:
+        self._moveWishList()
+        # make sure the session is not in the wishList already
+        if not self._addWishListItems(self.user.key, session):
             raise endpoints.BadRequestException(
                 'the session is already in the wish list')
 
         return True
 
+    @staticmethod
+    @ndb.transactional()
+    def _addWishListItems(p_key, session):
+        ''' adds a session and its conference to the wish list of p_key,
+        returns False if the session was there already '''
+        s_key = session.key
+        sess_item, conf_item = ndb.get_multi(
+            [WishListItem.key_for(p_key, s_key),
+             WishListItem.key_for(p_key, s_key.parent())])
+        if sess_item:
+            return False
+        items = [WishListItem.for_item(p_key, session.key, session.speakerKey)]
+        # if this conference doesn't exist in the wishList,
+        # add it since the session belongs to it
+        if not conf_item:
+            items.append(WishListItem.for_item(p_key, s_key.parent()))
+        ndb.put_multi(items)
+        ApiHelper._invalidateWishList(p_key)
+        return True
+
+    @staticmethod
+    def _invalidateWishList(p_key):
+        ''' drops the cached WishListForm of p_key once the current
+        transaction commits '''
+        ndb.get_context().call_on_commit(lambda: memcache.delete(
+            MEMCACHE_WISHLIST_KEY % p_key.urlsafe()))
+        calendar_feed.invalidate(p_key)
+
+    @staticmethod
+    @ndb.transactional()
+    def _removeWishListItems(p_key, s_key, removeConference):
+        ''' removes a session (and its conference if removeConference) from
+        the wish list of p_key '''
+        sess_item_key = WishListItem.key_for(p_key, s_key)
+        # if key is in the wishList remove it otherwise BadRequestException
+        if not sess_item_key.get():
+            raise endpoints.BadRequestException(
+                'the session is not in the wish list')
+        remove = [sess_item_key]
+
+        # if the user wants to remove the conference as well
+        if removeConference:
+            # check if there are any other sessions in the wishlist with the
+            # same conference
+            others = WishListItem.query(ancestor=p_key).filter(
+                WishListItem.conference == s_key.parent(),
+                WishListItem.isSession == True).fetch(2, keys_only=True)
+            if [key for key in others if key != sess_item_key]:
+                raise endpoints.ConflictException(
+                    "cannot remove conference because there are other sessions from this conference in the wish list")
+            remove.append(WishListItem.key_for(p_key, s_key.parent()))
+
+        ndb.delete_multi(remove)
+        ApiHelper._invalidateWishList(p_key)
+
+    def _moveWishList(self):
+        ''' moves a wish list still stored in the Profile to WishListItem
+        entities, once per profile '''
+        if self.user.wishList is None:
+            return
+
+        @ndb.transactional()
+        def move():
+            prof = self.context.profile_for_update()
+            if prof.wishList is None:
+                return
+            # keep the order the items were added in
+            now = datetime.now()
+            item_keys = prof.wishList.conferences + prof.wishList.sessions
+            ndb.put_multi([
+                WishListItem.for_item(prof.key, item_key,
+                                      added=now + timedelta(microseconds=i))
+                for i, item_key in enumerate(item_keys)])
+            prof.wishList = None
+            prof.put()
+            ApiHelper._invalidateWishList(prof.key)
+
+        move()
+
     def _query_index(self, qry):
         ''' Query the search index for sessions,
         takes in search.Query '''
         # Query the index.
-        index = search.Index(name='sessions')
+        index = search.Index(name=SESSION_INDEX_NAME)
         try:
             results = index.search(qry)
 
@@ -145,51 +377,6 @@ class ApiHelper(BaseHandler):
 
         return items
 
-    def _add_to_search_index(self, session, speaker, conference):
-        ''' Create a search document based on session, speaker and conference,
-        and added to the search index '''
-        # define the index
-        index = search.Index(name='sessions')
-
-        # create the document object
-        doc = search.Document(
-            # the doc_id will be set to the key of the session
-            doc_id=session.key.urlsafe(),
-            fields=[
-                search.TextField(name='name', value=session.name),
-                search.TextField(name='type', value=session.type),
-                search.NumberField(name='duration', value=session.duration),
-                search.DateField(name="startDate", value=session.startDate),
-                search.NumberField(
-                    name="startTime",
-                    value=utils.time_to_minutes(
-                        session.startTime)),
-                search.TextField(name='highlights', value=session.highlights),
-                search.TextField(
-                    name='speakerName',
-                    value=speaker.displayName),
-                search.TextField(name='conferenceName', value=conference.name),
-                search.TextField(name='conferenceTopics', value=" ".join(
-                    [topic for topic in conference.topics])),
-                search.TextField(name='conferenceCity', value=conference.city),
-                search.TextField(
-                    name='conferenceDescription',
-                    value=conference.description),
-            ])
-
-        try:
-            index.put(doc)
-        except search.PutError as e:
-            result = e.results[0]
-            if result.code == search.OperationResult.TRANSIENT_ERROR:
-                # if TRANSIENT_ERROR retry:
-                try:
-                    index.put(result.object_id)
-                except search.Error as e:
-                    logging.error(e)
-        except search.Error as e:
-            logging.error(e)
-
     @user_required
     def _remove_session_from_wishlist(
             self, conf_sessionKey, removeConference=False):
@@ -197,45 +384,89 @@ class ApiHelper(BaseHandler):
         # make sure that the websafeSessionKey is actually valid
         s_key = self.get_websafe_key(conf_sessionKey, 'ConferenceSession')
         # check if the session exists in the db
-        session = s_key.get()
+        session = entity_cache.get(s_key)
         if not session:
             raise endpoints.NotFoundException(
                 'The session you want to add does not exist')
 
-        # if key is in the wishList remove it otherwise BadRequestException
-        if session.key in self.user.wishList.sessions:
-            self.user.wishList.sessions.remove(session.key)
-        else:
-            raise endpoints.BadRequestException(
-                'the session is not in the wish list')
-
-        # if the user wants to remove the conference as well
-        if removeConference:
-            # check if there are any other sessions in the wishlist with the
-            # same conference
-            for sesskey in self.user.wishList.sessions:
-                if sesskey.parent() == session.key.parent():
-                    raise endpoints.ConflictException(
-                        "cannot remove conference because there are other sessions from this conference in the wish list")
-            self.user.wishList.conferences.remove(session.key.parent())
-
-        self.user.put()
+        self._moveWishList()
+        self._removeWishListItems(self.user.key, session.key,
+                                  removeConference)
         return True
 
-    # cross-group needed because the speaker is not related to the session
-    @ndb.transactional(xg=True)
-    def _putSessionAndSpeaker(self, my_session, conf, speaker):
-        ''' transactional put for session and speaker '''
+    # everything written here is in the entity group of the conference
+    @ndb.transactional()
+    def _putSession(self, my_session):
+        ''' transactional put for the session and the SpeakerSessions of its
+        speaker in the conference '''
+        # the index is read in the transaction, so two sessions of the
+        # speaker at the same time can't both get in
+        clashes = session_columns.add_session(my_session)
+        if clashes:
+            conf_key = my_session.key.parent()
+            raise endpoints.ConflictException(
+                "The speaker already has a session at that time: %s" %
+                ', '.join(ndb.Key(ConferenceSession, sess_id,
+                                  parent=conf_key).urlsafe()
+                          for sess_id in clashes))
         my_session.put()
-        if conf.key not in speaker.conferences:
-            speaker.conferences.append(conf.key)
-        speaker.conferenceSessions.append(my_session.key)
-        speaker.put()
-        return (my_session, conf, speaker)
+        self._speakerSessions([my_session], my_session.speakerKey)
+        entity_cache.refresh(my_session)
+        # the search document is written by a task, queued only if the
+        # session is committed
+        search_indexer.queue_sessions([my_session.key], transactional=True)
+        timetable.queue_add(my_session.key)
+        # a speaker with more than one session in the conference becomes
+        # its featured speaker, as asked in task 4 of the project
+        taskqueue.add(params={'websafeSessionKey': my_session.key.urlsafe()},
+                      url='/tasks/add_featured_speaker',
+                      transactional=True)
+        return my_session
 
     @user_required
     def _get_wishlist(self):
-        return self.user.wishList.to_form()
+        ''' returns the WishListForm of the user, cached in memcache until
+        the wish list changes '''
+        self._moveWishList()
+        cache_key = MEMCACHE_WISHLIST_KEY % self.user.key.urlsafe()
+        cached = memcache.get(cache_key)
+        if cached is not None:
+            return protojson.decode_message(mm.WishListForm, cached)
+
+        # deleted sessions and conferences are pruned while hydrating
+        form = WishList.for_profile(self.user.key).to_form(self.user.key)
+        memcache.set(cache_key, protojson.encode_message(form),
+                     time=MEMCACHE_WISHLIST_TIMEOUT)
+        return form
+
+    @user_required
+    def _getWishListSchedule(self):
+        ''' returns the ScheduleForm of the user's wish list: the most
+        sessions that don't overlap, picked by earliest end, and the rest '''
+        self._moveWishList()
+        wishlist = WishList.for_profile(self.user.key)
+        sessions_future = entity_cache.get_multi_async(wishlist.sessions)
+        speakers = [speaker for speaker in
+                    entity_cache.get_multi(wishlist.speakers) if speaker]
+        sessions = [sess for sess in sessions_future.get_result() if sess]
+
+        schedule, conflicts = [], []
+        last_end = None
+        for sess in sorted(sessions,
+                           key=lambda sess: session_columns.interval(sess)[1]):
+            start, end = session_columns.interval(sess)
+            if last_end is None or start >= last_end:
+                schedule.append(sess)
+                last_end = end
+            else:
+                conflicts.append(sess)
+        conflicts.sort(key=session_columns.interval)
+
+        return mm.ScheduleForm(
+            sessions=mm.ConferenceSessionForms(
+                items=ConferenceSession.to_forms(schedule, speakers)),
+            conflicts=mm.ConferenceSessionForms(
+                items=ConferenceSession.to_forms(conflicts, speakers)))
 
     @user_required
     def _createSession(self, request):
@@ -245,7 +476,7 @@ class ApiHelper(BaseHandler):
         speaker_key = self.get_websafe_key(
             request.speakerKey,
             "ConferenceSpeaker")
-        speaker = speaker_key.get()
+        speaker = entity_cache.get(speaker_key)
 
         # make sure there the speaker exists in the DB
         if not speaker:
@@ -271,49 +502,123 @@ class ApiHelper(BaseHandler):
         # put the session in the db and update conference
         my_session = ConferenceSession.from_form(request, session_key)
 
-        # TODO: make sure that the session times fall between the conference
-        # times
-
-        # check if speaker already has a session within this conference
-        if conf.key in speaker.conferences:
-            # if yes retrieve the all the other session names for this speaker in this conference
-            # note the current session is not included because we don't want to
-            # retrieve it again, we can just pass the name
-            sessions_in_conference = [
-                skey.urlsafe() for skey in speaker.conferenceSessions if skey.parent() == conf.key]
-            # make this a featured speaker for this conference,
-            # as asked in task 4 of the project setting up a task to do this.
-            taskqueue.add(params={"speaker_name": speaker.displayName,
-                                  "sess_keys": sessions_in_conference,
-                                  "current_sess_name": my_session.name,
-                                  "conf": conf.name,
-                                  "conf_loc": conf.city},
-                          url='/tasks/add_featured_speaker')
+        # make sure that the session falls between the conference dates
+        self._checkSessionDates(my_session, conf)
 
         # use a transactional to make the updates
         # current function would not allow a transactional because of the id
         # allocation
-        self._putSessionAndSpeaker(my_session, conf, speaker)
-
-        # create an indexed document for the search API based on this session
-        self._add_to_search_index(my_session, speaker, conf)
+        self._putSession(my_session)
 
         return my_session.to_form(speaker)
 
     @staticmethod
-    def _setFeaturedSpeaker(
-            speaker_name, sess_keys, current_sess_name, conf, conf_loc):
-        ''' Sets the featured speaker in memchace '''
-
-        # get the sessions from sess_keys, we can assume that the sess_keys are valid since they
-        # are passed by the task
-        sessions = ndb.get_multi([ndb.Key(urlsafe=sk) for sk in sess_keys])
-        s_names = [s.name for s in sessions]
-        s_names.append(current_sess_name)
-        memcache.set(key=MEMCACHE_FEATURED_SPEAKER_KEY, value={"name": speaker_name,
-                                                               "sessions": s_names,
-                                                               "conf": conf,
-                                                               "conf_loc": conf_loc})
+    def _checkSessionDates(session, conf):
+        ''' raises a BadRequest if session starts outside of the dates of
+        conf (the dates it has) '''
+        if (conf.startDate and session.startDate < conf.startDate) or \
+                (conf.endDate and session.startDate > conf.endDate):
+            raise endpoints.BadRequestException(
+                "The session needs to start between the start and end "
+                "dates of the conference")
+
+    @staticmethod
+    def _setFeaturedSpeaker(websafe_session_key):
+        ''' adds a new session to the sessions of its speaker in its
+        conference, a speaker with more than one session becomes the
+        featured speaker of the conference (datastore and memcache) '''
+        # tasks queued before the summaries carry no session key
+        if not websafe_session_key:
+            return
+        session = ndb.Key(urlsafe=websafe_session_key).get()
+        # the session may have been deleted since the task was queued
+        if not session or not session.speakerKey:
+            return
+        speaker = entity_cache.get(session.speakerKey)
+        if not speaker:
+            return
+
+        featured = ApiHelper._addSpeakerSessions([session], speaker)
+        if featured:
+            ApiHelper._cacheFeaturedSpeaker(featured)
+
+    @staticmethod
+    def _cacheFeaturedSpeaker(featured):
+        ''' sets a new FeaturedSpeaker in memcache, as the featured speaker
+        of its conference and the latest one '''
+        value = featured.to_cache()
+        memcache.set_multi({
+            MEMCACHE_FEATURED_SPEAKER_KEY: value,
+            MEMCACHE_CONF_FEATURED_SPEAKER_KEY %
+            featured.key.parent().urlsafe(): value})
+
+    @staticmethod
+    def _speakerSessions(sessions, speaker_key):
+        ''' adds sessions of the same conference to the SpeakerSessions of
+        their speaker, returns it; meant to be called in a transaction on
+        the conference '''
+        conf_key = sessions[0].key.parent()
+        summary_key = SpeakerSessions.key_for(conf_key, speaker_key)
+        summary = summary_key.get()
+        changed = False
+        if not summary:
+            # first session of the speaker or a conference from before
+            # the summaries, start from the sessions already stored
+            summary = SpeakerSessions(key=summary_key)
+            for sess in ConferenceSession.query(ancestor=conf_key).filter(
+                    ConferenceSession.speakerKey == speaker_key):
+                summary.add(sess)
+            changed = True
+        if summary.speakerKey != speaker_key:
+            # summaries from before speakerKey
+            summary.speakerKey = speaker_key
+            changed = True
+        for session in sessions:
+            changed = summary.add(session) or changed
+        if changed:
+            summary.put()
+        return summary
+
+    @staticmethod
+    @ndb.transactional()
+    def _addSpeakerSessions(sessions, speaker):
+        ''' updates the SpeakerSessions of speaker with new sessions of the
+        same conference, returns the new FeaturedSpeaker of the conference
+        or None '''
+        conf_key = sessions[0].key.parent()
+        summary = ApiHelper._speakerSessions(sessions, speaker.key)
+
+        if len(summary.sessionKeys) < 2:
+            return None
+        conf = conf_key.get()
+        featured = FeaturedSpeaker(key=FeaturedSpeaker.key_for(conf_key),
+                                   speakerKey=speaker.key,
+                                   name=speaker.displayName,
+                                   sessions=summary.sessionNames,
+                                   conference=conf.name,
+                                   conferenceLocation=conf.city)
+        featured.put()
+        return featured
+
+    @staticmethod
+    def _getFeaturedSpeaker(conf_key=None):
+        ''' returns the featured speaker of a conference, or the latest one
+        of any conference, as a dict; memcache first, then the datastore '''
+        if conf_key:
+            cache_key = MEMCACHE_CONF_FEATURED_SPEAKER_KEY % conf_key.urlsafe()
+        else:
+            cache_key = MEMCACHE_FEATURED_SPEAKER_KEY
+        fs = memcache.get(cache_key)
+        if fs is None:
+            if conf_key:
+                featured = FeaturedSpeaker.key_for(conf_key).get()
+            else:
+                featured = FeaturedSpeaker.query().order(
+                    -FeaturedSpeaker.updated).get()
+            # remember that there is none too
+            fs = featured.to_cache() if featured else {}
+            memcache.set(cache_key, fs)
+        return fs
 
     @user_required
     def _registerSpeaker(self, request):
@@ -331,12 +636,78 @@ class ApiHelper(BaseHandler):
 
         speaker = ConferenceSpeaker(displayName=request.displayName)
         speaker.put()
+        entity_cache.refresh(speaker)
+        speaker_index.bump([speaker.key])
         return speaker.to_form()
 
+    def _getSpeakersByName(self, request):
+        ''' returns a page of the speakers matching request.displayName:
+        exact - the same displayName, by key
+        prefix - a word starting with each word of displayName, by name
+        autocomplete - same as prefix, names starting with displayName
+                       first then the shorter ones
+        fuzzy - names with similar trigrams, allowing typos, the most
+                similar first
+        exact and prefix page by cursor, autocomplete and fuzzy are ranked
+        by the directory of this instance and page by offset '''
+        match = request.match or 'exact'
+        if match not in ('exact', 'prefix', 'autocomplete', 'fuzzy'):
+            raise endpoints.BadRequestException(
+                "match needs to be exact, prefix, autocomplete or fuzzy")
+        if not request.displayName:
+            raise endpoints.BadRequestException("displayName is required")
+
+        if match in ('exact', 'prefix'):
+            if match == 'exact':
+                q = ConferenceSpeaker.query(
+                    ConferenceSpeaker.displayName == request.displayName)
+                q = q.order(ConferenceSpeaker.key)
+            else:
+                prefixes = speaker_index.query_prefixes(request.displayName)
+                if not prefixes:
+                    return mm.ConferenceSpeakerForms()
+                q = ConferenceSpeaker.query()
+                for prefix in prefixes:
+                    q = q.filter(ConferenceSpeaker.nameGrams == prefix)
+                q = q.order(ConferenceSpeaker.displayName,
+                            ConferenceSpeaker.key)
+            speakers, next_token = self._fetch_page(q, request)
+            return mm.ConferenceSpeakerForms(
+                items=ConferenceSpeaker.to_forms(speakers),
+                nextPageToken=next_token)
+
+        page_size = self._page_size(request)
+        try:
+            offset = int(request.pageToken or 0)
+        except ValueError:
+            offset = -1
+        if offset < 0:
+            raise endpoints.BadRequestException(
+                'the pageToken received is not valid')
+        directory = speaker_index.get_directory()
+        if match == 'autocomplete':
+            keys = directory.complete(request.displayName)
+        else:
+            keys = directory.similar(request.displayName)
+        speakers = entity_cache.get_multi(keys[offset:offset + page_size])
+        next_token = None
+        if offset + page_size < len(keys):
+            next_token = str(offset + page_size)
+        return mm.ConferenceSpeakerForms(
+            items=ConferenceSpeaker.to_forms(
+                [speaker for speaker in speakers if speaker]),
+            nextPageToken=next_token)
+
     def _queryproblem(self, request):
         ''' session query method to search for unavailable after a certain time (in int hour blocks)
         and exclude up to 3 types of sessions '''
 
+        if request.engine == "columnar":
+            return self._queryproblem_columnar(request)
+        elif request.engine not in (None, "datastore"):
+            raise endpoints.BadRequestException(
+                "engine needs to be either datastore or columnar")
+
         # to reduce friction we will only allow 3 excludes
         if len(request.exclude) > 3:
             raise endpoints.BadRequestException(
@@ -362,20 +733,58 @@ class ApiHelper(BaseHandler):
         for s_type in request.exclude:
             q = q.filter(ConferenceSession.type != s_type)
 
-        # order by conference type first since that is the inequality filter
-        q.order(ConferenceSession.type)
-        q.order(ConferenceSession.startTime)
+        # order by conference type first since that is the inequality filter,
+        # the key makes the order total so the query can be paged by cursor
+        q = q.order(ConferenceSession.type, ConferenceSession.startTime,
+                    ConferenceSession.key)
 
-        # fetch max 100 records
-        sessions = q.fetch(100)
+        # fetch one page of records
+        sessions, next_token = self._fetch_page(q, request)
 
-        speaker_keys = []
-        for sess in q:
-            speaker_keys.append(sess.speakerKey)
-        # get speakers for every session in order
-        speakers = ndb.get_multi(speaker_keys)
+        # get the speakers of the sessions in one batch
         return mm.ConferenceSessionForms(
-            items=[sessions[i].to_form(speakers[i]) for i in range(len(sessions))])
+            items=ConferenceSession.to_forms(sessions),
+            nextPageToken=next_token)
+
+    def _queryproblem_columnar(self, request):
+        ''' answers the query problem for one conference from its columnar
+        session index, any number of types can be included or excluded;
+        the pageToken is the offset of the next page '''
+        if not request.websafeConferenceKey:
+            raise endpoints.BadRequestException(
+                "the columnar engine needs a websafeConferenceKey")
+        conf_key = self.get_websafe_key(
+            request.websafeConferenceKey, "Conference")
+        if not entity_cache.get(conf_key):
+            raise endpoints.NotFoundException(
+                "The conference you requested was not found")
+
+        page_size = self._page_size(request)
+        try:
+            offset = int(request.pageToken or 0)
+        except ValueError:
+            offset = -1
+        if offset < 0:
+            raise endpoints.BadRequestException(
+                'the pageToken received is not valid')
+
+        # unavailable after afterTime means starting before it
+        windows = [(0, request.afterTime * 60)] if request.afterTime else None
+        ids = session_columns.get_columns(conf_key).find(
+            windows, set(request.include), set(request.exclude))
+
+        page = ids[offset:offset + page_size]
+        sessions = entity_cache.get_multi(
+            [ndb.Key(ConferenceSession, sess_id, parent=conf_key)
+             for sess_id in page])
+        next_token = None
+        if offset + page_size < len(ids):
+            next_token = str(offset + page_size)
+
+        return mm.ConferenceSessionForms(
+            items=ConferenceSession.to_forms(
+                [sess for sess in sessions if sess]),
+            nextPageToken=next_token)
 
     def _copy_session_doc_to_form(self, doc):
         ''' copies a ScoredDocument to ConferenceSessionForm_search '''
@@ -473,35 +882,407 @@ class ApiHelper(BaseHandler):
 
     @staticmethod
     def _cacheAnnouncement():
-        """Create Announcement & assign to memcache; used by
-        memcache cron job & putAnnouncement().
+        """Reconcile the nearly sold out announcement with the seat
+        counters; used by the memcache cron job. Registrations keep it up
+        to date, this only catches lost updates, one page at a time.
         """
-        confs = Conference.query(ndb.AND(
-            Conference.seatsAvailable <= 5,
-            Conference.seatsAvailable > 0)
-        ).fetch(projection=[Conference.name])
+        return announcement.reconcile()
+
+    @staticmethod
+    def _copyOrganizerNames(confs, names):
+        ''' sets organizerDisplayName on confs from names (organizerUserId ->
+        displayName), saves the conferences that changed '''
+        changed = []
+        for conf in confs:
+            name = names.get(conf.organizerUserId)
+            if name and conf.organizerDisplayName != name:
+                conf.organizerDisplayName = name
+                changed.append(conf)
+        if changed:
+            ndb.put_multi(changed)
+            entity_cache.refresh(*changed)
+            query_cache.bump()
+
+    @staticmethod
+    def _updateOrganizerName(websafe_profile_key, cursor=None):
+        ''' copies the organizer displayName on one batch of their
+        conferences, chains a task for the next batch; used by the task
+        queued by _doProfile '''
+        p_key = ndb.Key(urlsafe=websafe_profile_key)
+        prof = p_key.get()
+        if not prof:
+            return
+        confs, next_cursor, more = Conference.query(ancestor=p_key).fetch_page(
+            ORGANIZER_NAME_BATCH,
+            start_cursor=Cursor(urlsafe=cursor) if cursor else None)
+        ApiHelper._copyOrganizerNames(confs, {p_key.id(): prof.displayName})
+        if more and next_cursor:
+            taskqueue.add(params={'websafeProfileKey': websafe_profile_key,
+                                  'cursor': next_cursor.urlsafe()},
+                          url='/tasks/update_organizer_name')
+
+    @staticmethod
+    def _backfillOrganizerNames(cursor=None):
+        ''' one-off migration: stores organizerDisplayName on one batch of
+        the existing conferences, chains a task for the next batch '''
+        confs, next_cursor, more = Conference.query().fetch_page(
+            ORGANIZER_NAME_BATCH,
+            start_cursor=Cursor(urlsafe=cursor) if cursor else None)
+        p_keys = list(set(conf.key.parent() for conf in confs))
+        names = dict((prof.key.id(), prof.displayName)
+                     for prof in ndb.get_multi(p_keys) if prof)
+        ApiHelper._copyOrganizerNames(confs, names)
+        # conferences from before the property don't store it at all, not
+        # even None, and a projection on it would leave them out
+        unset = [conf for conf in confs
+                 if 'organizerDisplayName' not in conf._values]
+        if unset:
+            ndb.put_multi(unset)
+            entity_cache.refresh(*unset)
+        if more and next_cursor:
+            taskqueue.add(params={'cursor': next_cursor.urlsafe()},
+                          url='/tasks/backfill_organizer_names')
+        else:
+            # the summary projections can include organizerDisplayName
+            Migration(id='organizer_names').put()
+
+    @staticmethod
+    def _backfillSpeakerSessions(cursor=None):
+        ''' one-off migration: moves the legacy session lists of one batch
+        of speakers to SpeakerSessions and empties them, every speaker is
+        written again to store its nameGrams; chains a task for the next
+        batch '''
+        speakers, next_cursor, more = ConferenceSpeaker.query().fetch_page(
+            SPEAKER_BACKFILL_BATCH,
+            start_cursor=Cursor(urlsafe=cursor) if cursor else None)
+        for speaker in speakers:
+            if not speaker.conferences and not speaker.conferenceSessions:
+                continue
+            by_conf = {}
+            for sess in ndb.get_multi(speaker.conferenceSessions):
+                if sess and sess.speakerKey == speaker.key:
+                    by_conf.setdefault(sess.key.parent(), []).append(sess)
+            for conf_sessions in by_conf.values():
+                ndb.transaction(lambda: ApiHelper._speakerSessions(
+                    conf_sessions, speaker.key))
+            speaker.conferences = []
+            speaker.conferenceSessions = []
+        if speakers:
+            ndb.put_multi(speakers)
+            entity_cache.refresh(*speakers)
+        if more and next_cursor:
+            taskqueue.add(params={'cursor': next_cursor.urlsafe()},
+                          url='/tasks/backfill_speaker_sessions')
+
+    @user_required
+    def _startImport(self, request):
+        ''' stores a bulk import for the current user and queues its first
+        task, returns its ImportForm '''
+        if not request.data:
+            raise endpoints.BadRequestException(
+                "data needs to hold one JSON object per line")
+        job = ImportJob(parent=self.user.key,
+                        data=request.data.encode('utf-8'))
+        self._saveImport(job, '/tasks/import_entities')
+        return job.to_form()
+
+    @user_required
+    def _getImport(self, request):
+        ''' returns the ImportForm of one of the user's bulk imports '''
+        job_key = self.get_websafe_key(request.websafeImportKey, "ImportJob")
+        job = job_key.get()
+        if not job or job_key.parent() != self.user.key:
+            raise endpoints.NotFoundException(
+                'No import found with key: %s' % request.websafeImportKey)
+        return job.to_form()
 
+    @staticmethod
+    @ndb.transactional()
+    def _saveImport(job, url=None):
+        ''' saves job and queues its next task to url, only if it's saved '''
+        job.put()
+        if url:
+            taskqueue.add(params={'websafeImportKey': job.key.urlsafe()},
+                          url=url, transactional=True)
+
+    @staticmethod
+    def _importRows(job):
+        ''' parses the JSON lines of an import, returns the (line, row) pairs
+        of the rows of a known kind and the (line, message) errors '''
+        rows, errors = [], []
+        for line, text in enumerate(job.data.splitlines(), 1):
+            if not text.strip():
+                continue
+            try:
+                row = json.loads(text)
+            except ValueError as e:
+                errors.append((line, 'not valid JSON: %s' % e))
+                continue
+            if not isinstance(row, dict) or \
+                    row.get('kind') not in ('conference', 'speaker', 'session'):
+                errors.append(
+                    (line, 'kind needs to be conference, speaker or session'))
+                continue
+            rows.append((line, row))
+        return rows, errors
+
+    @staticmethod
+    def _importForm(message_type, row, **values):
+        ''' decodes a row as a message_type, without the fields only the
+        import uses '''
+        fields = dict((name, value) for name, value in row.iteritems()
+                      if name not in ('kind', 'ref', 'conference', 'speaker'))
+        fields.update(values)
+        return protojson.decode_message(message_type, json.dumps(fields))
+
+    @staticmethod
+    def _importKey(value, kind, refs):
+        ''' returns the key a session row refers to, by ref or websafe key '''
+        if value in refs:
+            key = ndb.Key(urlsafe=refs[value])
+        else:
+            try:
+                key = ndb.Key(urlsafe=value)
+            except (ProtocolBufferDecodeError, TypeError, ValueError):
+                key = None
+        if not key or key.kind() != kind:
+            raise endpoints.BadRequestException(
+                '%s is not a %s ref or key' % (value, kind))
+        return key
+
+    @staticmethod
+    def _importEntities(websafe_import_key):
+        ''' first task of a bulk import: creates the conferences and the
+        speakers and allocates the ids of the sessions, one range per
+        conference; the keys are saved on the job before anything is
+        written, so a retried task writes the same entities again '''
+        job = ndb.Key(urlsafe=websafe_import_key).get()
+        if not job or job.status not in ('queued', 'allocated'):
+            return
+        p_key = job.key.parent()
+        prof = p_key.get()
+        rows, errors = ApiHelper._importRows(job)
+        row_count = len(rows) + len(errors)
+
+        # build the conferences and speakers, their keys are set below
+        built = []
+        refs = set()
+        for line, row in rows:
+            if row['kind'] == 'session':
+                continue
+            ref = row.get('ref') or '#%d' % line
+            if ref in refs:
+                errors.append((line, 'the ref %s is used twice' % ref))
+                continue
+            try:
+                if row['kind'] == 'conference':
+                    data = ApiHelper._conferenceData(
+                        ApiHelper._importForm(mm.ConferenceForm, row))
+                    data['organizerUserId'] = p_key.id()
+                    data['organizerDisplayName'] = prof.displayName
+                    entity = Conference(**data)
+                else:
+                    form = ApiHelper._importForm(mm.ConferenceSpeakerForm, row)
+                    if not utils.is_valid_name(form.displayName):
+                        raise endpoints.BadRequestException(
+                            "displayName is not valid")
+                    entity = ConferenceSpeaker(displayName=form.displayName)
+            except (messages.Error, ValueError, datastore_errors.Error,
+                    endpoints.BadRequestException) as e:
+                errors.append((line, str(e)))
+                continue
+            refs.add(ref)
+            built.append((ref, entity))
+        confs = [(ref, entity) for ref, entity in built
+                 if isinstance(entity, Conference)]
+        speakers = [(ref, entity) for ref, entity in built
+                    if isinstance(entity, ConferenceSpeaker)]
+
+        if job.refs is None:
+            # one id range for the conferences and one for the speakers
+            job.refs = {}
+            if confs:
+                first, _ = Conference.allocate_ids(size=len(confs),
+                                                   parent=p_key)
+                for i, (ref, conf) in enumerate(confs):
+                    job.refs[ref] = ndb.Key(
+                        Conference, first + i, parent=p_key).urlsafe()
+            if speakers:
+                first, _ = ConferenceSpeaker.allocate_ids(size=len(speakers))
+                for i, (ref, speaker) in enumerate(speakers):
+                    job.refs[ref] = ndb.Key(
+                        ConferenceSpeaker, first + i).urlsafe()
+            job.sessions = ApiHelper._planImportSessions(
+                job, p_key, rows, errors)
+            job.rows = row_count
+            job.add_errors(sorted(errors))
+            job.status = 'allocated'
+            job.put()
+
+        for ref, entity in built:
+            entity.key = ndb.Key(urlsafe=job.refs[ref])
+        entities = [entity for ref, entity in built]
+        for i in xrange(0, len(entities), IMPORT_PUT_BATCH):
+            ndb.put_multi(entities[i:i + IMPORT_PUT_BATCH])
+        for ref, conf in confs:
+            seat_counter.init_seats(conf.key, conf.seatsAvailable)
+            # a new conference is not in the announcement yet
+            announcement.update(conf, conf.seatsAvailable, 0)
         if confs:
-            # If there are almost sold out conferences,
-            # format announcement and set it in memcache
-            announcement = ANNOUNCEMENT_TPL % (
-                ', '.join(conf.name for conf in confs))
-            memcache.set(MEMCACHE_ANNOUNCEMENTS_KEY, announcement)
+            query_cache.bump()
+        if speakers:
+            speaker_index.bump([speaker.key for ref, speaker in speakers])
+
+        job.imported = len(entities)
+        if job.sessions:
+            job.status = 'sessions'
+            ApiHelper._saveImport(job, '/tasks/import_sessions')
         else:
-            # If there are no sold out conferences,
-            # delete the memcache announcements entry
-            announcement = ""
-            memcache.delete(MEMCACHE_ANNOUNCEMENTS_KEY)
+            job.status = 'done'
+            ApiHelper._saveImport(job)
 
-        return announcement
+    @staticmethod
+    def _planImportSessions(job, p_key, rows, errors):
+        ''' resolves the conference and speaker of every session row and
+        allocates the session ids, one call per conference; returns the
+        [line, conference, speaker, id] of the rows that can be imported '''
+        planned = []
+        for line, row in rows:
+            if row['kind'] != 'session':
+                continue
+            try:
+                conf_key = ApiHelper._importKey(
+                    row.get('conference'), 'Conference', job.refs)
+                speaker_key = ApiHelper._importKey(
+                    row.get('speaker') or row.get('speakerKey'),
+                    'ConferenceSpeaker', job.refs)
+            except endpoints.BadRequestException as e:
+                errors.append((line, str(e)))
+                continue
+            planned.append((line, conf_key, speaker_key))
+
+        # conferences and speakers that were not imported need to exist,
+        # the conferences need to be the user's
+        imported = set(job.refs.values())
+        existing = list(set(
+            key for line, conf_key, speaker_key in planned
+            for key in (conf_key, speaker_key)
+            if key.urlsafe() not in imported))
+        found = dict((key, entity) for key, entity in
+                     zip(existing, ndb.get_multi(existing)) if entity)
+        counts = collections.Counter()
+        checked = []
+        for line, conf_key, speaker_key in planned:
+            if conf_key.urlsafe() not in imported and (
+                    conf_key not in found or conf_key.parent() != p_key):
+                errors.append((line, 'the conference %s was not found or '
+                               'belongs to a different user' %
+                               conf_key.urlsafe()))
+            elif speaker_key.urlsafe() not in imported and \
+                    speaker_key not in found:
+                errors.append((line, 'the speaker %s was not found' %
+                               speaker_key.urlsafe()))
+            else:
+                counts[conf_key] += 1
+                checked.append((line, conf_key, speaker_key))
+
+        next_ids = {}
+        for conf_key, count in counts.iteritems():
+            next_ids[conf_key], _ = ConferenceSession.allocate_ids(
+                size=count, parent=conf_key)
+        sessions = []
+        for line, conf_key, speaker_key in checked:
+            sessions.append([line, conf_key.urlsafe(), speaker_key.urlsafe(),
+                             next_ids[conf_key]])
+            next_ids[conf_key] += 1
+        return sessions
+
+    @staticmethod
+    def _importSessions(websafe_import_key):
+        ''' imports the next IMPORT_SESSION_BATCH sessions of a bulk import
+        and chains a task for the rest; the sessions are put by entity
+        group, every conference index and speaker summary is updated once
+        and the search documents are queued in batches '''
+        job = ndb.Key(urlsafe=websafe_import_key).get()
+        if not job or job.status != 'sessions':
+            return
+        lines = job.data.splitlines()
+        chunk = job.sessions[job.offset:job.offset + IMPORT_SESSION_BATCH]
+        message_type = mm.SESSION_POST_REQUEST.combined_message_class
+        conf_keys = list(set(ndb.Key(urlsafe=wsck)
+                             for line, wsck, wssk, sess_id in chunk))
+        confs = dict(zip(conf_keys, entity_cache.get_multi(conf_keys)))
+
+        sessions, errors, line_of = [], [], {}
+        for line, wsck, wssk, sess_id in chunk:
+            row = json.loads(lines[line - 1])
+            conf_key = ndb.Key(urlsafe=wsck)
+            try:
+                form = ApiHelper._importForm(message_type, row,
+                                             websafeConferenceKey=wsck,
+                                             speakerKey=wssk)
+                session = ConferenceSession.from_form(
+                    form, ndb.Key(ConferenceSession, sess_id,
+                                  parent=conf_key))
+                if confs[conf_key]:
+                    ApiHelper._checkSessionDates(session, confs[conf_key])
+            except (messages.Error, ValueError, datastore_errors.Error,
+                    endpoints.BadRequestException) as e:
+                errors.append((line, str(e)))
+                continue
+            sessions.append(session)
+            line_of[session.key] = line
+
+        # the sessions that would double-book their speaker are left out,
+        # the indexes are written first so a retried task sees the rest
+        added = set(sess.key for sess in
+                    session_columns.add_sessions(sessions, check_speakers=True))
+        errors.extend((line_of[sess.key],
+                       'the speaker already has a session at that time')
+                      for sess in sessions if sess.key not in added)
+        sessions = [sess for sess in sessions if sess.key in added]
+
+        # the sessions of a conference share its entity group, keep them
+        # together in the batches
+        sessions.sort(key=lambda sess: sess.key.parent().pairs())
+        for i in xrange(0, len(sessions), IMPORT_PUT_BATCH):
+            ndb.put_multi(sessions[i:i + IMPORT_PUT_BATCH])
+
+        search_indexer.queue_sessions([sess.key for sess in sessions])
+        for conf_key in set(sess.key.parent() for sess in sessions):
+            timetable.queue_rebuild(conf_key)
+        # the speaker summaries, which also relate the speakers to the
+        # conferences, and the featured speaker of each conference
+        speaker_keys = list(set(sess.speakerKey for sess in sessions))
+        speakers = dict((speaker.key, speaker) for speaker in
+                        entity_cache.get_multi(speaker_keys) if speaker)
+        by_conf_speaker = {}
+        for sess in sessions:
+            by_conf_speaker.setdefault(
+                (sess.key.parent(), sess.speakerKey), []).append(sess)
+        for (conf_key, speaker_key), group in by_conf_speaker.iteritems():
+            if speaker_key in speakers:
+                featured = ApiHelper._addSpeakerSessions(
+                    group, speakers[speaker_key])
+                if featured:
+                    ApiHelper._cacheFeaturedSpeaker(featured)
+
+        job.offset += len(chunk)
+        job.imported += len(sessions)
+        job.add_errors(errors)
+        if job.offset < len(job.sessions):
+            ApiHelper._saveImport(job, '/tasks/import_sessions')
+        else:
+            job.status = 'done'
+            ApiHelper._saveImport(job)
 
     def _createConferenceObject(self, request):
         """Create or update Conference object, returning ConferenceForm/request."""
         # preload necessary data items
-        user = endpoints.get_current_user()
+        user = self.auth_user
         if not user:
             raise endpoints.UnauthorizedException('Authorization required')
-        user_id = utils.getUserId(user)
+        user_id = self.user_id
 
         # modify function to not allow creation of conferences without having a
         # profile
@@ -509,6 +1290,36 @@ class ApiHelper(BaseHandler):
             raise endpoints.ForbiddenException(
                 "Before creating conferences, you need a profile, run getProfile method first")
 
+        data = self._conferenceData(request)
+
+        # generate Profile Key based on user ID and Conference
+        # ID based on Profile key get Conference key from ID
+        p_key = ndb.Key(Profile, user_id)
+        c_id = Conference.allocate_ids(size=1, parent=p_key)[0]
+        c_key = ndb.Key(Conference, c_id, parent=p_key)
+        data['key'] = c_key
+        data['organizerUserId'] = request.organizerUserId = user_id
+        # store the organizer name so listings don't need to get the Profile
+        data['organizerDisplayName'] = request.organizerDisplayName = \
+            self.user.displayName
+
+        # create Conference, send email to organizer confirming
+        # creation of Conference & return (modified) ConferenceForm
+        conf = Conference(**data)
+        conf.put()
+        entity_cache.refresh(conf)
+        seat_counter.init_seats(c_key, data['seatsAvailable'])
+        query_cache.bump()
+        taskqueue.add(params={'email': user.email(),
+                              'conferenceInfo': repr(request)},
+                      url='/tasks/send_confirmation_email'
+                      )
+        return request
+
+    @staticmethod
+    def _conferenceData(request):
+        """Copy a new conference's ConferenceForm into a dict of Conference
+        properties, filling in the defaults (on the form too)."""
         if not request.name:
             raise endpoints.BadRequestException(
                 "Conference 'name' field required")
@@ -519,7 +1330,6 @@ class ApiHelper(BaseHandler):
                 request,
                 field.name) for field in request.all_fields()}
         del data['websafeKey']
-        del data['organizerDisplayName']
 
         # add default values for those missing (both data model & outbound
         # Message)
@@ -547,29 +1357,13 @@ class ApiHelper(BaseHandler):
         # set seatsAvailable to be same as maxAttendees on creation
         if data["maxAttendees"] > 0:
             data["seatsAvailable"] = data["maxAttendees"]
-        # generate Profile Key based on user ID and Conference
-        # ID based on Profile key get Conference key from ID
-        p_key = ndb.Key(Profile, user_id)
-        c_id = Conference.allocate_ids(size=1, parent=p_key)[0]
-        c_key = ndb.Key(Conference, c_id, parent=p_key)
-        data['key'] = c_key
-        data['organizerUserId'] = request.organizerUserId = user_id
-
-        # create Conference, send email to organizer confirming
-        # creation of Conference & return (modified) ConferenceForm
-        Conference(**data).put()
-        taskqueue.add(params={'email': user.email(),
-                              'conferenceInfo': repr(request)},
-                      url='/tasks/send_confirmation_email'
-                      )
-        return request
+        return data
 
     @ndb.transactional()
     def _updateConferenceObject(self, request):
-        user = endpoints.get_current_user()
-        if not user:
+        if not self.auth_user:
             raise endpoints.UnauthorizedException('Authorization required')
-        user_id = utils.getUserId(user)
+        user_id = self.user_id
 
         # copy ConferenceForm/ProtoRPC Message into dict
         data = {
@@ -588,10 +1382,15 @@ class ApiHelper(BaseHandler):
         if user_id != conf.organizerUserId:
             raise endpoints.ForbiddenException(
                 'Only the owner can update the conference.')
+        search_values = conf.search_values()
+        name = conf.name
 
         # Not getting all the fields, so don't create a new object; just
         # copy relevant fields from ConferenceForm to Conference object
         for field in request.all_fields():
+            # the organizer name follows the Profile, see _updateOrganizerName
+            if field.name == 'organizerDisplayName':
+                continue
             data = getattr(request, field.name)
             # only copy fields where we get data
             if data not in (None, []):
@@ -603,10 +1402,23 @@ class ApiHelper(BaseHandler):
                 # write to Conference object
                 setattr(conf, field.name, data)
         conf.put()
-        prof = ndb.Key(Profile, user_id).get()
+        entity_cache.refresh(conf)
+        query_cache.bump()
+        calendar_feed.bump()
+        # the session search documents copy some conference fields
+        if conf.search_values() != search_values:
+            search_indexer.queue_conference(conf.key, transactional=True)
+        # seats are counted by the seat counter shards, restart them from
+        # the new value if the organizer set one
+        if request.seatsAvailable is not None:
+            seat_counter.reset_seats(conf.key, request.seatsAvailable)
+            announcement.update(conf, request.seatsAvailable)
+        elif conf.name != name:
+            # the announcement shows the name
+            announcement.update(conf, seat_counter.seats_available(conf))
         # by @Robert_Avram: replaced the self._copyConferenceToForm with
-        # conf.to_form
-        return conf.to_form(getattr(prof, 'displayName'))
+        # conf.to_form; the shards are only reset after the commit
+        return conf.to_form(None, request.seatsAvailable)
 
     def _getQuery(self, request):
         """Return formatted query from the submitted filters."""
@@ -619,6 +1431,8 @@ class ApiHelper(BaseHandler):
         else:
             q = q.order(ndb.GenericProperty(inequality_filter))
             q = q.order(Conference.name)
+        # the key makes the order total, needed to page "!=" queries by cursor
+        q = q.order(Conference.key)
 
         filters = sorted(filters, key=lambda k: k['field'])
 
@@ -677,56 +1491,38 @@ class ApiHelper(BaseHandler):
 
     # - - - Profile objects - - - - - - - - - - - - - - - - - - -
 
-    # TODO: replace _copyProfileToForm with a to_form method on the Profile
-    # model
-    def _copyProfileToForm(self, prof):
-        """Copy relevant fields from Profile to ProfileForm."""
-        # copy relevant fields from Profile to ProfileForm
-        pf = mm.ProfileForm()
-        for field in pf.all_fields():
-            if hasattr(prof, field.name):
-                # convert t-shirt string to Enum; just copy others
-                if field.name == 'teeShirtSize':
-                    setattr(
-                        pf,
-                        field.name,
-                        getattr(
-                            mm.TeeShirtSize,
-                            getattr(
-                                prof,
-                                field.name)))
-                else:
-                    setattr(pf, field.name, getattr(prof, field.name))
-        pf.check_initialized()
-        return pf
-
     def _getProfileFromUser(self):
         """Return user Profile from datastore, creating new one if non-existent."""
         # make sure user is authed
-        user = endpoints.get_current_user()
+        user = self.auth_user
         if not user:
             raise endpoints.UnauthorizedException('Authorization required')
 
-        # get Profile from datastore
-        user_id = utils.getUserId(user)
-        p_key = ndb.Key(Profile, user_id)
-        profile = p_key.get()
+        # get Profile from the request context
+        profile = self.user
         # create new Profile if not there
         if not profile:
-            profile = Profile(
-                key=p_key,
-                displayName=user.nickname(),
-                mainEmail=user.email(),
-                teeShirtSize=str(mm.TeeShirtSize.NOT_SPECIFIED),
-            )
+            profile = self._newProfile()
             profile.put()
+            self.context.set_profile(profile)
 
         return profile      # return Profile
 
+    def _newProfile(self):
+        """Return a new (unsaved) Profile for the current user."""
+        user = self.auth_user
+        return Profile(
+            key=self.context.profile_key,
+            displayName=user.nickname(),
+            mainEmail=user.email(),
+            teeShirtSize=str(mm.TeeShirtSize.NOT_SPECIFIED),
+        )
+
     def _doProfile(self, save_request=None):
         """Get user Profile and return to user, possibly updating it first."""
         # get user Profile
         prof = self._getProfileFromUser()
+        old_name = prof.displayName
 
         # if saveProfile(), process user-modifyable fields
         if save_request:
@@ -741,5 +1537,29 @@ class ApiHelper(BaseHandler):
                         #    setattr(prof, field, val)
                         prof.put()
 
+            # the organizer name is copied on every conference of the user,
+            # update them in the background
+            if prof.displayName != old_name:
+                taskqueue.add(params={'websafeProfileKey': prof.key.urlsafe()},
+                              url='/tasks/update_organizer_name')
+
         # return ProfileForm
-        return self._copyProfileToForm(prof)
+        return prof.to_form()
+
+    def _getCalendarFeed(self):
+        """Return the URL of the user's calendar feed, giving the Profile
+        a secret for it on first use."""
+        if not self.auth_user:
+            raise endpoints.UnauthorizedException('Authorization required')
+        return mm.StringMessage(
+            data=calendar_feed.feed_url(self._setCalendarSecret()))
+
+    @ndb.transactional()
+    def _setCalendarSecret(self):
+        """Return the user's Profile (read once, in the transaction), made
+        and given a calendar feed secret if needed."""
+        prof = self.context.profile_for_update(self._newProfile)
+        if not prof.calendarSecret:
+            prof.calendarSecret = uuid.uuid4().hex
+            prof.put()
+        return prof
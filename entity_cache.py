@@ -0,0 +1,156 @@
+"""
+entity_cache.py -- Udacity conference server-side Python App Engine
+    read-through / write-through cache for Conference, ConferenceSpeaker
+    and ConferenceSession entities
+
+    lookups go through a small per-request LRU, then memcache, then the
+    datastore; writers call refresh() or invalidate() so both tiers follow
+    the datastore once the surrounding transaction commits
+"""
+
+import collections
+import logging
+import os
+import threading
+
+from google.appengine.api import memcache
+from google.appengine.ext import ndb
+
+from settings import ENTITY_CACHE_VERSION
+from settings import ENTITY_CACHE_LOCAL_SIZE
+from settings import MEMCACHE_ENTITY_KEY
+from settings import MEMCACHE_ENTITY_TIMEOUT
+
+
+_local = threading.local()
+
+# hit/miss counters for this instance, see stats()
+_stats = collections.Counter()
+
+
+def _cache_key(key):
+    ''' returns the versioned memcache key of an entity key, bumping
+    ENTITY_CACHE_VERSION drops every cached entity at once '''
+    return MEMCACHE_ENTITY_KEY % (ENTITY_CACHE_VERSION, key.urlsafe())
+
+
+def _request_cache():
+    ''' returns the LRU of the current request, os.environ is request
+    local on App Engine so the LRU is started over for every request '''
+    request_id = os.environ.get('REQUEST_LOG_ID')
+    if getattr(_local, 'request_id', None) != request_id or \
+            not hasattr(_local, 'lru'):
+        _local.request_id = request_id
+        _local.lru = collections.OrderedDict()
+    return _local.lru
+
+
+def _remember(key, entity):
+    ''' puts an entity at the top of the request LRU '''
+    lru = _request_cache()
+    lru.pop(key, None)
+    lru[key] = entity
+    while len(lru) > ENTITY_CACHE_LOCAL_SIZE:
+        lru.popitem(last=False)
+
+
+@ndb.tasklet
+def get_multi_async(keys):
+    ''' tasklet version of get_multi, the memcache and datastore lookups
+    are batched with the other pending ndb operations '''
+    # transactions need to read from the datastore itself
+    if ndb.in_transaction():
+        entities = yield ndb.get_multi_async(keys)
+        raise ndb.Return(entities)
+
+    lru = _request_cache()
+    found = {}
+    for key in keys:
+        if key in lru and key not in found:
+            found[key] = lru.pop(key)
+            lru[key] = found[key]
+            _stats['local_hits'] += 1
+
+    missing = []
+    for key in keys:
+        if key not in found and key not in missing:
+            missing.append(key)
+
+    if missing:
+        ctx = ndb.get_context()
+        cached = yield [ctx.memcache_get(_cache_key(key)) for key in missing]
+        not_cached = []
+        for key, entity in zip(missing, cached):
+            if entity is None:
+                not_cached.append(key)
+            else:
+                found[key] = entity
+                _remember(key, entity)
+                _stats['memcache_hits'] += 1
+
+        if not_cached:
+            entities = yield ndb.get_multi_async(not_cached)
+            to_cache = []
+            for key, entity in zip(not_cached, entities):
+                _stats['misses'] += 1
+                # missing entities are not cached, they will be looked up
+                # again next time
+                if entity is not None:
+                    found[key] = entity
+                    to_cache.append(ctx.memcache_set(
+                        _cache_key(key), entity, time=MEMCACHE_ENTITY_TIMEOUT))
+                    _remember(key, entity)
+            if to_cache:
+                yield to_cache
+            logging.debug('entity_cache: %d of %d keys read from the datastore',
+                          len(not_cached), len(keys))
+
+    raise ndb.Return([found.get(key) for key in keys])
+
+
+def get_multi(keys):
+    ''' returns the entities for keys in order, None for the missing ones '''
+    return get_multi_async(keys).get_result()
+
+
+@ndb.tasklet
+def get_async(key):
+    ''' tasklet version of get '''
+    entities = yield get_multi_async([key])
+    raise ndb.Return(entities[0])
+
+
+def get(key):
+    ''' returns the entity for key or None '''
+    return get_async(key).get_result()
+
+
+def refresh(*entities):
+    ''' write-through for entities that were just put, they are cached
+    once the current transaction commits (right away outside of one) '''
+    def write():
+        memcache.set_multi({_cache_key(entity.key): entity
+                            for entity in entities},
+                           time=MEMCACHE_ENTITY_TIMEOUT)
+        for entity in entities:
+            _remember(entity.key, entity)
+    ndb.get_context().call_on_commit(write)
+
+
+def invalidate(*keys):
+    ''' drops keys from both cache tiers once the current transaction
+    commits (right away outside of one) '''
+    def drop():
+        memcache.delete_multi([_cache_key(key) for key in keys])
+        lru = _request_cache()
+        for key in keys:
+            lru.pop(key, None)
+    ndb.get_context().call_on_commit(drop)
+
+
+def stats():
+    ''' returns the hit/miss counters of this instance, every hit is a
+    datastore read that was saved '''
+    counters = dict(_stats)
+    counters['saved_reads'] = _stats['local_hits'] + _stats['memcache_hits']
+    return counters
@@ -0,0 +1,83 @@
+"""
+form_serializer.py -- Udacity conference server-side Python App Engine
+    copies ndb entities to protorpc messages
+
+    which entity property (and converter) or function fills each field of a
+    message is worked out once per model class (and projection), the first
+    time an entity of that class is serialized, instead of looking every
+    field up again for every entity
+"""
+
+import operator
+
+from google.appengine.ext import ndb
+
+
+def _property_getter(name, converter):
+    ''' returns a getter for the property name of an entity '''
+    get = operator.attrgetter(name)
+    if converter is None:
+        return lambda entity, related: get(entity)
+    return lambda entity, related: converter(get(entity))
+
+
+class FormSerializer(object):
+
+    '''FormSerializer -- copies entities to message_class; converters maps
+    field names to functions applied to the property of the same name,
+    computed maps field names to functions of (entity, related) for the
+    fields that don't come from a property'''
+
+    def __init__(self, message_class, converters=None, computed=None):
+        self.message_class = message_class
+        self.converters = converters or {}
+        self.computed = computed or {}
+        self._plans = {}
+
+    def _plan(self, entity):
+        ''' returns the (field name, getter) pairs for the class of entity,
+        only the projected properties are read from projection entities '''
+        model_class = type(entity)
+        projection = entity._projection or ()
+        plan = self._plans.get((model_class, projection))
+        if plan is None:
+            plan = []
+            for field in self.message_class.all_fields():
+                if field.name in self.computed:
+                    plan.append((field.name, self.computed[field.name]))
+                elif isinstance(getattr(model_class, field.name, None),
+                                ndb.Property) and \
+                        (not projection or field.name in projection):
+                    plan.append((field.name, _property_getter(
+                        field.name, self.converters.get(field.name))))
+            plan = self._plans[(model_class, projection)] = tuple(plan)
+        return plan
+
+    def to_form(self, entity, related=None, **values):
+        ''' returns the message for entity, related is passed on to the
+        computed fields and values are set last, as given '''
+        form = self.message_class()
+        for name, get in self._plan(entity):
+            value = get(entity, related)
+            if value is not None:
+                setattr(form, name, value)
+        for name, value in values.iteritems():
+            setattr(form, name, value)
+        form.check_initialized()
+        return form
+
+    def to_dict(self, entity, related=None, **values):
+        ''' returns the fields the message for entity would have, as a dict
+        json can encode, without building the message '''
+        fields = {}
+        for name, get in self._plan(entity):
+            value = get(entity, related)
+            if value is not None:
+                fields[name] = value
+        fields.update(values)
+        return fields
+
+    def to_forms(self, entities, related=None):
+        ''' returns the messages for entities, in order '''
+        to_form = self.to_form
+        return [to_form(entity, related) for entity in entities]
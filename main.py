@@ -10,10 +10,29 @@ main.py -- Udacity conference server-side Python App Engine
 
 __author__ = 'Robert Avram'
 
+import calendar
+import hashlib
+import json
+
+import endpoints
 import webapp2
 from google.appengine.api import app_identity
 from google.appengine.api import mail
+from google.appengine.api import taskqueue
+from google.appengine.ext import ndb
+from protorpc import protojson
 from conference import ConferenceApi
+from models import ConferenceSession
+from models import ConferenceSpeaker
+from settings import SEARCH_QUEUE
+import announcement
+import calendar_feed
+import entity_cache
+import message_models as mm
+import query_cache
+import search_indexer
+import session_columns
+import timetable
 
 
 class SetAnnouncementHandler(webapp2.RequestHandler):
@@ -24,16 +43,277 @@ class SetAnnouncementHandler(webapp2.RequestHandler):
         self.response.set_status(204)
 
 
+class ImportEntitiesHandler(webapp2.RequestHandler):
+
+    def post(self):
+        """Create the conferences and speakers of a bulk import"""
+        ConferenceApi._importEntities(self.request.get('websafeImportKey'))
+
+
+class ImportSessionsHandler(webapp2.RequestHandler):
+
+    def post(self):
+        """Import the next batch of sessions of a bulk import"""
+        ConferenceApi._importSessions(self.request.get('websafeImportKey'))
+
+
+class ReconcileAnnouncementHandler(webapp2.RequestHandler):
+
+    def post(self):
+        """Reconcile the announcement with the next page of conferences"""
+        announcement.reconcile(self.request.get('cursor'))
+
+
 class AddFeaturedSpeaker(webapp2.RequestHandler):
 
     def post(self):
         """Set Featured Speaker"""
-        ConferenceApi._setFeaturedSpeaker(self.request.get("speaker_name"),
-                                          self.request.get_all("sess_keys"),
-                                          self.request.get(
-                                              "current_sess_name"),
-                                          self.request.get("conf"),
-                                          self.request.get("conf_loc"))
+        ConferenceApi._setFeaturedSpeaker(
+            self.request.get("websafeSessionKey"))
+
+
+class UpdateOrganizerNameHandler(webapp2.RequestHandler):
+
+    def post(self):
+        """Copy an organizer's displayName to their conferences"""
+        ConferenceApi._updateOrganizerName(
+            self.request.get('websafeProfileKey'),
+            self.request.get('cursor'))
+
+
+class BackfillOrganizerNamesHandler(webapp2.RequestHandler):
+
+    def get(self):
+        """Start the organizer displayName backfill"""
+        taskqueue.add(url='/tasks/backfill_organizer_names')
+        self.response.set_status(202)
+
+    def post(self):
+        """Store organizerDisplayName on a batch of existing conferences"""
+        ConferenceApi._backfillOrganizerNames(self.request.get('cursor'))
+
+
+class BackfillSpeakerSessionsHandler(webapp2.RequestHandler):
+
+    def get(self):
+        """Start moving the speakers' session lists to SpeakerSessions"""
+        taskqueue.add(url='/tasks/backfill_speaker_sessions')
+        self.response.set_status(202)
+
+    def post(self):
+        """Move the session lists of a batch of speakers"""
+        ConferenceApi._backfillSpeakerSessions(self.request.get('cursor'))
+
+
+class IndexSessionsHandler(webapp2.RequestHandler):
+
+    def post(self):
+        """Write the search documents of a batch of queued sessions"""
+        search_indexer.index_queued()
+
+
+class ReindexSessionsHandler(webapp2.RequestHandler):
+
+    def get(self):
+        """Start rebuilding the sessions search index"""
+        taskqueue.add(url='/tasks/reindex_sessions', queue_name=SEARCH_QUEUE)
+        self.response.set_status(202)
+
+    def post(self):
+        """Rebuild the search documents of a page of sessions"""
+        search_indexer.reindex_all(self.request.get('cursor'))
+
+
+class ReindexConferenceHandler(webapp2.RequestHandler):
+
+    def post(self):
+        """Rewrite the search documents of a page of a conference's sessions"""
+        search_indexer.reindex_conference(
+            ndb.Key(urlsafe=self.request.get('websafeConferenceKey')),
+            self.request.get('cursor'))
+
+
+class ReindexSpeakerHandler(webapp2.RequestHandler):
+
+    def post(self):
+        """Rewrite the search documents of a page of a speaker's sessions"""
+        search_indexer.reindex_speaker(
+            ndb.Key(urlsafe=self.request.get('websafeSpeakerKey')),
+            self.request.get('cursor'))
+
+
+class RebuildSessionColumnsHandler(webapp2.RequestHandler):
+
+    def post(self):
+        """Rebuild the columnar session index and the timetable of a
+        conference"""
+        conf_key = ndb.Key(urlsafe=self.request.get('websafeConferenceKey'))
+        session_columns.rebuild(conf_key)
+        timetable.rebuild(conf_key)
+
+
+class UpdateTimetableHandler(webapp2.RequestHandler):
+
+    def post(self):
+        """Put a new session in the timetable of its conference, or rebuild
+        the timetable of a conference"""
+        if self.request.get('websafeSessionKey'):
+            timetable.add_session(
+                ndb.Key(urlsafe=self.request.get('websafeSessionKey')))
+        else:
+            timetable.rebuild(
+                ndb.Key(urlsafe=self.request.get('websafeConferenceKey')))
+
+
+class JsonListHandler(webapp2.RequestHandler):
+
+    """Base of the JSON routes that mirror the list endpoints; the items
+    are written one by one as they are encoded and the response carries an
+    ETag, so an unchanged list is answered with a 304"""
+
+    def write_items(self, items, next_token, etag):
+        """Send items, JSON strings, as they are produced, or a 304 if the
+        client has etag"""
+        self.response.headers['ETag'] = etag
+        # cached copies must be revalidated with If-None-Match
+        self.response.headers['Cache-Control'] = 'no-cache'
+        if etag in self.request.headers.get('If-None-Match', ''):
+            self.response.set_status(304)
+            return
+        self.response.headers['Content-Type'] = 'application/json'
+        self.response.app_iter = self._chunks(items, next_token)
+
+    @staticmethod
+    def _chunks(items, next_token):
+        yield '{"items":['
+        for i, item in enumerate(items):
+            yield ',' + item if i else item
+        yield ']'
+        if next_token:
+            yield ',"nextPageToken":%s' % json.dumps(next_token)
+        yield '}'
+
+    def write_dicts(self, items, next_token):
+        """Send items, dicts built straight from the entities; the lists
+        that have no generation to tell they changed get the digest of the
+        encoded items as ETag"""
+        encoded = [json.dumps(item, separators=(',', ':')) for item in items]
+        digest = hashlib.md5('\n'.join(encoded))
+        digest.update('\n%s' % (next_token or ''))
+        self.write_items(encoded, next_token, '"%s"' % digest.hexdigest())
+
+    def handle_exception(self, exception, debug):
+        # the ApiHelper methods raise endpoints exceptions
+        if isinstance(exception, endpoints.ServiceException):
+            self.response.set_status(exception.http_status)
+            self.response.headers['Content-Type'] = 'application/json'
+            self.response.write(json.dumps(
+                {'error': {'message': exception.message}}))
+        else:
+            super(JsonListHandler, self).handle_exception(exception, debug)
+
+
+class ConferencesJsonHandler(JsonListHandler):
+
+    def get(self):
+        """JSON version of queryConferences, filters is a JSON list of
+        {field, operator, value} objects; the pages come from the result
+        cache of queryConferences and their ETag from its generation and
+        the seats available, so an unchanged page is answered without
+        running the query"""
+        try:
+            filters = json.loads(self.request.get('filters') or '[]')
+            if any(f.get('value') is None for f in filters):
+                raise ValueError('a filter has no value')
+            request = mm.ConferenceQueryForms(
+                filters=[mm.ConferenceQueryForm(
+                    field=f.get('field'), operator=f.get('operator'),
+                    value=unicode(f['value']))
+                    for f in filters],
+                pageSize=int(self.request.get('pageSize') or 0) or None,
+                pageToken=self.request.get('pageToken') or None,
+                summary=self.request.get('summary') in ('1', 'true'))
+        except (ValueError, TypeError, AttributeError):
+            raise endpoints.BadRequestException('the filters are not valid')
+
+        api = ConferenceApi()
+        forms = api.queryConferences(request)
+        etag = query_cache.etag(api._formatFilters(request.filters)[1],
+                                request.pageSize, request.pageToken,
+                                request.summary,
+                                [form.seatsAvailable for form in forms.items])
+        self.write_items((protojson.encode_message(form)
+                          for form in forms.items),
+                         forms.nextPageToken, etag)
+
+
+class ConferenceSessionsJsonHandler(JsonListHandler):
+
+    def get(self, websafeConferenceKey):
+        """JSON version of getConferenceSessions"""
+        try:
+            request = mm.CONF_SESSIONS_REQUEST.combined_message_class(
+                websafeConferenceKey=websafeConferenceKey,
+                pageSize=int(self.request.get('pageSize') or 0) or None,
+                pageToken=self.request.get('pageToken') or None)
+        except ValueError:
+            raise endpoints.BadRequestException('pageSize is not valid')
+        conf_key = ConferenceApi.get_websafe_key(websafeConferenceKey,
+                                                 "Conference")
+        conf_future = entity_cache.get_async(conf_key)
+        sessions, next_token = ConferenceApi._fetch_page(
+            ConferenceSession.query(ancestor=conf_key), request)
+        items = ConferenceSession.to_dicts_async(sessions).get_result()
+        if not conf_future.get_result():
+            raise endpoints.NotFoundException(
+                "The conference you are looking for does not exist")
+        self.write_dicts(items, next_token)
+
+
+class SpeakersJsonHandler(JsonListHandler):
+
+    def get(self):
+        """JSON version of getSpeakers"""
+        try:
+            request = mm.GET_SPEAKERS.combined_message_class(
+                pageSize=int(self.request.get('pageSize') or 0) or None,
+                pageToken=self.request.get('pageToken') or None)
+        except ValueError:
+            raise endpoints.BadRequestException('pageSize is not valid')
+        q = ConferenceSpeaker.query().order(ConferenceSpeaker.displayName,
+                                            ConferenceSpeaker.key)
+        speakers, next_token = ConferenceApi._fetch_page(q, request)
+        self.write_dicts(ConferenceSpeaker.to_dicts(speakers), next_token)
+
+
+class CalendarFeedHandler(webapp2.RequestHandler):
+
+    def get(self, websafeProfileKey, secret):
+        """iCalendar feed of the conferences a user attends and the sessions
+        in their wish list; the events are written batch by batch as the
+        response is sent, an unchanged feed is answered with a 304"""
+        feed = calendar_feed.lookup(websafeProfileKey, secret)
+        if not feed:
+            self.abort(404)
+        etag, modified, items = feed
+
+        self.response.headers['ETag'] = etag
+        self.response.headers['Last-Modified'] = calendar_feed.http_date(
+            modified)
+        self.response.headers['Cache-Control'] = 'private, no-cache'
+        if 'If-None-Match' in self.request.headers:
+            not_modified = etag in self.request.headers['If-None-Match']
+        else:
+            since = self.request.if_modified_since
+            not_modified = since is not None and \
+                calendar.timegm(since.utctimetuple()) >= int(modified)
+        if not_modified:
+            self.response.set_status(304)
+            return
+
+        self.response.headers['Content-Type'] = 'text/calendar; charset=utf-8'
+        self.response.app_iter = calendar_feed.events(
+            ndb.Key(urlsafe=websafeProfileKey), items)
 
 
 class SendConfirmationEmailHandler(webapp2.RequestHandler):
@@ -55,4 +335,20 @@ app = webapp2.WSGIApplication([
     ('/crons/set_announcement', SetAnnouncementHandler),
     ('/tasks/send_confirmation_email', SendConfirmationEmailHandler),
     ('/tasks/add_featured_speaker', AddFeaturedSpeaker),
+    ('/tasks/update_organizer_name', UpdateOrganizerNameHandler),
+    ('/tasks/backfill_organizer_names', BackfillOrganizerNamesHandler),
+    ('/tasks/backfill_speaker_sessions', BackfillSpeakerSessionsHandler),
+    ('/tasks/index_sessions', IndexSessionsHandler),
+    ('/tasks/reindex_sessions', ReindexSessionsHandler),
+    ('/tasks/reindex_conference', ReindexConferenceHandler),
+    ('/tasks/reindex_speaker', ReindexSpeakerHandler),
+    ('/tasks/rebuild_session_columns', RebuildSessionColumnsHandler),
+    ('/tasks/update_timetable', UpdateTimetableHandler),
+    ('/tasks/reconcile_announcement', ReconcileAnnouncementHandler),
+    ('/tasks/import_entities', ImportEntitiesHandler),
+    ('/tasks/import_sessions', ImportSessionsHandler),
+    ('/json/conferences', ConferencesJsonHandler),
+    ('/json/conferences/([^/]+)/sessions', ConferenceSessionsJsonHandler),
+    ('/json/speakers', SpeakersJsonHandler),
+    (r'/calendar/([^/]+)/([0-9a-f]+)\.ics', CalendarFeedHandler),
 ], debug=True)
@@ -69,9 +69,19 @@ class ConferenceSessionForm_search(messages.Message):
     conferenceCity  = messages.StringField(11)
     conferenceDescription = messages.StringField(12)
     
+class SessionSlotForm(messages.Message):
+    """SessionSlotForm -- the sessions of a conference starting in the same
+    hour (startTimeSlot) of a day, in order"""
+    startDate = messages.StringField(1)
+    startTimeSlot = messages.IntegerField(2)
+    items = messages.MessageField(ConferenceSessionFormOut, 3, repeated=True)
+
 class ConferenceSessionForms(messages.Message):
-    """ConferenceSessionForms -- multiple ConferenceSession form message"""
+    """ConferenceSessionForms -- multiple ConferenceSession form message,
+    the timetable mode of getConferenceSessions fills slots instead of items"""
     items = messages.MessageField(ConferenceSessionFormOut, 1, repeated=True)
+    nextPageToken = messages.StringField(2)
+    slots = messages.MessageField(SessionSlotForm, 3, repeated=True)
 
 class ConferenceSessionForms_search(messages.Message):
     """ConferenceSessionForms -- multiple ConferenceSession form message"""
@@ -92,6 +102,7 @@ class ConferenceSpeakerFormOut(messages.Message):
 class ConferenceSpeakerForms(messages.Message):
     '''Conference Speaker - Speaker Profile form message'''
     items = messages.MessageField(ConferenceSpeakerFormOut, 1, repeated=True)
+    nextPageToken = messages.StringField(2)
     
 class ConferenceForm(messages.Message):
     """ConferenceForm -- Conference outbound form message"""
@@ -112,12 +123,20 @@ class ConferenceForm(messages.Message):
 class ConferenceForms(messages.Message):
     """ConferenceForms -- multiple Conference outbound form message"""
     items = messages.MessageField(ConferenceForm, 1, repeated=True)
+    nextPageToken = messages.StringField(2)
     
     
 class WishListForm(messages.Message):
     ''' WhishListForms - repr conferences and sessionslists '''
     conferences = messages.MessageField(ConferenceForms, 1)
     sessions = messages.MessageField(ConferenceSessionForms, 2)
+
+
+class ScheduleForm(messages.Message):
+    ''' ScheduleForm - the wish list sessions that fit together, in order,
+    and the ones that clash with them '''
+    sessions = messages.MessageField(ConferenceSessionForms, 1)
+    conflicts = messages.MessageField(ConferenceSessionForms, 2)
     
 class TeeShirtSize(messages.Enum):
     """TeeShirtSize -- t-shirt size enumeration value"""
@@ -146,6 +165,9 @@ class ConferenceQueryForm(messages.Message):
 class ConferenceQueryForms(messages.Message):
     """ConferenceQueryForms -- multiple ConferenceQueryForm inbound form message"""
     filters = messages.MessageField(ConferenceQueryForm, 1, repeated=True)
+    pageSize = messages.IntegerField(2)
+    pageToken = messages.StringField(3)
+    summary = messages.BooleanField(4)
     
 class FeaturedSpeakerForm(messages.Message):
     """ConferenceQueryForms -- multiple ConferenceQueryForm inbound form message"""
@@ -153,6 +175,21 @@ class FeaturedSpeakerForm(messages.Message):
     conference           = messages.StringField(2)
     conference_location  = messages.StringField(3)
     sessions             = messages.StringField(4, repeated=True)
+
+
+class ImportRequest(messages.Message):
+    """ImportRequest -- bulk import inbound message, one JSON object per
+    line with a kind of conference, speaker or session"""
+    data                 = messages.StringField(1)
+
+
+class ImportForm(messages.Message):
+    """ImportForm -- progress of a bulk import outbound form message"""
+    websafeKey           = messages.StringField(1)
+    status               = messages.StringField(2)
+    rows                 = messages.IntegerField(3)
+    imported             = messages.IntegerField(4)
+    errors               = messages.StringField(5, repeated=True)
     
     
 # - - - - - - - - - - - Resource Containers - - - - - - - - - - - - - - - - - - - - - - - 
@@ -169,6 +206,8 @@ CONF_POST_REQUEST = endpoints.ResourceContainer(
 SPEAKER_SESSION_GET_REQUEST = endpoints.ResourceContainer(
     message_types.VoidMessage,
     websafeSpeakerKey=messages.StringField(1),
+    pageSize=messages.IntegerField(2),
+    pageToken=messages.StringField(3),
 )
 GET_SESSIONS_BY_SPEAKER_CONFERENCE = endpoints.ResourceContainer(
     websafeSpeakerKey=messages.StringField(1),
@@ -184,6 +223,13 @@ REMOVE_SESSION_POST_REQUEST = endpoints.ResourceContainer(
 )
 GET_SPEAKERS_BY_NAME = endpoints.ResourceContainer(
     displayName=messages.StringField(1),
+    match=messages.StringField(2),
+    pageSize=messages.IntegerField(3),
+    pageToken=messages.StringField(4)
+)
+GET_SPEAKERS = endpoints.ResourceContainer(
+    pageSize=messages.IntegerField(1),
+    pageToken=messages.StringField(2)
 )
 SESSION_POST_REQUEST = endpoints.ResourceContainer(
     ConferenceSessionForm,
@@ -191,11 +237,35 @@ SESSION_POST_REQUEST = endpoints.ResourceContainer(
 )
 CONF_SESSION_TYPE_REQUEST = endpoints.ResourceContainer(
     websafeConferenceKey=messages.StringField(1),
-    typeOfSession=messages.StringField(2, repeated=True)
+    typeOfSession=messages.StringField(2, repeated=True),
+    pageSize=messages.IntegerField(3),
+    pageToken=messages.StringField(4)
+)
+CONF_SESSIONS_REQUEST = endpoints.ResourceContainer(
+    websafeConferenceKey=messages.StringField(1),
+    pageSize=messages.IntegerField(2),
+    pageToken=messages.StringField(3),
+    summary=messages.BooleanField(4),
+    timetable=messages.BooleanField(5)
+)
+CONF_CREATED_REQUEST = endpoints.ResourceContainer(
+    summary=messages.BooleanField(1)
+)
+FEATURED_SPEAKER_REQUEST = endpoints.ResourceContainer(
+    websafeConferenceKey=messages.StringField(1)
 )
 QUERY_PROBLEM = endpoints.ResourceContainer(
     afterTime=messages.IntegerField(1),
-    exclude=messages.StringField(2, repeated=True)
+    exclude=messages.StringField(2, repeated=True),
+    pageSize=messages.IntegerField(3),
+    pageToken=messages.StringField(4),
+    engine=messages.StringField(5),
+    websafeConferenceKey=messages.StringField(6),
+    include=messages.StringField(7, repeated=True)
+)
+IMPORT_GET_REQUEST = endpoints.ResourceContainer(
+    message_types.VoidMessage,
+    websafeImportKey=messages.StringField(1)
 )
 QUERY_PROBLEM2 = endpoints.ResourceContainer(
     after_time=messages.StringField(1),
@@ -10,6 +10,15 @@ from google.appengine.ext import ndb
 
 import message_models as mm
 
+from form_serializer import FormSerializer
+from settings import IMPORT_MAX_ERRORS
+from settings import SESSION_MAX_DURATION
+import calendar_feed
+import entity_cache
+import search_indexer
+import seat_counter
+import session_columns
+import speaker_index
 import utils
 
 
@@ -19,28 +28,91 @@ class ConflictException(endpoints.ServiceException):
     http_status = httplib.CONFLICT
 
 
+class WishListItem(ndb.Model):
+
+    '''WishListItem -- a session or conference of a user's wish list, a child
+    of the Profile keyed by the websafe key of the item, so adding, removing
+    or looking up an item reads and writes a single small entity'''
+    item = ndb.KeyProperty(required=True, indexed=False)
+    # the conference of a session item, the item itself for a conference
+    conference = ndb.KeyProperty(kind='Conference', required=True)
+    isSession = ndb.BooleanProperty(default=False)
+    # speaker of a session item, so it can be fetched with the session
+    speaker = ndb.KeyProperty(kind='ConferenceSpeaker', indexed=False)
+    added = ndb.DateTimeProperty(auto_now_add=True, indexed=False)
+
+    @classmethod
+    def key_for(cls, p_key, item_key):
+        ''' returns the key of the wish list item for item_key '''
+        return ndb.Key(cls, item_key.urlsafe(), parent=p_key)
+
+    @classmethod
+    def for_item(cls, p_key, item_key, speaker_key=None, added=None):
+        ''' returns a new (unsaved) wish list item for a session or
+        conference key; added defaults to the time it is saved '''
+        is_session = item_key.kind() == 'ConferenceSession'
+        values = {}
+        # auto_now_add only fills in added when it has no value, None counts
+        if added is not None:
+            values['added'] = added
+        return cls(key=cls.key_for(p_key, item_key), item=item_key,
+                   conference=item_key.parent() if is_session else item_key,
+                   isSession=is_session, speaker=speaker_key, **values)
+
+
 class WishList(ndb.Model):
+    ''' the wish list as two lists of keys; it used to be stored in the
+    Profile, it is now built from the WishListItem entities of the user '''
     conferences = ndb.KeyProperty(kind="Conference", repeated=True)
     sessions = ndb.KeyProperty(kind='ConferenceSession', repeated=True)
+    # distinct speakers of the sessions, when known up front
+    speakers = ndb.KeyProperty(kind='ConferenceSpeaker', repeated=True)
 
-    def to_form(self):
-        sessions = ndb.get_multi(self.sessions)
-        speaker_keys = []
-        for sess in sessions:
-            speaker_keys.append(sess.speakerKey)
-        speakers = ndb.get_multi(speaker_keys)
-
-        sessions_out = mm.ConferenceSessionForms(
-            items=[
-                sessions[i].to_form(
-                    speakers[i]) for i in range(
-                    len(sessions))])
-
-        conferences = ndb.get_multi(self.conferences)
-        conferences_out = mm.ConferenceForms(items=[conf.to_form(None) for conf in conferences]
-                                             )
-        return mm.WishListForm(
-            conferences=conferences_out, sessions=sessions_out)
+    @classmethod
+    def for_profile(cls, p_key):
+        ''' returns the wish list of a profile, items in the order they
+        were added '''
+        items = sorted(WishListItem.query(ancestor=p_key),
+                       key=lambda item: item.added)
+        return cls(
+            conferences=[item.item for item in items if not item.isSession],
+            sessions=[item.item for item in items if item.isSession],
+            speakers=list(set(item.speaker for item in items
+                              if item.speaker)))
+
+    def to_form(self, p_key=None):
+        return self.to_form_async(p_key).get_result()
+
+    @ndb.tasklet
+    def to_form_async(self, p_key=None):
+        ''' the sessions, their speakers and the conferences are fetched
+        in one round, then the seats and the speakers that were not known;
+        deleted sessions and conferences are skipped and, when p_key is
+        given, removed from the wish list of p_key '''
+        sessions, speakers, conferences = yield (
+            entity_cache.get_multi_async(self.sessions),
+            entity_cache.get_multi_async(self.speakers),
+            entity_cache.get_multi_async(self.conferences))
+
+        dangling = [key for key, entity in zip(
+            self.sessions + self.conferences, sessions + conferences)
+            if entity is None]
+        sessions = [sess for sess in sessions if sess]
+        conferences = [conf for conf in conferences if conf]
+
+        session_items, seats = yield (
+            ConferenceSession.to_forms_async(
+                sessions, [speaker for speaker in speakers if speaker]),
+            seat_counter.seats_available_multi_async(conferences))
+
+        if dangling and p_key:
+            yield ndb.delete_multi_async(
+                [WishListItem.key_for(p_key, key) for key in dangling])
+
+        raise ndb.Return(mm.WishListForm(
+            conferences=mm.ConferenceForms(
+                items=Conference.to_forms(conferences, seats)),
+            sessions=mm.ConferenceSessionForms(items=session_items)))
 
 
 class Profile(ndb.Model):
@@ -50,7 +122,33 @@ class Profile(ndb.Model):
     mainEmail = ndb.StringProperty()
     teeShirtSize = ndb.StringProperty(default='NOT_SPECIFIED')
     conferenceKeysToAttend = ndb.StringProperty(repeated=True)
-    wishList = ndb.LocalStructuredProperty(WishList, default=WishList())
+    # only set on profiles from before WishListItem, moved on first use by
+    # ApiHelper._moveWishList
+    wishList = ndb.LocalStructuredProperty(WishList)
+    # secret of the calendar feed URL, see calendar_feed
+    calendarSecret = ndb.StringProperty(indexed=False)
+
+    # convert t-shirt string to Enum; just copy others
+    _serializer = FormSerializer(
+        mm.ProfileForm,
+        converters={'teeShirtSize': lambda size: getattr(mm.TeeShirtSize,
+                                                         size)})
+
+    def to_form(self):
+        """Copy relevant fields from Profile to ProfileForm."""
+        return self._serializer.to_form(self)
+
+
+class Migration(ndb.Model):
+
+    '''Migration -- a one-off migration that ran to the end, keyed by its
+    name'''
+    done = ndb.DateTimeProperty(auto_now_add=True, indexed=False)
+
+    @classmethod
+    def is_done(cls, name):
+        # the get is served from memcache by ndb once the entity exists
+        return ndb.Key(cls, name).get() is not None
 
 
 class Conference(ndb.Model):
@@ -59,6 +157,9 @@ class Conference(ndb.Model):
     name = ndb.StringProperty(required=True)
     description = ndb.StringProperty()
     organizerUserId = ndb.StringProperty()
+    # copy of the organizer Profile.displayName, kept up to date by
+    # ApiHelper._updateOrganizerName
+    organizerDisplayName = ndb.StringProperty()
     topics = ndb.StringProperty(repeated=True)
     city = ndb.StringProperty()
     startDate = ndb.DateProperty()
@@ -67,22 +168,77 @@ class Conference(ndb.Model):
     maxAttendees = ndb.IntegerProperty()
     seatsAvailable = ndb.IntegerProperty()
 
-    def to_form(self, displayName):
-        """Copy relevant fields from Conference to ConferenceForm."""
-        cf = mm.ConferenceForm()
-        for field in cf.all_fields():
-            if hasattr(self, field.name):
-                # convert Date to date string; just copy others
-                if field.name.endswith('Date'):
-                    setattr(cf, field.name, str(getattr(self, field.name)))
-                else:
-                    setattr(cf, field.name, getattr(self, field.name))
-            elif field.name == "websafeKey":
-                setattr(cf, field.name, self.key.urlsafe())
+    # fields copied in the search documents of the conference sessions
+    SEARCH_FIELDS = ('name', 'city', 'topics', 'description')
+
+    # fields projected by the summary mode of the list endpoints, the ones
+    # the list views show
+    SUMMARY_FIELDS = ('name', 'city', 'startDate', 'organizerDisplayName',
+                      'maxAttendees', 'seatsAvailable')
+
+    # set once the organizer names backfill is done, see summary_fields
+    _organizer_names_done = False
+
+    @classmethod
+    def summary_fields(cls):
+        ''' returns the fields to project for a summary: a projection leaves
+        out the entities that have no value for a projected property, so
+        organizerDisplayName is only projected once the backfill stored it
+        on the conferences from before it existed '''
+        if not cls._organizer_names_done:
+            cls._organizer_names_done = Migration.is_done('organizer_names')
+        if cls._organizer_names_done:
+            return cls.SUMMARY_FIELDS
+        return tuple(field for field in cls.SUMMARY_FIELDS
+                     if field != 'organizerDisplayName')
+
+    def search_values(self):
+        ''' returns the values of SEARCH_FIELDS, compare them to find out if
+        the session documents need to be rewritten '''
+        return [getattr(self, field) for field in self.SEARCH_FIELDS]
+
+    @classmethod
+    def _post_delete_hook(cls, key, future):
+        # the search documents of the sessions go with the conference
+        search_indexer.queue_conference(key)
+        entity_cache.invalidate(key)
+        calendar_feed.bump()
+
+    # convert Date to date string; just copy others
+    _serializer = FormSerializer(
+        mm.ConferenceForm,
+        converters={'startDate': str, 'endDate': str},
+        computed={'websafeKey': lambda conf, related: conf.key.urlsafe()})
+
+    def to_form(self, displayName, seatsAvailable=None):
+        """Copy relevant fields from Conference to ConferenceForm.
+        seatsAvailable comes from the sharded seat counter, pass it in
+        when it was already fetched for a list of conferences"""
+        if seatsAvailable is None:
+            seatsAvailable = seat_counter.seats_available(self)
         if displayName:
-            setattr(cf, 'organizerDisplayName', displayName)
-        cf.check_initialized()
-        return cf
+            return self._serializer.to_form(
+                self, seatsAvailable=seatsAvailable,
+                organizerDisplayName=displayName)
+        return self._serializer.to_form(self, seatsAvailable=seatsAvailable)
+
+    @classmethod
+    def to_forms(cls, conferences, seats, **values):
+        ''' Transform a list of conferences into a list of ConferenceForm,
+        seats holds the seats available of each conference, in order;
+        values are set on every form, eg. fields a projection left out '''
+        to_form = cls._serializer.to_form
+        return [to_form(conf, seatsAvailable=conf_seats, **values)
+                for conf, conf_seats in zip(conferences, seats)]
+
+
+def _speaker_field(get):
+    ''' returns a computed field of the session form from the speaker of
+    the session, left empty when the speaker was deleted '''
+    def field(sess, speakers):
+        speaker = speakers.get(sess.speakerKey)
+        return get(speaker) if speaker else None
+    return field
 
 
 class ConferenceSession(ndb.Model):
@@ -98,29 +254,72 @@ class ConferenceSession(ndb.Model):
     speakerKey = ndb.KeyProperty(kind='ConferenceSpeaker')
     highlights = ndb.TextProperty()
 
+    # fields projected by the summary mode of getConferenceSessions
+    SUMMARY_FIELDS = ('name', 'type', 'startDate', 'startTime', 'duration',
+                      'speakerKey')
+
     def get_time_slot(self):
         return self.startTime.hour
 
+    @classmethod
+    def _post_delete_hook(cls, key, future):
+        # remove the search document of the session
+        search_indexer.queue_sessions([key])
+        session_columns.queue_rebuild(key.parent())
+        entity_cache.invalidate(key)
+        calendar_feed.bump()
+
+    # related is a dict of the speakers of the sessions, by key
+    _serializer = FormSerializer(
+        mm.ConferenceSessionFormOut,
+        converters={'startDate': str, 'startTime': str},
+        computed={
+            'speakerKey': _speaker_field(
+                lambda speaker: speaker.key.urlsafe()),
+            'speakerName': _speaker_field(
+                lambda speaker: speaker.displayName),
+            'sessionKey': lambda sess, speakers: sess.key.urlsafe(),
+            'confKey': lambda sess, speakers: sess.key.parent().urlsafe(),
+        })
+
     def to_form(self, speaker):
-        csf = mm.ConferenceSessionFormOut()
-        for field in csf.all_fields():
-            if hasattr(self, field.name):
-                if field.name.endswith('Date'):
-                    setattr(csf, field.name, str(getattr(self, field.name)))
-                elif field.name.endswith('Time'):
-                    setattr(csf, field.name, str(getattr(self, field.name)))
-                elif field.name == "speakerKey":
-                    setattr(csf, field.name, speaker.key.urlsafe())
-                else:
-                    setattr(csf, field.name, getattr(self, field.name))
-            elif field.name == "speakerName":
-                setattr(csf, field.name, speaker.displayName)
-            elif field.name == "sessionKey":
-                setattr(csf, field.name, self.key.urlsafe())
-            elif field.name == "confKey":
-                setattr(csf, field.name, self.key.parent().urlsafe())
-        csf.check_initialized()
-        return csf
+        return self._serializer.to_form(self, {self.speakerKey: speaker})
+
+    @classmethod
+    def to_forms(cls, sessions, speakers=()):
+        ''' Transform a list of sessions into a list of ConferenceSessionFormOut,
+        the distinct speakers are fetched in one batch and matched by key,
+        speakers that were already fetched by the caller can be passed in '''
+        return cls.to_forms_async(sessions, speakers).get_result()
+
+    @classmethod
+    @ndb.tasklet
+    def to_forms_async(cls, sessions, speakers=()):
+        ''' tasklet version of to_forms '''
+        known = yield cls._speakers_async(sessions, speakers)
+        raise ndb.Return(cls._serializer.to_forms(sessions, known))
+
+    @classmethod
+    @ndb.tasklet
+    def to_dicts_async(cls, sessions, speakers=()):
+        ''' same as to_forms_async, as dicts for the JSON routes '''
+        known = yield cls._speakers_async(sessions, speakers)
+        to_dict = cls._serializer.to_dict
+        raise ndb.Return([to_dict(sess, known) for sess in sessions])
+
+    @staticmethod
+    @ndb.tasklet
+    def _speakers_async(sessions, speakers=()):
+        ''' returns the speakers of sessions by key, fetching the distinct
+        ones that are not in speakers in one batch '''
+        known = dict((speaker.key, speaker) for speaker in speakers)
+        speaker_keys = list(set(sess.speakerKey for sess in sessions
+                                if sess.speakerKey and
+                                sess.speakerKey not in known))
+        if speaker_keys:
+            fetched = yield entity_cache.get_multi_async(speaker_keys)
+            known.update(zip(speaker_keys, fetched))
+        raise ndb.Return(known)
 
     @classmethod
     def from_form(cls, mys, parent_key):
@@ -150,6 +349,10 @@ class ConferenceSession(ndb.Model):
         except ValueError:
             raise endpoints.BadRequestException(
                 "The date and time need to be properly formated, ex: 2015-12-31, 14:59")
+        if not 0 < data['duration'] <= SESSION_MAX_DURATION:
+            raise endpoints.BadRequestException(
+                "The duration needs to be between 1 and %d minutes" %
+                SESSION_MAX_DURATION)
 
         data['speakerKey'] = ndb.Key(urlsafe=data['speakerKey'])
         data['key'] = parent_key
@@ -160,15 +363,119 @@ class ConferenceSpeaker(ndb.Model):
 
     '''Conference Speaker - Speaker Profile Model'''
     displayName = ndb.StringProperty(required=True)
+    # legacy back-references, no longer written: the sessions of a speaker
+    # are found by ConferenceSession.speakerKey and their conferences by
+    # SpeakerSessions.speakerKey; emptied by /tasks/backfill_speaker_sessions
     conferences = ndb.KeyProperty(kind=Conference, repeated=True)
     conferenceSessions = ndb.KeyProperty(kind=ConferenceSession, repeated=True)
+    # the prefixes of the words of displayName, for getSpeakersByName
+    nameGrams = ndb.ComputedProperty(
+        lambda self: speaker_index.name_prefixes(self.displayName),
+        repeated=True)
+
+    @classmethod
+    def _post_delete_hook(cls, key, future):
+        # the search documents of the sessions embed the speaker name
+        search_indexer.queue_speaker(key)
+        entity_cache.invalidate(key)
+        speaker_index.bump([key])
+
+    _serializer = FormSerializer(
+        mm.ConferenceSpeakerFormOut,
+        computed={'websafekey': lambda speaker, related:
+                  speaker.key.urlsafe()})
+
+    def to_form(self):
+        return self._serializer.to_form(self)
+
+    @classmethod
+    def to_forms(cls, speakers):
+        ''' Transform a list of speakers into a list of
+        ConferenceSpeakerFormOut '''
+        return cls._serializer.to_forms(speakers)
+
+    @classmethod
+    def to_dicts(cls, speakers):
+        ''' same as to_forms, as dicts for the JSON routes '''
+        return [cls._serializer.to_dict(speaker) for speaker in speakers]
+
+
+class SpeakerSessions(ndb.Model):
+
+    '''SpeakerSessions -- the sessions of a speaker in a conference, a child
+    of the Conference keyed by the websafe speaker key; written with the
+    session, in the same transaction, so the featured speaker needs no
+    session reads and the conferences of a speaker are a keys only query
+    on speakerKey'''
+    speakerKey = ndb.KeyProperty(kind='ConferenceSpeaker')
+    sessionKeys = ndb.KeyProperty(kind='ConferenceSession', repeated=True,
+                                  indexed=False)
+    sessionNames = ndb.StringProperty(repeated=True, indexed=False)
+
+    @classmethod
+    def key_for(cls, conf_key, speaker_key):
+        return ndb.Key(cls, speaker_key.urlsafe(), parent=conf_key)
+
+    def add(self, session):
+        ''' adds session, returns False if it was there already '''
+        if session.key in self.sessionKeys:
+            return False
+        self.sessionKeys.append(session.key)
+        self.sessionNames.append(session.name)
+        return True
+
+
+class FeaturedSpeaker(ndb.Model):
+
+    '''FeaturedSpeaker -- the featured speaker of a conference, a child of
+    the Conference; the latest speaker with more than one session in it'''
+    speakerKey = ndb.KeyProperty(kind='ConferenceSpeaker', indexed=False)
+    name = ndb.StringProperty(indexed=False)
+    sessions = ndb.StringProperty(repeated=True, indexed=False)
+    conference = ndb.StringProperty(indexed=False)
+    conferenceLocation = ndb.StringProperty(indexed=False)
+    updated = ndb.DateTimeProperty(auto_now=True)
+
+    ID = 'featured'
+
+    @classmethod
+    def key_for(cls, conf_key):
+        return ndb.Key(cls, cls.ID, parent=conf_key)
+
+    def to_cache(self):
+        ''' the memcache value of the featured speaker '''
+        return {"name": self.name,
+                "sessions": self.sessions,
+                "conf": self.conference,
+                "conf_loc": self.conferenceLocation}
+
+
+class ImportJob(ndb.Model):
+
+    '''ImportJob -- a bulk import of conferences, speakers and sessions, a
+    child of the Profile of the organizer; data holds the JSON lines, refs
+    the key of every imported conference and speaker by ref and sessions
+    the [line, conference, speaker, id] of every session row to import'''
+    data = ndb.BlobProperty(compressed=True)
+    status = ndb.StringProperty(default='queued', indexed=False)
+    rows = ndb.IntegerProperty(default=0, indexed=False)
+    imported = ndb.IntegerProperty(default=0, indexed=False)
+    refs = ndb.JsonProperty(compressed=True)
+    sessions = ndb.JsonProperty(compressed=True)
+    # session rows done, the next task starts from there
+    offset = ndb.IntegerProperty(default=0, indexed=False)
+    errors = ndb.StringProperty(repeated=True, indexed=False)
+    created = ndb.DateTimeProperty(auto_now_add=True)
+
+    def add_errors(self, errors):
+        ''' appends (line, message) errors, up to IMPORT_MAX_ERRORS '''
+        room = max(IMPORT_MAX_ERRORS - len(self.errors), 0)
+        self.errors.extend('line %d: %s' % (line, message)
+                           for line, message in errors[:room])
 
     def to_form(self):
-        spf = mm.ConferenceSpeakerFormOut()
-        for field in spf.all_fields():
-            if field.name == "websafekey":
-                setattr(spf, field.name, self.key.urlsafe())
-            else:
-                setattr(spf, field.name, self.displayName)
-        spf.check_initialized()
-        return spf
+        return mm.ImportForm(websafeKey=self.key.urlsafe(),
+                             status=self.status,
+                             rows=self.rows,
+                             imported=self.imported,
+                             errors=self.errors)
@@ -0,0 +1,116 @@
+"""
+query_cache.py -- Udacity conference server-side Python App Engine
+    memcache result cache for queryConferences
+
+    results are keyed by a hash of the normalized filters and the page asked
+    for, together with a generation number; any change to a conference
+    (create, update) bumps the generation so every cached result is
+    dropped at once, the short timeout bounds how stale a result can be if
+    a bump is lost. The seats available change with every registration,
+    they are read from the seat counters when a result is served
+"""
+
+import collections
+import hashlib
+import json
+import logging
+import time
+
+from google.appengine.api import memcache
+from google.appengine.ext import ndb
+from protorpc import protojson
+
+from settings import MEMCACHE_CONF_QUERY_KEY
+from settings import MEMCACHE_CONF_QUERY_TIMEOUT
+from settings import MEMCACHE_CONF_GENERATION_KEY
+
+# hit/miss counters for this instance
+_stats = collections.Counter()
+
+
+def _generation():
+    ''' returns the current generation; when it was evicted it restarts
+    from the clock, so results cached under an old number can't come back '''
+    generation = memcache.get(MEMCACHE_CONF_GENERATION_KEY)
+    if generation is None:
+        memcache.add(MEMCACHE_CONF_GENERATION_KEY, int(time.time()))
+        generation = memcache.get(MEMCACHE_CONF_GENERATION_KEY)
+    return generation
+
+
+def bump():
+    ''' invalidates every cached result once the current transaction
+    commits (right away outside of one) '''
+    def incr():
+        memcache.incr(MEMCACHE_CONF_GENERATION_KEY,
+                      initial_value=int(time.time()))
+    ndb.get_context().call_on_commit(incr)
+
+
+def _digest(filters, page_size, page_token, summary):
+    ''' returns a digest of a query and of the current generation, filters
+    is the list returned by _formatFilters; the order of the filters
+    doesn't matter '''
+    canonical = json.dumps({
+        'filters': sorted([f['field'], f['operator'], unicode(f['value'])]
+                          for f in filters),
+        'pageSize': page_size,
+        'pageToken': page_token,
+        'summary': bool(summary),
+        'generation': _generation(),
+    }, sort_keys=True)
+    return hashlib.sha1(canonical.encode('utf-8')).hexdigest()
+
+
+def _cache_key(filters, page_size, page_token, summary):
+    ''' returns the memcache key of a query '''
+    return MEMCACHE_CONF_QUERY_KEY % _digest(filters, page_size, page_token,
+                                             summary)
+
+
+def etag(filters, page_size, page_token, summary=False, seats=()):
+    ''' returns the ETag of the result of a query, it changes with the
+    generation like the cached result and with the seats available of the
+    conferences, which are not cached '''
+    return '"%s-%s"' % (
+        _digest(filters, page_size, page_token, summary),
+        hashlib.sha1(','.join(str(total) for total in seats)).hexdigest())
+
+
+def cached_forms(filters, page_size, page_token, message_type, compute,
+                 summary=False):
+    ''' returns the message_type result of a query from memcache, on a miss
+    calls compute() and caches its result for MEMCACHE_CONF_QUERY_TIMEOUT '''
+    start = time.time()
+    key = _cache_key(filters, page_size, page_token, summary)
+    cached = memcache.get(key)
+    if cached is not None:
+        compute_ms, data = cached
+        _stats['hits'] += 1
+        elapsed_ms = (time.time() - start) * 1000
+        _log(key, 'hit', compute_ms - elapsed_ms)
+        return protojson.decode_message(message_type, data)
+
+    forms = compute()
+    compute_ms = (time.time() - start) * 1000
+    memcache.set(key, (compute_ms, protojson.encode_message(forms)),
+                 time=MEMCACHE_CONF_QUERY_TIMEOUT)
+    _stats['misses'] += 1
+    _log(key, 'miss', 0)
+    return forms
+
+
+def _log(key, outcome, saved_ms):
+    ''' logs the outcome of a lookup with the hit ratio of this instance
+    and the time saved by the hits '''
+    _stats['saved_ms'] += max(saved_ms, 0)
+    lookups = _stats['hits'] + _stats['misses']
+    logging.info('query_cache: %s %s, hit ratio %.2f over %d lookups, '
+                 '%.0fms saved (%.0fms total)', outcome, key,
+                 float(_stats['hits']) / lookups, lookups,
+                 max(saved_ms, 0), _stats['saved_ms'])
+
+
+def stats():
+    ''' returns the hit/miss counters of this instance '''
+    return dict(_stats)
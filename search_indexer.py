@@ -0,0 +1,227 @@
+"""
+search_indexer.py -- Udacity conference server-side Python App Engine
+    batched writer for the session documents of the search index
+
+    sessions are indexed from a pull queue instead of the request that
+    created them: every session to index is a small pull task and a push
+    task per window of SEARCH_DRAIN_WINDOW seconds leases them, so the
+    documents are written SEARCH_BATCH_SIZE per put however they were
+    queued; the tasks of the documents that failed with a transient error
+    are left to be leased again
+
+    the documents embed conference and speaker fields, so changes to a
+    conference or a speaker queue a rewrite of the documents of their
+    sessions; sessions that are gone have their documents deleted
+"""
+
+import logging
+import time
+
+from google.appengine.api import search
+from google.appengine.api import taskqueue
+from google.appengine.datastore.datastore_query import Cursor
+from google.appengine.ext import ndb
+
+from settings import SESSION_INDEX_NAME
+from settings import SEARCH_BATCH_SIZE
+from settings import SEARCH_DRAIN_WINDOW
+from settings import SEARCH_LEASE_SECONDS
+from settings import SEARCH_PULL_QUEUE
+from settings import SEARCH_RETRY_LIMIT
+from settings import SEARCH_QUEUE
+
+import utils
+
+
+def _chunks(items, size):
+    ''' splits items in lists of at most size items '''
+    return [items[i:i + size] for i in xrange(0, len(items), size)]
+
+
+def build_document(session, speaker, conference):
+    ''' Create a search document based on session, speaker and conference '''
+    return search.Document(
+        # the doc_id will be set to the key of the session
+        doc_id=session.key.urlsafe(),
+        fields=[
+            search.TextField(name='name', value=session.name),
+            search.TextField(name='type', value=session.type),
+            search.NumberField(name='duration', value=session.duration),
+            search.DateField(name="startDate", value=session.startDate),
+            search.NumberField(
+                name="startTime",
+                value=utils.time_to_minutes(
+                    session.startTime)),
+            search.TextField(name='highlights', value=session.highlights),
+            search.TextField(
+                name='speakerName',
+                value=speaker.displayName),
+            search.TextField(name='conferenceName', value=conference.name),
+            search.TextField(name='conferenceTopics', value=" ".join(
+                [topic for topic in conference.topics])),
+            search.TextField(name='conferenceCity', value=conference.city),
+            search.TextField(
+                name='conferenceDescription',
+                value=conference.description),
+        ])
+
+
+def queue_sessions(session_keys, transactional=False):
+    ''' queues the indexing of the sessions, a pull task per session, and
+    the task that leases them once the current transaction commits '''
+    queue = taskqueue.Queue(SEARCH_PULL_QUEUE)
+    tasks = [taskqueue.Task(payload=key.urlsafe(), method='PULL')
+             for key in session_keys]
+    for chunk in _chunks(tasks, taskqueue.MAX_TASKS_PER_ADD):
+        queue.add(chunk, transactional=transactional)
+    ndb.get_context().call_on_commit(_queue_drain)
+
+
+def _queue_drain():
+    ''' queues the task leasing the sessions queued in the current window,
+    named after the window so it is queued once and runs when the window
+    is over '''
+    now = time.time()
+    window = int(now) // SEARCH_DRAIN_WINDOW
+    try:
+        taskqueue.add(name='index-sessions-%d' % window,
+                      url='/tasks/index_sessions', queue_name=SEARCH_QUEUE,
+                      countdown=(window + 1) * SEARCH_DRAIN_WINDOW - now)
+    except (taskqueue.TaskAlreadyExistsError,
+            taskqueue.TombstonedTaskError):
+        pass
+
+
+def index_queued():
+    ''' leases up to SEARCH_BATCH_SIZE queued sessions and indexes them;
+    chains a task while more may be queued and, when documents failed
+    with a transient error, one for after their lease expires '''
+    queue = taskqueue.Queue(SEARCH_PULL_QUEUE)
+    tasks = queue.lease_tasks(SEARCH_LEASE_SECONDS, SEARCH_BATCH_SIZE)
+    if not tasks:
+        return
+    dropped = [task for task in tasks if task.retry_count > SEARCH_RETRY_LIMIT]
+    if dropped:
+        logging.error('giving up indexing %d sessions', len(dropped))
+    # a session queued twice is indexed once
+    doc_ids = set(task.payload for task in tasks if task not in dropped)
+    retry = index_sessions([ndb.Key(urlsafe=doc_id) for doc_id in doc_ids])
+    queue.delete_tasks([task for task in tasks if task.payload not in retry])
+
+    if len(tasks) == SEARCH_BATCH_SIZE:
+        taskqueue.add(url='/tasks/index_sessions', queue_name=SEARCH_QUEUE)
+    if retry:
+        taskqueue.add(url='/tasks/index_sessions', queue_name=SEARCH_QUEUE,
+                      countdown=SEARCH_LEASE_SECONDS)
+
+
+def index_sessions(session_keys):
+    ''' builds and writes the documents of the sessions, the speakers and
+    conferences they need are fetched once each; the documents of
+    sessions that were deleted (or lost their conference) are removed.
+    Returns the ids of the documents to write again '''
+    sessions = ndb.get_multi(session_keys)
+    speaker_keys = list(set(sess.speakerKey for sess in sessions if sess))
+    conf_keys = list(set(sess.key.parent() for sess in sessions if sess))
+    related = ndb.get_multi(speaker_keys + conf_keys)
+    related = dict((entity.key, entity) for entity in related if entity)
+
+    docs = []
+    gone = []
+    for key, sess in zip(session_keys, sessions):
+        speaker = sess and related.get(sess.speakerKey)
+        conference = sess and related.get(sess.key.parent())
+        if speaker and conference:
+            docs.append(build_document(sess, speaker, conference))
+        else:
+            gone.append(key.urlsafe())
+    delete_documents(gone)
+    return put_documents(docs)
+
+
+def put_documents(docs):
+    ''' writes docs SEARCH_BATCH_SIZE at a time, returns the ids of the
+    documents that failed with a transient error '''
+    index = search.Index(name=SESSION_INDEX_NAME)
+    retry = set()
+    for chunk in _chunks(docs, SEARCH_BATCH_SIZE):
+        try:
+            index.put(chunk)
+        except search.PutError as e:
+            # results are in the same order as the documents
+            for doc, result in zip(chunk, e.results):
+                if result.code == search.OperationResult.OK:
+                    continue
+                if result.code == search.OperationResult.TRANSIENT_ERROR:
+                    retry.add(doc.doc_id)
+                else:
+                    logging.error('could not index session %s: %s',
+                                  doc.doc_id, result.message)
+        except search.Error as e:
+            logging.error(e)
+            retry.update(doc.doc_id for doc in chunk)
+    return retry
+
+
+def delete_documents(doc_ids):
+    ''' removes documents from the index SEARCH_BATCH_SIZE at a time '''
+    index = search.Index(name=SESSION_INDEX_NAME)
+    for chunk in _chunks(doc_ids, SEARCH_BATCH_SIZE):
+        try:
+            index.delete(chunk)
+        except search.Error as e:
+            logging.error(e)
+
+
+def _reindex_page(q, url, params, cursor=None):
+    ''' rewrites the documents of one page of the keys only session query
+    q, chains a task to url for the next page '''
+    keys, next_cursor, more = q.fetch_page(
+        SEARCH_BATCH_SIZE, keys_only=True,
+        start_cursor=Cursor(urlsafe=cursor) if cursor else None)
+    retry = index_sessions(keys)
+    if retry:
+        queue_sessions([ndb.Key(urlsafe=doc_id) for doc_id in retry])
+    if more and next_cursor:
+        params = dict(params, cursor=next_cursor.urlsafe())
+        taskqueue.add(params=params, url=url, queue_name=SEARCH_QUEUE)
+
+
+def reindex_all(cursor=None):
+    ''' rebuilds the documents of one page of sessions, chains a task for
+    the next page '''
+    _reindex_page(ndb.Query(kind='ConferenceSession'),
+                  '/tasks/reindex_sessions', {}, cursor)
+
+
+def queue_conference(conf_key, transactional=False):
+    ''' queues the rewrite of the documents of a conference's sessions '''
+    taskqueue.add(params={'websafeConferenceKey': conf_key.urlsafe()},
+                  url='/tasks/reindex_conference',
+                  queue_name=SEARCH_QUEUE,
+                  transactional=transactional)
+
+
+def reindex_conference(conf_key, cursor=None):
+    ''' rewrites the documents of one page of the conference sessions,
+    found by ancestor '''
+    _reindex_page(ndb.Query(kind='ConferenceSession', ancestor=conf_key),
+                  '/tasks/reindex_conference',
+                  {'websafeConferenceKey': conf_key.urlsafe()}, cursor)
+
+
+def queue_speaker(speaker_key, transactional=False):
+    ''' queues the rewrite of the documents of a speaker's sessions '''
+    taskqueue.add(params={'websafeSpeakerKey': speaker_key.urlsafe()},
+                  url='/tasks/reindex_speaker',
+                  queue_name=SEARCH_QUEUE,
+                  transactional=transactional)
+
+
+def reindex_speaker(speaker_key, cursor=None):
+    ''' rewrites the documents of one page of the speaker sessions, found
+    by speakerKey so it also works once the speaker is deleted '''
+    q = ndb.Query(kind='ConferenceSession').filter(
+        ndb.GenericProperty('speakerKey') == speaker_key)
+    _reindex_page(q, '/tasks/reindex_speaker',
+                  {'websafeSpeakerKey': speaker_key.urlsafe()}, cursor)
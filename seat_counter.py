@@ -0,0 +1,183 @@
+"""
+seat_counter.py -- Udacity conference server-side Python App Engine
+    sharded counter for the seats available in a conference
+
+    the seats of a conference are spread over SEAT_COUNTER_SHARDS root
+    entities so that registrations for the same conference don't all
+    write to a single entity group, the total is cached in memcache
+"""
+
+import random
+
+from google.appengine.api import memcache
+from google.appengine.ext import ndb
+
+from settings import SEAT_COUNTER_SHARDS
+from settings import MEMCACHE_SEATS_KEY
+from settings import MEMCACHE_SEATS_TIMEOUT
+
+
+class SeatCounterShard(ndb.Model):
+
+    '''SeatCounterShard -- one slice of the seats available in a conference'''
+    seats = ndb.IntegerProperty(default=0, indexed=False)
+
+
+def _shard_keys(conf_key):
+    ''' returns the keys of all the counter shards of a conference '''
+    prefix = conf_key.urlsafe()
+    return [ndb.Key(SeatCounterShard, '%s-%d' % (prefix, i))
+            for i in xrange(SEAT_COUNTER_SHARDS)]
+
+
+def _cache_key(conf_key):
+    ''' returns the memcache key of the seats total of a conference '''
+    return MEMCACHE_SEATS_KEY % conf_key.urlsafe()
+
+
+def _split_seats(seats):
+    ''' splits seats in SEAT_COUNTER_SHARDS nearly equal parts '''
+    base, extra = divmod(max(seats or 0, 0), SEAT_COUNTER_SHARDS)
+    return [base + (1 if i < extra else 0)
+            for i in xrange(SEAT_COUNTER_SHARDS)]
+
+
+def init_seats(conf_key, seats):
+    ''' creates the counter shards for a newly created conference '''
+    ndb.put_multi([SeatCounterShard(key=key, seats=share)
+                   for key, share in zip(_shard_keys(conf_key),
+                                         _split_seats(seats))])
+    memcache.set(_cache_key(conf_key), max(seats or 0, 0),
+                 time=MEMCACHE_SEATS_TIMEOUT)
+
+
+def reset_seats(conf_key, seats):
+    ''' overwrites the counter shards of a conference with a new total,
+    used when the organizer updates seatsAvailable by hand; inside a
+    transaction the shards are only reset once it commits, so a failed or
+    retried update leaves them alone '''
+    ndb.get_context().call_on_commit(
+        ndb.non_transactional(lambda: init_seats(conf_key, seats)))
+
+
+def _get_shards(conf):
+    ''' returns the counter shards of a conference, creating them from
+    conf.seatsAvailable if the conference was created before the counter '''
+    keys = _shard_keys(conf.key)
+    shards = ndb.get_multi(keys)
+    if any(shards):
+        return shards
+    # get_or_insert keeps this safe when two registrations race to do it
+    futures = [SeatCounterShard.get_or_insert_async(key.id(), seats=share)
+               for key, share in zip(keys, _split_seats(conf.seatsAvailable))]
+    return [future.get_result() for future in futures]
+
+
+def candidate_shards(conf):
+    ''' returns the keys of the shards that had seats left at read time
+    in random order, so concurrent registrations spread over the shards '''
+    keys = [shard.key for shard in _get_shards(conf)
+            if shard and shard.seats > 0]
+    random.shuffle(keys)
+    return keys
+
+
+def take_seat(shard_key):
+    ''' takes one seat from a shard, returns False if the shard is empty;
+    meant to be called inside a transaction '''
+    shard = shard_key.get()
+    if not shard or shard.seats <= 0:
+        return False
+    shard.seats -= 1
+    shard.put()
+    return True
+
+
+def release_seat(conf_key):
+    ''' gives one seat back to a random shard of the conference;
+    meant to be called inside a transaction '''
+    shard_key = random.choice(_shard_keys(conf_key))
+    shard = shard_key.get() or SeatCounterShard(key=shard_key)
+    shard.seats += 1
+    shard.put()
+
+
+def update_cached_seats(conf_key, delta):
+    ''' applies a committed seat change to the memcache total, a missing
+    total is left alone and recomputed on the next read; returns the new
+    total, None if it was missing '''
+    if delta < 0:
+        total = memcache.decr(_cache_key(conf_key), -delta)
+    else:
+        total = memcache.incr(_cache_key(conf_key), delta)
+    return total
+
+
+@ndb.tasklet
+def seats_available_multi_async(confs):
+    ''' tasklet version of seats_available_multi, not for use inside
+    a transaction '''
+    totals = yield _seats_async([conf.key for conf in confs],
+                                [conf.seatsAvailable for conf in confs])
+    raise ndb.Return(totals)
+
+
+@ndb.tasklet
+def _seats_async(conf_keys, stored):
+    ''' returns the seats available of the conferences of conf_keys, in
+    order; stored holds their seatsAvailable, the total of a conference
+    created before the counter '''
+    ctx = ndb.get_context()
+    cache_keys = [_cache_key(conf_key) for conf_key in conf_keys]
+    totals = {}
+    if cache_keys:
+        cached = yield [ctx.memcache_get(cache_key) for cache_key in cache_keys]
+        totals = dict((cache_key, total) for cache_key, total
+                      in zip(cache_keys, cached) if total is not None)
+
+    missing = [(conf_key, seats) for conf_key, seats, cache_key
+               in zip(conf_keys, stored, cache_keys)
+               if cache_key not in totals]
+    if missing:
+        shards = yield ndb.get_multi_async(
+            [key for conf_key, seats in missing
+             for key in _shard_keys(conf_key)])
+        fresh = {}
+        for i, (conf_key, seats) in enumerate(missing):
+            conf_shards = shards[
+                i * SEAT_COUNTER_SHARDS:(i + 1) * SEAT_COUNTER_SHARDS]
+            if any(conf_shards):
+                total = sum(shard.seats for shard in conf_shards if shard)
+            else:
+                # no shards yet, the conference predates the counter
+                total = seats or 0
+            fresh[_cache_key(conf_key)] = total
+        # add instead of set, so a concurrent incr/decr is not overwritten
+        yield [ctx.memcache_add(cache_key, total, time=MEMCACHE_SEATS_TIMEOUT)
+               for cache_key, total in fresh.items()]
+        totals.update(fresh)
+
+    raise ndb.Return([totals[cache_key] for cache_key in cache_keys])
+
+
+@ndb.non_transactional
+def seats_available_multi(confs):
+    ''' returns the seats available of every conference in confs, in order;
+    totals come from memcache and are summed from the shards on a miss '''
+    return seats_available_multi_async(confs).get_result()
+
+
+@ndb.non_transactional
+def overlay_seats(forms):
+    ''' sets the seatsAvailable of ConferenceForms from the counters, the
+    forms carry the seatsAvailable stored on their conference '''
+    totals = _seats_async([ndb.Key(urlsafe=form.websafeKey) for form in forms],
+                          [form.seatsAvailable for form in forms]).get_result()
+    for form, total in zip(forms, totals):
+        form.seatsAvailable = total
+    return forms
+
+
+def seats_available(conf):
+    ''' returns the seats available of a single conference '''
+    return seats_available_multi([conf])[0]
@@ -0,0 +1,333 @@
+"""
+session_columns.py -- Udacity conference server-side Python App Engine
+    compact columnar index of the sessions of a conference
+
+    one SessionColumns entity per conference (a child of the Conference)
+    keeps the id, start day, start minute, duration, type and speaker of
+    every session in typed arrays packed in a single blob; any combination
+    of time windows and included/excluded types is answered with one pass
+    over the columns instead of one datastore sub-query per IN/!= value
+
+    the rows are kept sorted by start, in minutes since day one, and a tree
+    of the latest end of every range of rows finds the sessions overlapping
+    a time without looking at the ones that end before it, which is how a
+    speaker is kept from being double-booked
+"""
+
+import array
+import bisect
+import struct
+from itertools import izip
+
+from google.appengine.api import taskqueue
+from google.appengine.ext import ndb
+
+import utils
+
+# column name, array typecode; ids and days need 64/32 bits, the rest fit
+# in unsigned shorts (minutes in a day, type and speaker dictionary ids)
+COLUMNS = (('ids', 'l'),
+           ('days', 'l'),
+           ('starts', 'H'),
+           ('durations', 'H'),
+           ('type_ids', 'H'),
+           ('speaker_ids', 'H'))
+
+_HEADER = struct.Struct('<I')
+
+MINUTES_IN_DAY = 24 * 60
+
+# speaker id of the sessions that have no speaker
+NO_SPEAKER = 0xFFFF
+
+# sessions added to a loaded index that are checked one by one before the
+# tree of ends is built again
+INDEX_PENDING = 64
+
+
+def pack(columns):
+    ''' packs the columns (dict of arrays of the same length) in a blob '''
+    rows = len(columns['ids'])
+    return _HEADER.pack(rows) + ''.join(
+        columns[name].tostring() for name, code in COLUMNS)
+
+
+def unpack(data):
+    ''' unpacks a blob made by pack, returns a dict of arrays '''
+    columns = dict((name, array.array(code)) for name, code in COLUMNS)
+    if not data:
+        return columns
+    rows = _HEADER.unpack_from(data)[0]
+    offset = _HEADER.size
+    for name, code in COLUMNS:
+        size = columns[name].itemsize * rows
+        columns[name].fromstring(data[offset:offset + size])
+        offset += size
+    return columns
+
+
+def _sorted_by_start(columns):
+    ''' returns the columns with their rows sorted by start, for the
+    indexes saved before the rows were kept in that order '''
+    days, starts = columns['days'], columns['starts']
+    rows = sorted(xrange(len(days)), key=lambda i: (days[i], starts[i]))
+    return dict((name, array.array(code, (columns[name][i] for i in rows)))
+                for name, code in COLUMNS)
+
+
+def _end_tree(ends):
+    ''' returns a tree of the latest of ends over ranges of rows and its
+    number of leaves: node 1 covers every row, node n covers the rows of
+    nodes 2n and 2n+1 and the leaves are the rows themselves '''
+    size = 1
+    while size < len(ends):
+        size *= 2
+    tree = array.array('l', [-1]) * (2 * size)
+    tree[size:size + len(ends)] = ends
+    for node in xrange(size - 1, 0, -1):
+        tree[node] = max(tree[2 * node], tree[2 * node + 1])
+    return tree, size
+
+
+class SessionColumns(ndb.Model):
+
+    '''SessionColumns -- columnar index of the sessions of a conference,
+    types and speakers are stored once and referenced by position'''
+    types = ndb.StringProperty(repeated=True, indexed=False)
+    speakers = ndb.KeyProperty(kind='ConferenceSpeaker', repeated=True,
+                               indexed=False)
+    data = ndb.BlobProperty()
+    # the rows are sorted by start, indexes saved before they were are
+    # sorted when loaded
+    ordered = ndb.BooleanProperty(default=False, indexed=False)
+
+    def columns(self):
+        ''' returns the columns as a dict of arrays, unpacked once; the rows
+        are sorted by start '''
+        if getattr(self, '_columns', None) is None:
+            self._columns = unpack(self.data)
+            if not self.ordered:
+                self._columns = _sorted_by_start(self._columns)
+            self._starts = array.array('l', (
+                day * MINUTES_IN_DAY + start for day, start in
+                izip(self._columns['days'], self._columns['starts'])))
+            self._ids = set(self._columns['ids'])
+            self._index = None
+            self._pending = []
+        return self._columns
+
+    def _pre_put_hook(self):
+        self.data = pack(self.columns())
+        self.ordered = True
+
+    def _interval_index(self):
+        ''' returns the starts of the rows, the tree of their ends, its
+        number of leaves and the ids and speakers of the rows; built once
+        per entity and again after INDEX_PENDING sessions were added '''
+        columns = self.columns()
+        if self._index is None:
+            starts = array.array('l', self._starts)
+            tree, size = _end_tree(array.array('l', (
+                start + duration for start, duration in
+                izip(starts, columns['durations']))))
+            self._index = (starts, tree, size,
+                           array.array('l', columns['ids']),
+                           array.array('H', columns['speaker_ids']))
+            self._pending = []
+        return self._index
+
+    def overlapping(self, start, end, speaker_key=None):
+        ''' returns the ids of the sessions overlapping [start, end), in
+        minutes since day one, only those of speaker_key if given; the rows
+        starting before end are searched from the top of the tree of ends,
+        which skips every range of rows ending before start, and the
+        sessions added since the tree was built are checked one by one '''
+        speaker_id = None
+        if speaker_key is not None:
+            if speaker_key not in self.speakers:
+                return []
+            speaker_id = self.speakers.index(speaker_key)
+        starts, tree, size, ids, speaker_ids = self._interval_index()
+        last = bisect.bisect_left(starts, end)
+        found = []
+        nodes = [(1, 0, size)]
+        while nodes:
+            node, first, width = nodes.pop()
+            if first >= last or tree[node] <= start:
+                continue
+            if width == 1:
+                if speaker_id is None or speaker_ids[first] == speaker_id:
+                    found.append(ids[first])
+                continue
+            width //= 2
+            nodes.append((2 * node + 1, first + width, width))
+            nodes.append((2 * node, first, width))
+        found.extend(sess_id for sess_start, sess_end, sess_id, sess_speaker
+                     in self._pending
+                     if sess_start < end and sess_end > start and
+                     (speaker_id is None or sess_speaker == speaker_id))
+        return found
+
+    def _dictionary_id(self, values, value):
+        ''' returns the position of value in values, appending it if new '''
+        try:
+            return values.index(value)
+        except ValueError:
+            values.append(value)
+            return len(values) - 1
+
+    def add(self, session):
+        ''' inserts a row for session at its start, unless it is already
+        indexed; sessions added in order of start are appended '''
+        columns = self.columns()
+        sess_id = session.key.id()
+        if sess_id in self._ids:
+            return
+        start, end = interval(session)
+        speaker_id = self._dictionary_id(self.speakers, session.speakerKey) \
+            if session.speakerKey else NO_SPEAKER
+        row = bisect.bisect_right(self._starts, start)
+        for name, value in (
+                ('ids', sess_id),
+                ('days', session.startDate.toordinal()),
+                ('starts', utils.time_to_minutes(session.startTime)),
+                ('durations', session.duration),
+                ('type_ids', self._dictionary_id(self.types, session.type)),
+                ('speaker_ids', speaker_id)):
+            columns[name].insert(row, value)
+        self._starts.insert(row, start)
+        self._ids.add(sess_id)
+        if self._index is not None:
+            self._pending.append((start, end, sess_id, speaker_id))
+            if len(self._pending) > INDEX_PENDING:
+                self._index = None
+
+    def find(self, windows=None, include_types=None, exclude_types=None):
+        ''' returns the ids of the sessions starting inside one of windows,
+        a list of (from, to) minutes, and whose type is in include_types
+        (if given) and not in exclude_types; ordered by start day and time '''
+        columns = self.columns()
+
+        # one lookup table per column turns every test into an index
+        if windows:
+            in_window = bytearray(MINUTES_IN_DAY)
+            for start, end in windows:
+                for minute in xrange(max(start, 0), min(end, MINUTES_IN_DAY)):
+                    in_window[minute] = 1
+        else:
+            in_window = bytearray('\x01' * MINUTES_IN_DAY)
+        type_ok = [(not include_types or t in include_types) and
+                   not (exclude_types and t in exclude_types)
+                   for t in self.types]
+
+        # the rows are in order of start already
+        return [sess_id for sess_id, start, type_id in izip(
+                columns['ids'], columns['starts'], columns['type_ids'])
+                if in_window[start] and type_ok[type_id]]
+
+
+def _columns_key(conf_key):
+    return ndb.Key(SessionColumns, 'sessions', parent=conf_key)
+
+
+def interval(session):
+    ''' returns the start and end of a session in minutes since day one '''
+    start = session.startDate.toordinal() * MINUTES_IN_DAY + \
+        utils.time_to_minutes(session.startTime)
+    return start, start + session.duration
+
+
+def _get(conf_key):
+    ''' returns the stored index of a conference, or builds it '''
+    return _columns_key(conf_key).get() or build(conf_key)
+
+
+def build(conf_key):
+    ''' builds the index of a conference from its sessions, not saved '''
+    columns = SessionColumns(key=_columns_key(conf_key))
+    for session in sorted(ndb.Query(kind='ConferenceSession',
+                                    ancestor=conf_key), key=interval):
+        columns.add(session)
+    return columns
+
+
+def add_session(session):
+    ''' adds a new session to the index of its conference, read (or built)
+    once, unless it would double-book its speaker; returns the ids of the
+    sessions of the speaker it overlaps, nothing is added then. Meant to be
+    called in the transaction that puts the session, so two sessions of a
+    speaker at the same time can't both get in '''
+    columns = _get(session.key.parent())
+    clashes = _speaker_conflicts(columns, session)
+    if not clashes:
+        columns.add(session)
+        columns.put()
+    return clashes
+
+
+def add_sessions(sessions, check_speakers=False):
+    ''' adds new sessions to the indexes of their conferences, each index
+    is read and written once; with check_speakers the sessions that would
+    double-book their speaker are left out, returns the sessions added '''
+    by_conf = {}
+    for session in sessions:
+        by_conf.setdefault(session.key.parent(), []).append(session)
+    added = []
+    for conf_key, conf_sessions in by_conf.items():
+        added.extend(_add_to_index(conf_key, conf_sessions, check_speakers))
+    return added
+
+
+@ndb.transactional()
+def _add_to_index(conf_key, sessions, check_speakers):
+    ''' adds sessions to the index of a conference in a transaction, so a
+    session put by _putSession meanwhile isn't overwritten '''
+    columns = _get(conf_key)
+    added = []
+    for session in sessions:
+        if check_speakers and _speaker_conflicts(columns, session):
+            continue
+        columns.add(session)
+        added.append(session)
+    columns.put()
+    return added
+
+
+def _speaker_conflicts(columns, session):
+    start, end = interval(session)
+    return [sess_id for sess_id in
+            columns.overlapping(start, end, session.speakerKey)
+            if sess_id != session.key.id()]
+
+
+def get_columns(conf_key):
+    ''' returns the index of a conference, built on first use '''
+    return _columns_key(conf_key).get() or _build_missing(conf_key)
+
+
+# the index is built and saved in a transaction on the entity group of the
+# conference: a session put by _putSession while the sessions are read
+# makes one of the two transactions retry, so neither loses the other
+
+@ndb.transactional()
+def _build_missing(conf_key):
+    ''' builds and saves the index of a conference, unless another request
+    saved it first '''
+    columns = _columns_key(conf_key).get()
+    if not columns:
+        columns = build(conf_key)
+        columns.put()
+    return columns
+
+
+@ndb.transactional()
+def rebuild(conf_key):
+    ''' rebuilds and saves the index of a conference '''
+    build(conf_key).put()
+
+
+def queue_rebuild(conf_key):
+    ''' queues rebuilding the index of a conference, used when sessions
+    are removed '''
+    taskqueue.add(params={'websafeConferenceKey': conf_key.urlsafe()},
+                  url='/tasks/rebuild_session_columns')
@@ -19,8 +19,101 @@ ANDROID_AUDIENCE = WEB_CLIENT_ID
 MEMCACHE_ANNOUNCEMENTS_KEY = "RECENT_ANNOUNCEMENTS"
 ANNOUNCEMENT_TPL = ('Last chance to attend! The following conferences '
                     'are nearly sold out: %s')
+# conferences with 0 < seats available <= this are in the announcement
+ANNOUNCEMENT_SEATS_THRESHOLD = 5
+# conferences checked per task by the announcement reconciliation
+ANNOUNCEMENT_BATCH = 100
 
 MEMCACHE_FEATURED_SPEAKER_KEY = "featuredSpeaker"
+MEMCACHE_CONF_FEATURED_SPEAKER_KEY = "featuredSpeaker_%s"
+
+# seats available are spread over this many counter shards per conference
+SEAT_COUNTER_SHARDS = 20
+MEMCACHE_SEATS_KEY = "SEATS_AVAILABLE_%s"
+MEMCACHE_SEATS_TIMEOUT = 60
+
+# entity_cache: bump the version to drop every cached entity
+ENTITY_CACHE_VERSION = 1
+ENTITY_CACHE_LOCAL_SIZE = 200
+MEMCACHE_ENTITY_KEY = "ENTITY_%d_%s"
+MEMCACHE_ENTITY_TIMEOUT = 600
+
+# paging of the list endpoints, pageSize is capped at PAGE_SIZE_MAX
+PAGE_SIZE_DEFAULT = 20
+PAGE_SIZE_MAX = 100
+
+# search index of the sessions: sessions to index wait on the
+# SEARCH_PULL_QUEUE pull queue, a task of the SEARCH_QUEUE push queue leases
+# them SEARCH_BATCH_SIZE at a time once per SEARCH_DRAIN_WINDOW seconds;
+# leases last SEARCH_LEASE_SECONDS, a session leased SEARCH_RETRY_LIMIT
+# times is dropped
+SESSION_INDEX_NAME = "sessions"
+SEARCH_QUEUE = "search-index"
+SEARCH_PULL_QUEUE = "search-documents"
+SEARCH_BATCH_SIZE = 200
+SEARCH_DRAIN_WINDOW = 5
+SEARCH_LEASE_SECONDS = 60
+SEARCH_RETRY_LIMIT = 5
+
+# WishListForm of a user, dropped when the wish list changes, the timeout
+# bounds how stale the sessions and seats in it can get
+MEMCACHE_WISHLIST_KEY = "WISHLIST_%s"
+MEMCACHE_WISHLIST_TIMEOUT = 60
+
+# calendar feeds: conferences or sessions fetched per batch, how long the
+# memcache entry of a feed is kept and the generation that changes every
+# ETag when a conference or a session changes
+CALENDAR_BATCH = 100
+CALENDAR_FEED_TIMEOUT = 3600
+MEMCACHE_CALENDAR_KEY = "CALENDAR_%s"
+MEMCACHE_CALENDAR_GENERATION_KEY = "CALENDAR_GENERATION"
+
+# compressed timetable of a conference, see timetable.py; how many times a
+# rebuild is tried while sessions keep being added or removed
+MEMCACHE_TIMETABLE_KEY = "TIMETABLE_%s"
+TIMETABLE_REBUILD_ATTEMPTS = 5
+
+# longest session in minutes, the columnar session index keeps durations
+# in unsigned shorts
+SESSION_MAX_DURATION = 24 * 60
+
+# oauth tokeninfo lookups, point TOKENINFO_URL at a local stub to test;
+# user ids are cached in memcache until the token expires and in the
+# instance for at most TOKEN_CACHE_LOCAL_TTL seconds
+TOKENINFO_URL = 'https://www.googleapis.com/oauth2/v1/tokeninfo'
+TOKEN_CACHE_LOCAL_SIZE = 1000
+TOKEN_CACHE_LOCAL_TTL = 300
+MEMCACHE_TOKEN_KEY = "TOKEN_%s"
+
+# queryConferences results, dropped when the generation number is bumped
+MEMCACHE_CONF_QUERY_KEY = "CONF_QUERY_%s"
+MEMCACHE_CONF_QUERY_TIMEOUT = 30
+MEMCACHE_CONF_GENERATION_KEY = "CONF_QUERY_GENERATION"
+
+# conferences updated per task when copying organizer names
+ORGANIZER_NAME_BATCH = 100
+
+# speakers moved to SpeakerSessions per task by the one-off migration
+SPEAKER_BACKFILL_BATCH = 20
+
+# speaker name lookup: word prefixes stored per speaker, how long an
+# instance keeps its directory of names and the least trigram similarity
+# of a fuzzy match
+SPEAKER_PREFIX_LENGTH = 10
+SPEAKER_DIRECTORY_TTL = 600
+SPEAKER_SIMILARITY_MIN = 0.3
+MEMCACHE_SPEAKER_GENERATION_KEY = "SPEAKER_GENERATION"
+# speakers changed by a generation, replayed by the instances behind it;
+# bigger changes or more generations behind and the directory is rebuilt
+MEMCACHE_SPEAKER_CHANGES_KEY = "SPEAKER_CHANGES_%d"
+SPEAKER_CHANGES_MAX = 1000
+SPEAKER_GENERATIONS_MAX = 100
+
+# bulk import: session rows per task, entities per put_multi and the most
+# row errors kept on an ImportJob
+IMPORT_SESSION_BATCH = 1000
+IMPORT_PUT_BATCH = 500
+IMPORT_MAX_ERRORS = 1000
 
 DEFAULTS = {
     "city": "Default City",
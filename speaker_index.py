@@ -0,0 +1,216 @@
+"""
+speaker_index.py -- Udacity conference server-side Python App Engine
+    prefix and typo tolerant lookup of speakers by name
+
+    every speaker stores the prefixes of the words of its name
+    (ConferenceSpeaker.nameGrams) so prefix lookups are a datastore query
+    that pages by cursor; each instance also keeps a directory of all the
+    speaker names, a trie of their words for autocomplete and their
+    trigrams for typo tolerant lookups; the speakers added, renamed or
+    deleted are recorded per generation in memcache and applied to the
+    directory of every instance
+"""
+
+import collections
+import re
+import time
+
+from google.appengine.api import memcache
+from google.appengine.ext import ndb
+
+from settings import SPEAKER_PREFIX_LENGTH
+from settings import SPEAKER_DIRECTORY_TTL
+from settings import SPEAKER_SIMILARITY_MIN
+from settings import SPEAKER_CHANGES_MAX
+from settings import SPEAKER_GENERATIONS_MAX
+from settings import MEMCACHE_SPEAKER_GENERATION_KEY
+from settings import MEMCACHE_SPEAKER_CHANGES_KEY
+
+_WORD = re.compile(r'\w+', re.UNICODE)
+
+
+def words(name):
+    ''' returns the lowercase words of a name '''
+    return _WORD.findall((name or u'').lower())
+
+
+def name_prefixes(name):
+    ''' returns the values of ConferenceSpeaker.nameGrams, the prefixes of
+    the words of name up to SPEAKER_PREFIX_LENGTH characters '''
+    return sorted(set(word[:i] for word in words(name)
+                      for i in xrange(1, min(len(word),
+                                             SPEAKER_PREFIX_LENGTH) + 1)))
+
+
+def query_prefixes(name):
+    ''' returns the nameGrams a speaker needs to match name by prefix '''
+    return sorted(set(word[:SPEAKER_PREFIX_LENGTH] for word in words(name)))
+
+
+def trigrams(name):
+    ''' returns the trigrams of the words of name, padded so the start of
+    a word counts more than its end '''
+    grams = set()
+    for word in words(name):
+        padded = u'  %s ' % word
+        grams.update(padded[i:i + 3] for i in xrange(len(padded) - 2))
+    return grams
+
+
+def bump(keys):
+    ''' records that the speakers of keys were added, renamed or deleted
+    once the current transaction commits (right away outside of one), the
+    instances apply it to their directory '''
+    changed = [key.urlsafe() for key in keys]
+
+    def incr():
+        generation = memcache.incr(MEMCACHE_SPEAKER_GENERATION_KEY,
+                                   initial_value=int(time.time()))
+        # an instance that can't find the change rebuilds its directory
+        if generation is not None and len(changed) <= SPEAKER_CHANGES_MAX:
+            memcache.set(MEMCACHE_SPEAKER_CHANGES_KEY % generation, changed,
+                         time=SPEAKER_DIRECTORY_TTL)
+    ndb.get_context().call_on_commit(incr)
+
+
+class _Directory(object):
+
+    '''_Directory -- the speaker names of one instance; the trie has a
+    node per prefix of a word and the node of a whole word holds the keys
+    of the names with that word, postings maps each trigram to the keys of
+    the names that have it'''
+
+    def __init__(self, speakers):
+        self.names = {}
+        self.grams = {}
+        self.trie = {}
+        self.postings = collections.defaultdict(set)
+        for speaker in speakers:
+            self.add(speaker.key, speaker.displayName)
+
+    def add(self, key, name):
+        self.names[key] = u' '.join(words(name))
+        self.grams[key] = trigrams(name)
+        for word in words(name):
+            node = self.trie
+            for char in word:
+                node = node.setdefault(char, {})
+            node.setdefault(None, set()).add(key)
+        for gram in self.grams[key]:
+            self.postings[gram].add(key)
+
+    def remove(self, key):
+        if key not in self.names:
+            return
+        for word in self.names.pop(key).split():
+            node = self.trie
+            for char in word:
+                node = node[char]
+            node[None].discard(key)
+        for gram in self.grams.pop(key):
+            self.postings[gram].discard(key)
+
+    def update(self, keys, speakers):
+        ''' replaces the names of keys by those of speakers, in the same
+        order; None for a deleted speaker '''
+        for key, speaker in zip(keys, speakers):
+            self.remove(key)
+            if speaker is not None:
+                self.add(key, speaker.displayName)
+
+    def _with_prefix(self, prefix):
+        node = self.trie
+        for char in prefix:
+            node = node.get(char)
+            if node is None:
+                return set()
+        # the keys of the words below the node
+        keys = set()
+        nodes = [node]
+        while nodes:
+            node = nodes.pop()
+            for char, child in node.iteritems():
+                if char is None:
+                    keys.update(child)
+                else:
+                    nodes.append(child)
+        return keys
+
+    def complete(self, name):
+        ''' returns the keys of the names with a word starting with each
+        word of name; names starting with name first, then shorter ones '''
+        query_words = words(name)
+        if not query_words:
+            return []
+        keys = None
+        for word in query_words:
+            found = self._with_prefix(word)
+            keys = found if keys is None else keys & found
+            if not keys:
+                return []
+        start = u' '.join(query_words)
+        names = self.names
+        return sorted(keys, key=lambda key: (not names[key].startswith(start),
+                                             len(names[key]), names[key]))
+
+    def similar(self, name):
+        ''' returns the keys of the names whose trigrams are similar enough
+        to the trigrams of name (Jaccard), the most similar first '''
+        grams = trigrams(name)
+        if not grams:
+            return []
+        shared = collections.Counter()
+        for gram in grams:
+            shared.update(self.postings.get(gram, ()))
+        scores = []
+        for key, count in shared.iteritems():
+            score = float(count) / (len(grams) + len(self.grams[key]) - count)
+            if score >= SPEAKER_SIMILARITY_MIN:
+                scores.append((-score, self.names[key], key))
+        scores.sort()
+        return [key for score, name, key in scores]
+
+
+# the directory of this instance, its generation and when it was built
+_directory = None
+_generation = None
+_built_at = 0
+
+
+def _changes(since, generation):
+    ''' returns the keys of the speakers changed after generation since up
+    to generation, None when they aren't all in memcache '''
+    if since is None or generation is None or \
+            not 0 < generation - since <= SPEAKER_GENERATIONS_MAX:
+        return None
+    cache_keys = [MEMCACHE_SPEAKER_CHANGES_KEY % number
+                  for number in xrange(since + 1, generation + 1)]
+    changes = memcache.get_multi(cache_keys)
+    if len(changes) < len(cache_keys):
+        return None
+    return list(set(ndb.Key(urlsafe=key) for changed in changes.values()
+                    for key in changed))
+
+
+def get_directory():
+    ''' returns the directory of this instance; the speakers changed since
+    it was built are applied to it, it is rebuilt from the datastore when
+    they can't be found (or after SPEAKER_DIRECTORY_TTL, in case the
+    generation was evicted from memcache) '''
+    global _directory, _generation, _built_at
+    generation = memcache.get(MEMCACHE_SPEAKER_GENERATION_KEY)
+    if _directory is not None and generation == _generation and \
+            time.time() - _built_at <= SPEAKER_DIRECTORY_TTL:
+        return _directory
+
+    changed = _changes(_generation, generation)
+    if _directory is not None and changed is not None and \
+            time.time() - _built_at <= SPEAKER_DIRECTORY_TTL:
+        _directory.update(changed, ndb.get_multi(changed))
+    else:
+        speakers = ndb.Query(kind='ConferenceSpeaker').fetch(
+            projection=['displayName'])
+        _directory = _Directory(speakers)
+        _built_at = time.time()
+    _generation = generation
+    return _directory
@@ -62,6 +62,32 @@ app.filter('startFrom', function () {
     return filter;
 });
 
+/**
+ * @ngdoc directive
+ * @name infiniteScroll
+ *
+ * @description
+ * Evaluates the infinite-scroll expression when the bottom of the element is scrolled into view,
+ * used to load the next page of results.
+ *
+ */
+app.directive('infiniteScroll', function ($window) {
+    return {
+        link: function (scope, element, attrs) {
+            var onScroll = function () {
+                var bottom = element[0].getBoundingClientRect().bottom;
+                if (bottom - $window.innerHeight < 200) {
+                    scope.$apply(attrs.infiniteScroll);
+                }
+            };
+            angular.element($window).on('scroll', onScroll);
+            scope.$on('$destroy', function () {
+                angular.element($window).off('scroll', onScroll);
+            });
+        }
+    };
+});
+
 
 /**
  * @ngdoc constant
@@ -249,7 +249,7 @@ conferenceApp.controllers.controller('CreateConferenceCtrl',
  * @description
  * A controller used for the Show conferences page.
  */
-conferenceApp.controllers.controller('ShowConferenceCtrl', function ($scope, $log, oauth2Provider, HTTP_ERRORS) {
+conferenceApp.controllers.controller('ShowConferenceCtrl', function ($scope, $log, $http, oauth2Provider, HTTP_ERRORS) {
 
     /**
      * Holds the status if the query is being executed.
@@ -341,43 +341,20 @@ conferenceApp.controllers.controller('ShowConferenceCtrl', function ($scope, $lo
 
     /**
      * Namespace for the pagination.
+     * The conferences are loaded from the server one page at a time, the next page is requested
+     * with nextPageToken when the user scrolls to the bottom of the list.
      * @type {{}|*}
      */
     $scope.pagination = $scope.pagination || {};
-    $scope.pagination.currentPage = 0;
     $scope.pagination.pageSize = 20;
-    /**
-     * Returns the number of the pages in the pagination.
-     *
-     * @returns {number}
-     */
-    $scope.pagination.numberOfPages = function () {
-        return Math.ceil($scope.conferences.length / $scope.pagination.pageSize);
-    };
+    $scope.pagination.nextPageToken = null;
 
     /**
-     * Returns an array including the numbers from 1 to the number of the pages.
-     *
-     * @returns {Array}
-     */
-    $scope.pagination.pageArray = function () {
-        var pages = [];
-        var numberOfPages = $scope.pagination.numberOfPages();
-        for (var i = 0; i < numberOfPages; i++) {
-            pages.push(i);
-        }
-        return pages;
-    };
-
-    /**
-     * Checks if the target element that invokes the click event has the "disabled" class.
-     *
-     * @param event the click event
-     * @returns {boolean} if the target element that has been clicked has the "disabled" class.
+     * When true, the conferences are read from the /json/conferences route instead of the
+     * conference.queryConferences API; it returns the same items and supports ETags.
+     * @type {boolean}
      */
-    $scope.pagination.isDisabled = function (event) {
-        return angular.element(event.target).hasClass('disabled');
-    }
+    $scope.useJsonApi = false;
 
     /**
      * Adds a filter and set the default value.
@@ -414,6 +391,7 @@ conferenceApp.controllers.controller('ShowConferenceCtrl', function ($scope, $lo
      */
     $scope.queryConferences = function () {
         $scope.submitted = false;
+        $scope.pagination.nextPageToken = null;
         if ($scope.selectedTab == 'ALL') {
             $scope.queryConferencesAll();
         } else if ($scope.selectedTab == 'YOU_HAVE_CREATED') {
@@ -425,10 +403,18 @@ conferenceApp.controllers.controller('ShowConferenceCtrl', function ($scope, $lo
 
     /**
      * Invokes the conference.queryConferences API.
+     *
+     * @param pageToken the token of the page to load, the first page is loaded when not given.
      */
-    $scope.queryConferencesAll = function () {
+    $scope.queryConferencesAll = function (pageToken) {
         var sendFilters = {
-            filters: []
+            filters: [],
+            pageSize: $scope.pagination.pageSize,
+            // the list only shows a few fields, the detail view loads the full conference
+            summary: true
+        }
+        if (pageToken) {
+            sendFilters.pageToken = pageToken;
         }
         for (var i = 0; i < $scope.filters.length; i++) {
             var filter = $scope.filters[i];
@@ -441,39 +427,74 @@ conferenceApp.controllers.controller('ShowConferenceCtrl', function ($scope, $lo
             }
         }
         $scope.loading = true;
+        if ($scope.useJsonApi) {
+            var params = {filters: JSON.stringify(sendFilters.filters), pageSize: sendFilters.pageSize};
+            if (pageToken) {
+                params.pageToken = pageToken;
+            }
+            $http.get('/json/conferences', {params: params}).
+                success(function (resp) {
+                    onConferences(resp);
+                }).
+                error(function (resp) {
+                    onConferences({error: (resp && resp.error) || {}});
+                });
+            return;
+        }
         gapi.client.conference.queryConferences(sendFilters).
             execute(function (resp) {
                 $scope.$apply(function () {
-                    $scope.loading = false;
-                    if (resp.error) {
-                        // The request has failed.
-                        var errorMessage = resp.error.message || '';
-                        $scope.messages = 'Failed to query conferences : ' + errorMessage;
-                        $scope.alertStatus = 'warning';
-                        $log.error($scope.messages + ' filters : ' + JSON.stringify(sendFilters));
-                    } else {
-                        // The request has succeeded.
-                        $scope.submitted = false;
-                        $scope.messages = 'Query succeeded : ' + JSON.stringify(sendFilters);
-                        $scope.alertStatus = 'success';
-                        $log.info($scope.messages);
-
-                        $scope.conferences = [];
-                        angular.forEach(resp.items, function (conference) {
-                            $scope.conferences.push(conference);
-                        });
-                    }
-                    $scope.submitted = true;
+                    onConferences(resp);
                 });
             });
+
+        /**
+         * Shows the conferences of a queryConferences response.
+         *
+         * @param resp the response of either the API or the JSON route.
+         */
+        function onConferences(resp) {
+            $scope.loading = false;
+            if (resp.error) {
+                // The request has failed.
+                var errorMessage = resp.error.message || '';
+                $scope.messages = 'Failed to query conferences : ' + errorMessage;
+                $scope.alertStatus = 'warning';
+                $log.error($scope.messages + ' filters : ' + JSON.stringify(sendFilters));
+            } else {
+                // The request has succeeded.
+                $scope.submitted = false;
+                $scope.messages = 'Query succeeded : ' + JSON.stringify(sendFilters);
+                $scope.alertStatus = 'success';
+                $log.info($scope.messages);
+
+                if (!pageToken) {
+                    $scope.conferences = [];
+                }
+                angular.forEach(resp.items, function (conference) {
+                    $scope.conferences.push(conference);
+                });
+                $scope.pagination.nextPageToken = resp.nextPageToken || null;
+            }
+            $scope.submitted = true;
+        }
     }
 
+    /**
+     * Loads the next page of conferences, if there is one and no query is running.
+     */
+    $scope.loadMoreConferences = function () {
+        if ($scope.selectedTab == 'ALL' && $scope.pagination.nextPageToken && !$scope.loading) {
+            $scope.queryConferencesAll($scope.pagination.nextPageToken);
+        }
+    };
+
     /**
      * Invokes the conference.getConferencesCreated method.
      */
     $scope.getConferencesCreated = function () {
         $scope.loading = true;
-        gapi.client.conference.getConferencesCreated().
+        gapi.client.conference.getConferencesCreated({summary: true}).
             execute(function (resp) {
                 $scope.$apply(function () {
                     $scope.loading = false;
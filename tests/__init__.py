@@ -0,0 +1,17 @@
+"""
+tests -- Udacity conference server-side Python App Engine
+    unit tests and benchmarks, run from the project directory with the App
+    Engine SDK (python27) on the path:
+
+        python -m unittest discover -s tests -t .
+        python -m tests.shuffled [seed]
+        python -m tests.bench_<name>
+"""
+
+try:
+    # puts the SDK's bundled libraries (webapp2, endpoints, protorpc...) on
+    # the path, like dev_appserver.py does for the app
+    import dev_appserver
+    dev_appserver.fix_sys_path()
+except ImportError:
+    pass
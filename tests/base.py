@@ -0,0 +1,122 @@
+"""
+base.py -- Udacity conference server-side Python App Engine
+    common setup of the tests and the benchmarks: the App Engine service
+    stubs, a signed in user and counters of the datastore calls
+"""
+
+import os
+import unittest
+
+from google.appengine.api import apiproxy_stub_map
+from google.appengine.api import users
+from google.appengine.datastore import datastore_stub_util
+from google.appengine.ext import ndb
+from google.appengine.ext import testbed
+
+import entity_cache
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def activate_stubs():
+    ''' returns an active testbed with empty service stubs; the datastore
+    is strongly consistent '''
+    bed = testbed.Testbed()
+    bed.activate()
+    bed.setup_env(app_id='conference-test', overwrite=True)
+    bed.init_datastore_v3_stub(
+        consistency_policy=datastore_stub_util.
+        PseudoRandomHRConsistencyPolicy(probability=1))
+    bed.init_memcache_stub()
+    # queue.yaml is read from the project directory
+    bed.init_taskqueue_stub(root_path=ROOT)
+    bed.init_search_stub()
+    bed.init_app_identity_stub()
+    bed.init_user_stub()
+    ndb.get_context().clear_cache()
+    # the request LRU is kept by request id, which is the same in every
+    # test, and the counters are per instance
+    entity_cache._local.__dict__.clear()
+    entity_cache._stats.clear()
+    return bed
+
+
+def sign_in(api, email='ada@example.com'):
+    ''' makes email the signed in user of the context of api '''
+    user = users.User(email)
+    # the context resolves these once, set them as if it had
+    api.context.auth_user = user
+    api.context.user_id = email
+    return user
+
+
+def add_datastore_hook(name, hook):
+    ''' calls hook(call, request) before every datastore call, the hook
+    goes with the stubs '''
+    hooks = apiproxy_stub_map.apiproxy.GetPreCallHooks()
+    hooks.Append('%s_%d' % (name, len(hooks)),
+                 lambda service, call, request, response: hook(call, request),
+                 'datastore_v3')
+
+
+def run_tasks(taskqueue_stub, handlers):
+    ''' runs the queued tasks whose url is in handlers, and the ones they
+    queue, as handlers[url](params); returns how many ran '''
+    ran = set()
+    while True:
+        tasks = [task for task in taskqueue_stub.get_filtered_tasks()
+                 if task.url in handlers and task.name not in ran]
+        if not tasks:
+            return len(ran)
+        for task in tasks:
+            ran.add(task.name)
+            handlers[task.url](task.extract_params())
+
+
+def no_ndb_caches():
+    ''' turns the ndb caches off, every get is a datastore call '''
+    ctx = ndb.get_context()
+    ctx.set_cache_policy(False)
+    ctx.set_memcache_policy(False)
+
+
+class AppEngineTestCase(unittest.TestCase):
+
+    '''AppEngineTestCase -- every test starts with empty stubs; the
+    datastore is strongly consistent unless a test says otherwise'''
+
+    def setUp(self):
+        self.testbed = activate_stubs()
+        self.taskqueue = self.testbed.get_stub(testbed.TASKQUEUE_SERVICE_NAME)
+
+    def tearDown(self):
+        # the hooks of count_gets and count_calls go with the stubs
+        self.testbed.deactivate()
+
+    def sign_in(self, api, email='ada@example.com'):
+        return sign_in(api, email)
+
+    def count_gets(self, kind):
+        ''' returns a list that gets the key of every entity of kind read
+        from the datastore from now on '''
+        no_ndb_caches()
+        keys = []
+
+        def hook(call, request):
+            if call != 'Get':
+                return
+            for ref in request.key_list():
+                if ref.path().element_list()[-1].type() == kind:
+                    keys.append(ref)
+
+        add_datastore_hook('count_gets_%s' % kind, hook)
+        return keys
+
+    def count_calls(self):
+        ''' returns a list that gets the name of every datastore call made
+        from now on: Get, RunQuery, Next... '''
+        no_ndb_caches()
+        calls = []
+        add_datastore_hook('count_calls',
+                           lambda call, request: calls.append(call))
+        return calls
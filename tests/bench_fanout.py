@@ -0,0 +1,167 @@
+"""
+bench_fanout.py -- Udacity conference server-side Python App Engine
+    latency benchmark of the endpoints that fan out their lookups: the
+    depth of the critical path of their RPCs (datastore and memcache),
+    compared with the lookups of the handlers before they fanned out,
+    made one after another. The stubs answer at once, so the latency at a
+    given time per RPC round trip is estimated from the depth. Run from
+    the project directory with the App Engine SDK on the path:
+
+        python -m tests.bench_fanout [ms per RPC]
+"""
+
+import os
+import sys
+import time
+from datetime import date
+from datetime import time as time_of_day
+
+from google.appengine.api import apiproxy_stub_map
+from google.appengine.api import memcache
+from google.appengine.ext import ndb
+
+from tests.base import activate_stubs
+from tests.base import no_ndb_caches
+
+from conference import ConferenceApi
+from models import Conference
+from models import ConferenceSession
+from models import ConferenceSpeaker
+from models import Profile
+from models import WishList
+import message_models as mm
+import seat_counter
+
+
+class CriticalPath(object):
+
+    '''CriticalPath -- while entered, gives every RPC made the depth of the
+    RPCs whose result was used before it was made plus one; RPCs made
+    together run together, so the deepest one is the critical path'''
+
+    def __enter__(self):
+        self.rpcs = 0
+        self.depth = 0
+        self._used = 0
+        self._make_call = apiproxy_stub_map.UserRPC.make_call
+        self._check_success = apiproxy_stub_map.UserRPC.check_success
+        path = self
+
+        def make_call(rpc, *args, **kwargs):
+            rpc.critical_path_depth = path._used + 1
+            path.rpcs += 1
+            path.depth = max(path.depth, rpc.critical_path_depth)
+            return path._make_call(rpc, *args, **kwargs)
+
+        def check_success(rpc):
+            # every result goes through check_success before it is used
+            path._used = max(path._used,
+                             getattr(rpc, 'critical_path_depth', 0))
+            return path._check_success(rpc)
+
+        apiproxy_stub_map.UserRPC.make_call = make_call
+        apiproxy_stub_map.UserRPC.check_success = check_success
+        return self
+
+    def __exit__(self, *exc_info):
+        apiproxy_stub_map.UserRPC.make_call = self._make_call
+        apiproxy_stub_map.UserRPC.check_success = self._check_success
+
+
+def _new_request():
+    ''' starts over with empty caches, like a request on a new instance '''
+    memcache.flush_all()
+    ndb.get_context().clear_cache()
+    os.environ['REQUEST_LOG_ID'] = str(time.time())
+
+
+def _measure(function):
+    _new_request()
+    with CriticalPath() as path:
+        function()
+    return path
+
+
+def _setup():
+    ''' returns the keys of a conference with 20 sessions by 5 speakers, a
+    second conference and a wish list of sessions of both '''
+    p_key = ndb.Key(Profile, 'ada@example.com')
+    conf_keys = ndb.put_multi([
+        Conference(parent=p_key, name='PyCon', seatsAvailable=100),
+        Conference(parent=p_key, name='DjangoCon', seatsAvailable=100)])
+    for conf_key in conf_keys:
+        seat_counter.init_seats(conf_key, 100)
+    speaker_keys = ndb.put_multi([
+        ConferenceSpeaker(displayName='Speaker %d' % i) for i in xrange(5)])
+    session_keys = ndb.put_multi([ConferenceSession(
+        parent=conf_keys[i % 2], name='Session %d' % i,
+        startDate=date(2016, 5, 1), startTime=time_of_day(9 + i % 8),
+        duration=30, speakerKey=speaker_keys[i % 5]) for i in xrange(40)])
+    wish_list = WishList(conferences=conf_keys, sessions=session_keys[:10])
+    return conf_keys[0], speaker_keys[0], wish_list
+
+
+def _scenarios(api, conf_key, speaker_key, wish_list):
+    ''' returns (name, baseline handler, endpoint) of every scenario; the
+    baseline handlers are the lookups of the endpoints before they fanned
+    out, one after another and without entity_cache '''
+    sessions_request = mm.CONF_SESSIONS_REQUEST.combined_message_class(
+        websafeConferenceKey=conf_key.urlsafe())
+    speaker_request = mm.GET_SESSIONS_BY_SPEAKER_CONFERENCE.\
+        combined_message_class(websafeSpeakerKey=speaker_key.urlsafe(),
+                               websafeConferenceKey=conf_key.urlsafe())
+
+    def conference_sessions():
+        conf_key.get()
+        sessions = ConferenceSession.query(ancestor=conf_key).fetch(500)
+        speakers = ndb.get_multi([sess.speakerKey for sess in sessions])
+        mm.ConferenceSessionForms(items=[
+            sess.to_form(speaker)
+            for sess, speaker in zip(sessions, speakers)])
+
+    def speaker_and_conference():
+        speaker = speaker_key.get()
+        conf_key.get()
+        q = ConferenceSession.query(ancestor=conf_key)
+        q = q.filter(ConferenceSession.speakerKey == speaker_key)
+        mm.ConferenceSessionForms(
+            items=[sess.to_form(speaker) for sess in q.fetch(50)])
+
+    def wish_list_form():
+        sessions = ndb.get_multi(wish_list.sessions)
+        speakers = ndb.get_multi([sess.speakerKey for sess in sessions])
+        mm.ConferenceSessionForms(items=[
+            sess.to_form(speaker)
+            for sess, speaker in zip(sessions, speakers)])
+        conferences = ndb.get_multi(wish_list.conferences)
+        mm.ConferenceForms(items=[conf.to_form(None) for conf in conferences])
+
+    return [
+        ('getConferenceSessions', conference_sessions,
+         lambda: api.getConferenceSessions(sessions_request)),
+        ('getSessionsFromSpeakerAndConference', speaker_and_conference,
+         lambda: api.getSessionsFromSpeakerAndConference(speaker_request)),
+        ('WishList.to_form', wish_list_form, wish_list.to_form),
+    ]
+
+
+def main(argv):
+    rpc_ms = float(argv[1]) if len(argv) > 1 else 20.0
+    bed = activate_stubs()
+    try:
+        scenarios = _scenarios(ConferenceApi(), *_setup())
+        no_ndb_caches()
+        print('RPC critical path depth (RPCs made), latency at %.0fms per '
+              'RPC' % rpc_ms)
+        for name, sequential, fanned_out in scenarios:
+            before, after = _measure(sequential), _measure(fanned_out)
+            print('%-36s before %2d (%2d) %4.0fms   '
+                  'after %2d (%2d) %4.0fms' % (
+                      name, before.depth, before.rpcs, before.depth * rpc_ms,
+                      after.depth, after.rpcs, after.depth * rpc_ms))
+    finally:
+        bed.deactivate()
+
+
+if __name__ == '__main__':
+    main(sys.argv)
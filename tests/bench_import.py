@@ -0,0 +1,84 @@
+"""
+bench_import.py -- Udacity conference server-side Python App Engine
+    benchmark of a bulk import of 10000 sessions (10 conferences, 500
+    speakers) against the datastore stub, running its tasks one after
+    another like the push queue would. Run from the project directory with
+    the App Engine SDK on the path:
+
+        python -m tests.bench_import [sessions]
+"""
+
+import json
+import sys
+import time
+from datetime import date
+from datetime import timedelta
+
+from google.appengine.ext import ndb
+from google.appengine.ext import testbed
+
+from tests.base import activate_stubs
+from tests.base import run_tasks
+from tests.base import sign_in
+from tests.test_import import IMPORT_TASKS
+
+from conference import ConferenceApi
+from models import ConferenceSession
+from models import Profile
+import message_models as mm
+
+CONFERENCES = 10
+SPEAKERS = 500
+FIRST_DAY = date(2016, 5, 1)
+
+
+def import_lines(sessions):
+    ''' returns the JSON lines of an import of sessions sessions; every
+    speaker talks in one conference, at most 8 times a day '''
+    lines = [json.dumps(dict(
+        kind='conference', ref='conf%d' % i, name='Conference %d' % i,
+        startDate=str(FIRST_DAY), maxAttendees=1000,
+        endDate=str(FIRST_DAY + timedelta(days=sessions // SPEAKERS // 8))))
+        for i in xrange(CONFERENCES)]
+    lines.extend(json.dumps(dict(
+        kind='speaker', ref='speaker%d' % i, displayName='Speaker %d' % i))
+        for i in xrange(SPEAKERS))
+    for i in xrange(sessions):
+        # the talks of a speaker follow each other
+        speaker, talk = i % SPEAKERS, i // SPEAKERS
+        lines.append(json.dumps(dict(
+            kind='session', conference='conf%d' % (speaker % CONFERENCES),
+            speaker='speaker%d' % speaker, name='Session %d' % i,
+            startDate=str(FIRST_DAY + timedelta(days=talk // 8)),
+            startTime='%02d:00' % (9 + talk % 8), duration=45)))
+    return lines
+
+
+def main(argv):
+    sessions = int(argv[1]) if len(argv) > 1 else 10000
+    bed = activate_stubs()
+    try:
+        api = ConferenceApi()
+        sign_in(api)
+        Profile(key=ndb.Key(Profile, 'ada@example.com'), displayName='Ada',
+                mainEmail='ada@example.com').put()
+        data = '\n'.join(import_lines(sessions))
+
+        start = time.time()
+        form = api._startImport(mm.ImportRequest(data=data))
+        tasks = run_tasks(bed.get_stub(testbed.TASKQUEUE_SERVICE_NAME),
+                          IMPORT_TASKS)
+        seconds = time.time() - start
+
+        job = ndb.Key(urlsafe=form.websafeKey).get()
+        print('%d rows imported in %.1fs (%.0f rows/s) by %d tasks, '
+              '%d errors' % (job.imported, seconds, job.rows / seconds,
+                             tasks, len(job.errors)))
+        assert job.status == 'done' and not job.errors, job.errors[:10]
+        assert ConferenceSession.query().count(limit=None) == sessions
+    finally:
+        bed.deactivate()
+
+
+if __name__ == '__main__':
+    main(sys.argv)
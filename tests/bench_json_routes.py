@@ -0,0 +1,136 @@
+"""
+bench_json_routes.py -- Udacity conference server-side Python App Engine
+    benchmark of the JSON routes of main.py against the endpoints they
+    mirror: the time to build a page of 100 conferences, sessions and
+    speakers and the size of the JSON sent, through the webapp2 route and
+    through the endpoint method and the protorpc JSON encoding. Run from
+    the project directory with the App Engine SDK on the path:
+
+        python -m tests.bench_json_routes
+"""
+
+import time
+from datetime import date
+from datetime import time as time_of_day
+
+from google.appengine.ext import ndb
+from protorpc import protojson
+
+from tests.base import activate_stubs
+
+from conference import ConferenceApi
+from main import app
+from models import Conference
+from models import ConferenceSession
+from models import ConferenceSpeaker
+from models import Profile
+from settings import PAGE_SIZE_MAX
+import message_models as mm
+import query_cache
+import seat_counter
+
+
+def _setup(count):
+    ''' saves count conferences, speakers and sessions of the first
+    conference, returns the key of the first conference '''
+    p_key = ndb.Key(Profile, 'ada@example.com')
+    conf_keys = ndb.put_multi([Conference(
+        parent=p_key, name='Conference %d' % i, city='London',
+        topics=['Python', 'Web'], startDate=date(2016, 5, 1),
+        endDate=date(2016, 5, 3), month=5, maxAttendees=100,
+        seatsAvailable=100, organizerDisplayName='Ada')
+        for i in xrange(count)])
+    for conf_key in conf_keys:
+        seat_counter.init_seats(conf_key, 100)
+    speaker_keys = ndb.put_multi([
+        ConferenceSpeaker(displayName='Speaker %d' % i)
+        for i in xrange(count)])
+    ndb.put_multi([ConferenceSession(
+        parent=conf_keys[0], name='Session %d' % i, type='Talk',
+        startDate=date(2016, 5, 1), startTime=time_of_day(9 + i % 8),
+        duration=45, speakerKey=speaker_keys[i], highlights='Highlights')
+        for i in xrange(count)])
+    return conf_keys[0]
+
+
+def _best(function, repeat=5):
+    ''' returns (best time of repeat calls of function in seconds, what it
+    returned) '''
+    best = None
+    for _ in xrange(repeat):
+        start = time.time()
+        result = function()
+        seconds = time.time() - start
+        best = seconds if best is None else min(best, seconds)
+    return best, result
+
+
+def _route(path):
+    ''' returns a function getting path from the JSON routes, it returns
+    the body sent '''
+    def get():
+        # as for the endpoints, the pages are built every time
+        query_cache.bump()
+        response = app.get_response(path)
+        assert response.status_int == 200, response.status
+        return response.body
+    return get
+
+
+def _check_etag(path):
+    ''' an unchanged page is not sent again '''
+    etag = app.get_response(path).headers['ETag']
+    assert app.get_response(path, headers=[
+        ('If-None-Match', etag)]).status_int == 304, path
+
+
+def _endpoint(method, request):
+    ''' returns a function calling an endpoint method, it returns the JSON
+    endpoints would send '''
+    def call():
+        # the result cache of queryConferences would answer from memcache,
+        # the pages are built every time by both paths
+        query_cache.bump()
+        return protojson.encode_message(method(request))
+    return call
+
+
+def main():
+    bed = activate_stubs()
+    try:
+        conf_key = _setup(PAGE_SIZE_MAX)
+        api = ConferenceApi()
+        query = '?pageSize=%d' % PAGE_SIZE_MAX
+        cases = [
+            ('queryConferences', '/json/conferences' + query,
+             _endpoint(api.queryConferences, mm.ConferenceQueryForms(
+                 pageSize=PAGE_SIZE_MAX))),
+            ('getConferenceSessions',
+             '/json/conferences/%s/sessions%s' % (conf_key.urlsafe(), query),
+             _endpoint(api.getConferenceSessions,
+                       mm.CONF_SESSIONS_REQUEST.combined_message_class(
+                           websafeConferenceKey=conf_key.urlsafe(),
+                           pageSize=PAGE_SIZE_MAX))),
+            ('getSpeakers', '/json/speakers' + query,
+             _endpoint(api.getSpeakers,
+                       mm.GET_SPEAKERS.combined_message_class(
+                           pageSize=PAGE_SIZE_MAX))),
+        ]
+        print('page of %d, build time and size of the JSON' % PAGE_SIZE_MAX)
+        for name, path, endpoint in cases:
+            route = _route(path)
+            # the first calls fill the caches, both paths use them
+            _check_etag(path)
+            endpoint()
+            route_seconds, route_body = _best(route)
+            endpoint_seconds, endpoint_body = _best(endpoint)
+            print('%-22s route %6.1fms %7d bytes   '
+                  'endpoint %6.1fms %7d bytes' % (
+                      name, route_seconds * 1e3, len(route_body),
+                      endpoint_seconds * 1e3, len(endpoint_body)))
+    finally:
+        bed.deactivate()
+
+
+if __name__ == '__main__':
+    main()
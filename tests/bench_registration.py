@@ -0,0 +1,138 @@
+"""
+bench_registration.py -- Udacity conference server-side Python App Engine
+    load benchmark of conference registration: users register concurrently
+    for one conference against the datastore stub, with its seats in a
+    single counter shard and then in SEAT_COUNTER_SHARDS; reports the
+    throughput and the transactions retried on contention. Run from the
+    project directory with the App Engine SDK on the path:
+
+        python -m tests.bench_registration [users] [threads]
+"""
+
+import collections
+import sys
+import threading
+import time
+
+from google.appengine.api import datastore_errors
+from google.appengine.ext import ndb
+
+from tests.base import activate_stubs
+from tests.base import add_datastore_hook
+from tests.base import sign_in
+
+from conference import ConferenceApi
+from models import ConflictException
+from models import Conference
+from models import Profile
+from settings import SEAT_COUNTER_SHARDS
+import message_models as mm
+import seat_counter
+
+# set while a thread runs ConferenceApi._takeSeat, the transactions begun
+# then are the attempts of registrations
+_in_registration = threading.local()
+
+
+class _Tally(object):
+
+    '''_Tally -- counters shared by the registering threads'''
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.counts = collections.Counter()
+
+    def add(self, name):
+        with self._lock:
+            self.counts[name] += 1
+
+
+def _count_attempts(tally):
+    def hook(call, request):
+        if call == 'BeginTransaction' and \
+                getattr(_in_registration, 'active', False):
+            tally.add('attempts')
+    add_datastore_hook('bench_attempts', hook)
+
+
+def _register(email, request, tally):
+    ''' registers email like a request would, with a fresh ndb context
+    cache and ConferenceApi '''
+    ndb.get_context().clear_cache()
+    api = ConferenceApi()
+    sign_in(api, email)
+    take_seat = api._takeSeat
+
+    def counted_take_seat(*args):
+        tally.add('transactions')
+        _in_registration.active = True
+        try:
+            return take_seat(*args)
+        finally:
+            _in_registration.active = False
+
+    api._takeSeat = counted_take_seat
+    try:
+        api._conferenceRegistration(request)
+        tally.add('registered')
+    except datastore_errors.TransactionFailedError:
+        tally.add('gave up')
+    except ConflictException:
+        tally.add('sold out')
+
+
+def run(shards, users, threads):
+    ''' registers users for a conference with as many seats from threads,
+    returns (seconds, counts, seats left in the shards) '''
+    bed = activate_stubs()
+    seat_counter.SEAT_COUNTER_SHARDS = shards
+    try:
+        conf_key = Conference(parent=ndb.Key(Profile, 'org@example.com'),
+                              name='PyCon', seatsAvailable=users).put()
+        seat_counter.init_seats(conf_key, users)
+        request = mm.CONF_GET_REQUEST.combined_message_class(
+            websafeConferenceKey=conf_key.urlsafe())
+        tally = _Tally()
+        _count_attempts(tally)
+
+        emails = ['user%d@example.com' % i for i in xrange(users)]
+
+        def worker(batch):
+            for email in batch:
+                _register(email, request, tally)
+
+        workers = [threading.Thread(target=worker, args=(emails[i::threads],))
+                   for i in xrange(threads)]
+        start = time.time()
+        for thread in workers:
+            thread.start()
+        for thread in workers:
+            thread.join()
+        seconds = time.time() - start
+
+        seats_left = sum(shard.seats for shard in
+                         seat_counter.SeatCounterShard.query())
+        return seconds, tally.counts, seats_left
+    finally:
+        seat_counter.SEAT_COUNTER_SHARDS = SEAT_COUNTER_SHARDS
+        bed.deactivate()
+
+
+def main(argv):
+    users = int(argv[1]) if len(argv) > 1 else 500
+    threads = int(argv[2]) if len(argv) > 2 else 10
+    print('%d users registering from %d threads' % (users, threads))
+    for shards in (1, SEAT_COUNTER_SHARDS):
+        seconds, counts, seats_left = run(shards, users, threads)
+        print('%2d shard(s): %d registered in %.2fs (%.1f/s), '
+              '%d transactions, %d retries, %d gave up, %d sold out' % (
+                  shards, counts['registered'], seconds,
+                  counts['registered'] / seconds, counts['transactions'],
+                  counts['attempts'] - counts['transactions'],
+                  counts['gave up'], counts['sold out']))
+        # every seat taken is a registration, whatever was retried
+        assert seats_left == users - counts['registered'], seats_left
+
+
+if __name__ == '__main__':
+    main(sys.argv)
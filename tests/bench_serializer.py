@@ -0,0 +1,132 @@
+"""
+bench_serializer.py -- Udacity conference server-side Python App Engine
+    microbenchmark of the serialization of sessions and conferences to
+    their messages: the FormSerializer of the models against the reflective
+    to_form they used to have, which looped over all_fields() with
+    hasattr/getattr/setattr and name suffix checks for every entity. Run
+    from the project directory with the App Engine SDK on the path:
+
+        python -m tests.bench_serializer [entities]
+"""
+
+import sys
+import time
+from datetime import date
+from datetime import time as time_of_day
+
+from google.appengine.ext import ndb
+
+from tests.base import activate_stubs
+
+from models import Conference
+from models import ConferenceSession
+from models import ConferenceSpeaker
+from models import Profile
+import message_models as mm
+
+
+def reflective_session_form(sess, speaker):
+    ''' ConferenceSession.to_form as it was before FormSerializer '''
+    csf = mm.ConferenceSessionFormOut()
+    for field in csf.all_fields():
+        if hasattr(sess, field.name):
+            if field.name.endswith('Date'):
+                setattr(csf, field.name, str(getattr(sess, field.name)))
+            elif field.name.endswith('Time'):
+                setattr(csf, field.name, str(getattr(sess, field.name)))
+            elif field.name == "speakerKey":
+                setattr(csf, field.name, speaker.key.urlsafe())
+            else:
+                setattr(csf, field.name, getattr(sess, field.name))
+        elif field.name == "speakerName":
+            setattr(csf, field.name, speaker.displayName)
+        elif field.name == "sessionKey":
+            setattr(csf, field.name, sess.key.urlsafe())
+        elif field.name == "confKey":
+            setattr(csf, field.name, sess.key.parent().urlsafe())
+    csf.check_initialized()
+    return csf
+
+
+def reflective_conference_form(conf):
+    ''' Conference.to_form as it was before FormSerializer '''
+    cf = mm.ConferenceForm()
+    for field in cf.all_fields():
+        if hasattr(conf, field.name):
+            # convert Date to date string; just copy others
+            if field.name.endswith('Date'):
+                setattr(cf, field.name, str(getattr(conf, field.name)))
+            else:
+                setattr(cf, field.name, getattr(conf, field.name))
+        elif field.name == "websafeKey":
+            setattr(cf, field.name, conf.key.urlsafe())
+    cf.check_initialized()
+    return cf
+
+
+def _entities(count):
+    ''' returns count sessions, their 10 speakers by key and count
+    conferences, unsaved '''
+    p_key = ndb.Key(Profile, 'ada@example.com')
+    speakers = dict(
+        (speaker.key, speaker) for speaker in
+        [ConferenceSpeaker(id=i + 1, displayName='Speaker %d' % i)
+         for i in xrange(10)])
+    speaker_keys = sorted(speakers)
+    conferences = [Conference(
+        parent=p_key, id=i + 1, name='Conference %d' % i, city='London',
+        topics=['Python', 'Web'], startDate=date(2016, 5, 1),
+        endDate=date(2016, 5, 3), month=5, maxAttendees=100,
+        seatsAvailable=100, organizerUserId='ada@example.com')
+        for i in xrange(count)]
+    sessions = [ConferenceSession(
+        parent=conferences[0].key, id=i + 1, name='Session %d' % i,
+        type='Talk', startDate=date(2016, 5, 1),
+        startTime=time_of_day(9 + i % 8, i % 60), duration=45,
+        speakerKey=speaker_keys[i % 10], highlights='Highlights')
+        for i in xrange(count)]
+    return sessions, speakers, conferences
+
+
+def _best(function, repeat=5):
+    ''' returns the best time of repeat calls of function, in seconds '''
+    best = None
+    for _ in xrange(repeat):
+        start = time.time()
+        function()
+        seconds = time.time() - start
+        best = seconds if best is None else min(best, seconds)
+    return best
+
+
+def main(argv):
+    count = int(argv[1]) if len(argv) > 1 else 500
+    bed = activate_stubs()
+    try:
+        sessions, speakers, conferences = _entities(count)
+        seats = [conf.seatsAvailable for conf in conferences]
+        cases = [
+            ('ConferenceSession',
+             lambda: [reflective_session_form(sess, speakers[sess.speakerKey])
+                      for sess in sessions],
+             lambda: ConferenceSession._serializer.to_forms(sessions,
+                                                            speakers)),
+            ('Conference',
+             lambda: [reflective_conference_form(conf)
+                      for conf in conferences],
+             lambda: Conference.to_forms(conferences, seats)),
+        ]
+        print('%d entities, microseconds per entity' % count)
+        for name, reflective, serializer in cases:
+            # both give the same messages
+            assert reflective() == serializer(), name
+            before, after = _best(reflective), _best(serializer)
+            print('%-18s reflective %6.1f   FormSerializer %6.1f   %.1fx' % (
+                name, before * 1e6 / count, after * 1e6 / count,
+                before / after))
+    finally:
+        bed.deactivate()
+
+
+if __name__ == '__main__':
+    main(sys.argv)
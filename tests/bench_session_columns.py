@@ -0,0 +1,125 @@
+"""
+bench_session_columns.py -- Udacity conference server-side Python App Engine
+    benchmark of the interval index of session_columns at 10000 sessions per
+    conference: building, saving and loading the index, the overlap queries
+    against a scan of every session, with and without a day-long
+    session, and adding sessions with the speaker double-booking check.
+    Run from the project directory with the App Engine SDK on the path:
+
+        python -m tests.bench_session_columns [sessions]
+"""
+
+import datetime
+import random
+import sys
+import time
+
+from google.appengine.ext import ndb
+
+from tests.base import activate_stubs
+from tests.test_session_columns import random_sessions
+from tests.test_session_columns import scan
+
+from models import Conference
+from models import ConferenceSession
+from models import ConferenceSpeaker
+from models import Profile
+import session_columns
+
+QUERIES = 1000
+# the scan looks at every session, fewer queries are enough to time it
+SCAN_QUERIES = 50
+ADDED = 1000
+
+
+def _timed(function):
+    ''' returns (seconds function took, what it returned) '''
+    start = time.time()
+    result = function()
+    return time.time() - start, result
+
+
+def main(argv):
+    count = int(argv[1]) if len(argv) > 1 else 10000
+    bed = activate_stubs()
+    try:
+        conf_key = Conference(parent=ndb.Key(Profile, 'ada@example.com'),
+                              name='PyCon').put()
+        speaker_keys = [ndb.Key(ConferenceSpeaker, i + 1)
+                        for i in xrange(200)]
+        sessions = random_sessions(conf_key, count + ADDED, speaker_keys)
+        sessions, added = sessions[:count], sessions[count:]
+
+        def build(sessions=sessions):
+            columns = session_columns.SessionColumns(
+                key=session_columns._columns_key(conf_key))
+            for sess in sessions:
+                columns.add(sess)
+            return columns
+
+        build_seconds, columns = _timed(build)
+        put_seconds = _timed(columns.put)[0]
+        ndb.get_context().clear_cache()
+        get_seconds, columns = _timed(
+            lambda: session_columns.get_columns(conf_key))
+        index_seconds = _timed(columns._interval_index)[0]
+        print('%d sessions: built in %.0fms, %d bytes put in %.0fms, '
+              'got in %.0fms, tree of ends built in %.0fms' % (
+                  count, build_seconds * 1e3, len(columns.data),
+                  put_seconds * 1e3, get_seconds * 1e3, index_seconds * 1e3))
+
+        rand = random.Random(3)
+        first, last = columns._starts[0], columns._starts[-1]
+        queries = []
+        for _ in xrange(QUERIES):
+            start = rand.randint(first, last)
+            queries.append((start, start + rand.randint(15, 120),
+                            rand.choice([None] + speaker_keys)))
+
+        index_seconds, found = _timed(lambda: [
+            columns.overlapping(start, end, speaker_key)
+            for start, end, speaker_key in queries])
+        scan_seconds, scanned = _timed(lambda: [
+            scan(sessions, start, end, speaker_key)
+            for start, end, speaker_key in queries[:SCAN_QUERIES]])
+        assert [sorted(ids) for ids in found[:SCAN_QUERIES]] == scanned
+        print('overlapping: index %.1fus per query (%.1f sessions found), '
+              'scan %.1fus per query' % (
+                  index_seconds * 1e6 / QUERIES,
+                  float(sum(len(ids) for ids in found)) / QUERIES,
+                  scan_seconds * 1e6 / SCAN_QUERIES))
+
+        # a day-long session overlaps every query of its day, the others
+        # are still skipped
+        day_long = random_sessions(conf_key, 1, speaker_keys, seed=5)[0]
+        day_long.key = ndb.Key(ConferenceSession, count + ADDED + 1,
+                               parent=conf_key)
+        day_long.startTime = datetime.time(0)
+        day_long.duration = session_columns.MINUTES_IN_DAY
+        with_day_long = build(sessions + [day_long])
+        with_day_long._interval_index()
+        long_seconds = _timed(lambda: [
+            with_day_long.overlapping(start, end, speaker_key)
+            for start, end, speaker_key in queries])[0]
+        print('overlapping with a day-long session: %.1fus per query' % (
+            long_seconds * 1e6 / QUERIES))
+
+        def add():
+            rejected = 0
+            for sess in added:
+                if session_columns._speaker_conflicts(columns, sess):
+                    rejected += 1
+                else:
+                    columns.add(sess)
+            return rejected
+
+        add_seconds, rejected = _timed(add)
+        print('add with the speaker check: %.1fus per session, %d of %d '
+              'rejected as double-booked' % (
+                  add_seconds * 1e6 / ADDED, rejected, ADDED))
+    finally:
+        bed.deactivate()
+
+
+if __name__ == '__main__':
+    main(sys.argv)
@@ -0,0 +1,32 @@
+"""
+shuffled.py -- Udacity conference server-side Python App Engine
+    runs the tests in a random order, so a test that depends on what an
+    earlier one left behind fails; run from the project directory:
+
+        python -m tests.shuffled [seed]
+"""
+
+import random
+import sys
+import unittest
+
+
+def _flatten(suite):
+    ''' returns the test cases of a suite and of the suites in it '''
+    if isinstance(suite, unittest.TestSuite):
+        return [case for child in suite for case in _flatten(child)]
+    return [suite]
+
+
+def main(argv):
+    seed = int(argv[1]) if len(argv) > 1 else random.randrange(1 << 16)
+    cases = _flatten(unittest.defaultTestLoader.discover(
+        'tests', top_level_dir='.'))
+    random.Random(seed).shuffle(cases)
+    print('seed %d, %d tests' % (seed, len(cases)))
+    result = unittest.TextTestRunner().run(unittest.TestSuite(cases))
+    return 0 if result.wasSuccessful() else 1
+
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv))
@@ -0,0 +1,79 @@
+"""
+test_announcement.py -- Udacity conference server-side Python App Engine
+    registrations that make a conference cross the nearly sold out
+    threshold, in either direction, update the announcement; the others
+    leave it alone
+"""
+
+from google.appengine.api import memcache
+from google.appengine.ext import ndb
+
+from tests.base import AppEngineTestCase
+
+from conference import ConferenceApi
+from models import Conference
+from models import Profile
+from settings import ANNOUNCEMENT_SEATS_THRESHOLD
+import announcement
+import message_models as mm
+import seat_counter
+
+
+class AnnouncementTest(AppEngineTestCase):
+
+    def setUp(self):
+        super(AnnouncementTest, self).setUp()
+        self.p_key = ndb.Key(Profile, 'ada@example.com')
+
+    def conference(self, name, seats):
+        conf_key = Conference(parent=self.p_key, name=name,
+                              maxAttendees=seats, seatsAvailable=seats).put()
+        seat_counter.init_seats(conf_key, seats)
+        return conf_key
+
+    def register(self, conf_key, email, reg=True):
+        ''' (un)registers email for a conference, in a request of its own '''
+        ndb.get_context().clear_cache()
+        api = ConferenceApi()
+        self.sign_in(api, email)
+        request = mm.CONF_GET_REQUEST.combined_message_class(
+            websafeConferenceKey=conf_key.urlsafe())
+        self.assertTrue(api._conferenceRegistration(request, reg=reg).data)
+
+    def announced(self):
+        ''' returns the announcement, from memcache and from the datastore,
+        which have to agree '''
+        text = announcement.get_announcement()
+        memcache.flush_all()
+        self.assertEqual(announcement.get_announcement(), text)
+        return text
+
+    def test_crossing_the_threshold_both_ways(self):
+        conf_key = self.conference('PyCon', ANNOUNCEMENT_SEATS_THRESHOLD + 1)
+        self.assertEqual(self.announced(), '')
+
+        self.register(conf_key, 'ada@example.com')
+        self.assertIn('PyCon', self.announced())
+
+        self.register(conf_key, 'ada@example.com', reg=False)
+        self.assertEqual(self.announced(), '')
+
+    def test_sold_out_leaves_the_announcement(self):
+        conf_key = self.conference('PyCon', 1)
+        announcement.reconcile()
+        self.assertIn('PyCon', self.announced())
+
+        self.register(conf_key, 'ada@example.com')
+        self.assertEqual(self.announced(), '')
+
+        # a seat given back makes it nearly sold out again
+        self.register(conf_key, 'ada@example.com', reg=False)
+        self.assertIn('PyCon', self.announced())
+
+    def test_registrations_within_the_threshold_write_nothing(self):
+        conf_key = self.conference('PyCon', ANNOUNCEMENT_SEATS_THRESHOLD + 5)
+        gets = self.count_gets('NearlySoldOut')
+        self.register(conf_key, 'ada@example.com')
+        self.register(conf_key, 'grace@example.com')
+        self.assertEqual(gets, [])
+        self.assertEqual(self.announced(), '')
@@ -0,0 +1,72 @@
+"""
+test_calendar_feed.py -- Udacity conference server-side Python App Engine
+    the calendar feed is only sent for the secret of its profile, and a
+    client that has the current feed gets a 304 without a datastore call
+"""
+
+from datetime import date
+
+from google.appengine.ext import ndb
+
+from tests.base import AppEngineTestCase
+
+from main import app
+from models import Conference
+from models import Profile
+import calendar_feed
+
+SECRET = '0123456789abcdef0123456789abcdef'
+
+
+class CalendarFeedTest(AppEngineTestCase):
+
+    def setUp(self):
+        super(CalendarFeedTest, self).setUp()
+        self.p_key = ndb.Key(Profile, 'ada@example.com')
+        conf_key = Conference(parent=self.p_key, name='PyCon', city='London',
+                              startDate=date(2016, 5, 1),
+                              endDate=date(2016, 5, 3)).put()
+        Profile(key=self.p_key, displayName='Ada',
+                mainEmail='ada@example.com', calendarSecret=SECRET,
+                conferenceKeysToAttend=[conf_key.urlsafe()]).put()
+
+    def get(self, secret=SECRET, etag=None, websafe_key=None):
+        path = '/calendar/%s/%s.ics' % (
+            websafe_key or self.p_key.urlsafe(), secret)
+        headers = [('If-None-Match', etag)] if etag else []
+        return app.get_response(path, headers=headers)
+
+    def test_feed(self):
+        response = self.get()
+        self.assertEqual(response.status_int, 200)
+        self.assertTrue(response.headers['Content-Type'].startswith(
+            'text/calendar'))
+        self.assertIn('SUMMARY:PyCon\r\n', response.body)
+        self.assertIn('DTSTART;VALUE=DATE:20160501\r\n', response.body)
+        self.assertIn('DTEND;VALUE=DATE:20160504\r\n', response.body)
+
+    def test_bad_secret_is_rejected(self):
+        self.assertEqual(self.get('deadbeef').status_int, 404)
+        # once the entry of the feed is cached too
+        self.get()
+        self.assertEqual(self.get('deadbeef').status_int, 404)
+        self.assertEqual(
+            self.get(websafe_key=ndb.Key(Profile, 'grace').urlsafe())
+            .status_int, 404)
+
+    def test_matching_etag_is_not_modified(self):
+        etag = self.get().headers['ETag']
+        calls = self.count_calls()
+
+        response = self.get(etag=etag)
+        self.assertEqual(response.status_int, 304)
+        self.assertEqual(response.body, '')
+        self.assertEqual(calls, [])
+
+        # a registration gives the feed a new ETag
+        prof = self.p_key.get()
+        prof.conferenceKeysToAttend.append(Conference(
+            parent=self.p_key, name='DjangoCon').put().urlsafe())
+        prof.put()
+        calendar_feed.invalidate(self.p_key)
+        self.assertEqual(self.get(etag=etag).status_int, 200)
@@ -0,0 +1,50 @@
+"""
+test_entity_cache.py -- Udacity conference server-side Python App Engine
+    the entity cache serves what the datastore has: written entities are
+    refreshed and deleted ones are dropped from both tiers
+"""
+
+from datetime import date
+from datetime import time
+
+from google.appengine.api import memcache
+from google.appengine.ext import ndb
+
+from tests.base import AppEngineTestCase
+
+from models import Conference
+from models import ConferenceSession
+from models import ConferenceSpeaker
+from models import Profile
+import entity_cache
+
+
+class EntityCacheTest(AppEngineTestCase):
+
+    def setUp(self):
+        super(EntityCacheTest, self).setUp()
+        conf_key = Conference(parent=ndb.Key(Profile, 'ada@example.com'),
+                              name='PyCon').put()
+        speaker_key = ConferenceSpeaker(displayName='Grace').put()
+        session_key = ConferenceSession(
+            parent=conf_key, name='Keynote', startDate=date(2016, 5, 1),
+            startTime=time(9), duration=60, speakerKey=speaker_key).put()
+        self.keys = [session_key, speaker_key, conf_key]
+
+    def test_refresh(self):
+        speaker = self.keys[1].get()
+        entity_cache.get(speaker.key)
+        speaker.displayName = 'Grace Hopper'
+        speaker.put()
+        entity_cache.refresh(speaker)
+        self.assertEqual(entity_cache.get(speaker.key).displayName,
+                         'Grace Hopper')
+
+    def test_deleted_entities_are_not_served(self):
+        # cached in the request LRU and in memcache
+        self.assertTrue(all(entity_cache.get_multi(self.keys)))
+        ndb.delete_multi(self.keys)
+
+        self.assertEqual(entity_cache.get_multi(self.keys), [None] * 3)
+        self.assertEqual(memcache.get_multi(
+            [entity_cache._cache_key(key) for key in self.keys]), {})
@@ -0,0 +1,99 @@
+"""
+test_import.py -- Udacity conference server-side Python App Engine
+    bulk imports create the rows they can and report every other row with
+    its line and what is wrong with it
+"""
+
+import json
+
+from google.appengine.ext import ndb
+
+from tests.base import AppEngineTestCase
+from tests.base import run_tasks
+
+from conference import ConferenceApi
+from models import Conference
+from models import ConferenceSession
+from models import ConferenceSpeaker
+from models import Profile
+import message_models as mm
+
+IMPORT_TASKS = {
+    '/tasks/import_entities': lambda params:
+        ConferenceApi._importEntities(params['websafeImportKey']),
+    '/tasks/import_sessions': lambda params:
+        ConferenceApi._importSessions(params['websafeImportKey']),
+}
+
+
+def session_row(**values):
+    row = dict(kind='session', conference='pycon', speaker='grace',
+               name='Keynote', startDate='2016-05-01', startTime='09:00',
+               duration=60)
+    row.update(values)
+    return row
+
+
+class ImportTest(AppEngineTestCase):
+
+    def setUp(self):
+        super(ImportTest, self).setUp()
+        self.api = ConferenceApi()
+        self.sign_in(self.api)
+        Profile(key=ndb.Key(Profile, 'ada@example.com'), displayName='Ada',
+                mainEmail='ada@example.com').put()
+
+    def run_import(self, lines):
+        ''' starts an import of lines, JSON encoding the ones that are not
+        strings, runs its tasks and returns the ImportJob '''
+        data = '\n'.join(line if isinstance(line, basestring) else
+                         json.dumps(line) for line in lines)
+        form = self.api._startImport(mm.ImportRequest(data=data))
+        run_tasks(self.taskqueue, IMPORT_TASKS)
+        return ndb.Key(urlsafe=form.websafeKey).get()
+
+    def test_import(self):
+        job = self.run_import([
+            dict(kind='conference', ref='pycon', name='PyCon',
+                 startDate='2016-05-01', endDate='2016-05-03',
+                 maxAttendees=100),
+            dict(kind='speaker', ref='grace', displayName='Grace Hopper'),
+            session_row(),
+            session_row(name='Workshop', startTime='11:00', type='Workshop'),
+        ])
+
+        self.assertEqual(job.status, 'done')
+        self.assertEqual(job.errors, [])
+        self.assertEqual((job.rows, job.imported), (4, 4))
+        conf = Conference.query().get()
+        self.assertEqual(conf.organizerDisplayName, 'Ada')
+        speaker = ConferenceSpeaker.query().get()
+        sessions = ConferenceSession.query(ancestor=conf.key).order(
+            ConferenceSession.startTime).fetch()
+        self.assertEqual([sess.name for sess in sessions],
+                         ['Keynote', 'Workshop'])
+        self.assertEqual(set(sess.speakerKey for sess in sessions),
+                         set([speaker.key]))
+
+    def test_errors_are_reported_by_line(self):
+        job = self.run_import([
+            dict(kind='conference', ref='pycon', name='PyCon',
+                 startDate='2016-05-01', endDate='2016-05-03'),
+            dict(kind='speaker', ref='grace', displayName='Grace Hopper'),
+            session_row(),
+            'not json',
+            dict(kind='sponsor', name='Acme'),
+            dict(kind='speaker', ref='grace', displayName='Grace Again'),
+            session_row(speaker='alan'),
+            session_row(duration=0),
+            session_row(startDate='2016-06-01'),
+            # the speaker has the keynote then
+            session_row(name='Clash', startTime='09:30'),
+        ])
+
+        self.assertEqual(job.status, 'done')
+        self.assertEqual((job.rows, job.imported), (10, 3))
+        self.assertEqual(sorted(int(error.split(':')[0].split()[1])
+                                for error in job.errors),
+                         range(4, 11))
+        self.assertEqual(ConferenceSession.query().count(), 1)
@@ -0,0 +1,71 @@
+"""
+test_json_routes.py -- Udacity conference server-side Python App Engine
+    the JSON routes send what the endpoints they mirror send, answer an
+    unchanged page with a 304 and reject filters they can't read
+"""
+
+import json
+import urllib
+from datetime import date
+
+from google.appengine.ext import ndb
+
+from tests.base import AppEngineTestCase
+
+from conference import ConferenceApi
+from main import app
+from models import Conference
+from models import Profile
+import message_models as mm
+import query_cache
+import seat_counter
+
+
+class ConferencesJsonTest(AppEngineTestCase):
+
+    def setUp(self):
+        super(ConferencesJsonTest, self).setUp()
+        p_key = ndb.Key(Profile, 'ada@example.com')
+        for i, city in enumerate(['London', 'Paris', 'London']):
+            conf_key = Conference(
+                parent=p_key, name='Conference %d' % i, city=city,
+                startDate=date(2016, 5, 1), endDate=date(2016, 5, 3),
+                month=5, maxAttendees=100, seatsAvailable=100).put()
+            seat_counter.init_seats(conf_key, 100)
+
+    def get(self, filters, etag=None):
+        path = '/json/conferences?' + urllib.urlencode(
+            {'filters': json.dumps(filters)})
+        headers = [('If-None-Match', etag)] if etag else []
+        return app.get_response(path, headers=headers)
+
+    def test_items_are_those_of_the_endpoint(self):
+        filters = [{'field': 'CITY', 'operator': 'EQ', 'value': 'London'}]
+        response = self.get(filters)
+        self.assertEqual(response.status_int, 200)
+
+        forms = ConferenceApi().queryConferences(mm.ConferenceQueryForms(
+            filters=[mm.ConferenceQueryForm(field='CITY', operator='EQ',
+                                            value='London')]))
+        items = json.loads(response.body)['items']
+        self.assertEqual([item['websafeKey'] for item in items],
+                         [form.websafeKey for form in forms.items])
+
+    def test_unchanged_page_is_not_queried(self):
+        filters = [{'field': 'CITY', 'operator': 'EQ', 'value': 'London'}]
+        etag = self.get(filters).headers['ETag']
+        calls = self.count_calls()
+
+        self.assertEqual(self.get(filters, etag).status_int, 304)
+        self.assertNotIn('RunQuery', calls)
+
+        # a conference changed
+        query_cache.bump()
+        response = self.get(filters, etag)
+        self.assertEqual(response.status_int, 200)
+        self.assertNotEqual(response.headers['ETag'], etag)
+
+    def test_filter_without_value_is_a_bad_request(self):
+        response = self.get([{'field': 'CITY', 'operator': 'EQ'}])
+        self.assertEqual(response.status_int, 400)
+        self.assertIn('filters', json.loads(response.body)['error']['message'])
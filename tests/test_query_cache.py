@@ -0,0 +1,54 @@
+"""
+test_query_cache.py -- Udacity conference server-side Python App Engine
+    registrations leave the cached queryConferences results alone, the
+    seats available served are read from the seat counters
+"""
+
+from google.appengine.ext import ndb
+
+from tests.base import AppEngineTestCase
+
+from conference import ConferenceApi
+from models import Conference
+from models import Profile
+import message_models as mm
+import seat_counter
+
+
+class QueryCacheTest(AppEngineTestCase):
+
+    def setUp(self):
+        super(QueryCacheTest, self).setUp()
+        self.api = ConferenceApi()
+        self.sign_in(self.api)
+        p_key = ndb.Key(Profile, 'ada@example.com')
+        Profile(key=p_key, displayName='Ada',
+                mainEmail='ada@example.com').put()
+        self.conf_key = Conference(parent=p_key, name='PyCon', city='London',
+                                   maxAttendees=10, seatsAvailable=10).put()
+        seat_counter.init_seats(self.conf_key, 10)
+
+    def query(self):
+        ''' returns the seats available of the conferences in London, by
+        name '''
+        forms = self.api.queryConferences(mm.ConferenceQueryForms(
+            filters=[mm.ConferenceQueryForm(field='CITY', operator='EQ',
+                                            value='London')]))
+        return dict((form.name, form.seatsAvailable) for form in forms.items)
+
+    def test_registration_keeps_cached_results(self):
+        self.assertEqual(self.query(), {'PyCon': 10})
+        request = mm.CONF_GET_REQUEST.combined_message_class(
+            websafeConferenceKey=self.conf_key.urlsafe())
+        self.assertTrue(self.api._conferenceRegistration(request).data)
+
+        calls = self.count_calls()
+        self.assertEqual(self.query(), {'PyCon': 9})
+        # served from the cache, the seats from the counter in memcache
+        self.assertNotIn('RunQuery', calls)
+
+    def test_seats_of_a_conference_without_counter(self):
+        # created before the seat counter, it has no shards
+        Conference(parent=self.conf_key.parent(), name='Old', city='London',
+                   maxAttendees=5, seatsAvailable=3).put()
+        self.assertEqual(self.query(), {'PyCon': 10, 'Old': 3})
@@ -0,0 +1,93 @@
+"""
+test_reindex.py -- Udacity conference server-side Python App Engine
+    a change to a conference or a speaker rewrites the search documents of
+    their sessions, SEARCH_BATCH_SIZE documents per put, and a deleted
+    session loses its document
+"""
+
+from datetime import date
+from datetime import time
+
+from google.appengine.api import search
+from google.appengine.ext import ndb
+
+from tests.base import AppEngineTestCase
+from tests.base import run_tasks
+
+from models import Conference
+from models import ConferenceSession
+from models import ConferenceSpeaker
+from models import Profile
+from settings import SEARCH_BATCH_SIZE
+from settings import SESSION_INDEX_NAME
+import search_indexer
+
+REINDEX_TASKS = {
+    '/tasks/reindex_conference': lambda params:
+        search_indexer.reindex_conference(
+            ndb.Key(urlsafe=params['websafeConferenceKey']),
+            params.get('cursor')),
+    '/tasks/reindex_speaker': lambda params:
+        search_indexer.reindex_speaker(
+            ndb.Key(urlsafe=params['websafeSpeakerKey']),
+            params.get('cursor')),
+}
+
+
+class ReindexTest(AppEngineTestCase):
+
+    def setUp(self):
+        super(ReindexTest, self).setUp()
+        self.conf = Conference(parent=ndb.Key(Profile, 'ada@example.com'),
+                               name='PyCon', city='London')
+        self.conf.put()
+        self.speaker = ConferenceSpeaker(displayName='Grace')
+        self.speaker.put()
+        self.session_keys = ndb.put_multi([ConferenceSession(
+            parent=self.conf.key, name='Session %d' % i,
+            startDate=date(2016, 5, 1), startTime=time(9), duration=30,
+            speakerKey=self.speaker.key) for i in xrange(450)])
+        search_indexer.index_sessions(self.session_keys)
+
+        self.puts = []
+        original = search.Index.put
+
+        def put(index, docs, **kwargs):
+            self.puts.append(len(docs))
+            return original(index, docs, **kwargs)
+
+        search.Index.put = put
+        self.addCleanup(setattr, search.Index, 'put', original)
+
+    def field_values(self, name):
+        ''' returns the set of values of a field over the documents '''
+        index = search.Index(name=SESSION_INDEX_NAME)
+        return set(doc.field(name).value for doc in
+                   index.get_range(limit=1000))
+
+    def test_conference_change_is_reindexed_in_batches(self):
+        self.conf.city = 'Paris'
+        self.conf.put()
+        search_indexer.queue_conference(self.conf.key)
+        run_tasks(self.taskqueue, REINDEX_TASKS)
+
+        self.assertEqual(self.puts, [SEARCH_BATCH_SIZE, SEARCH_BATCH_SIZE, 50])
+        self.assertEqual(self.field_values('conferenceCity'), set(['Paris']))
+
+    def test_speaker_change_is_reindexed_in_batches(self):
+        self.speaker.displayName = 'Grace Hopper'
+        self.speaker.put()
+        search_indexer.queue_speaker(self.speaker.key)
+        run_tasks(self.taskqueue, REINDEX_TASKS)
+
+        self.assertEqual(self.puts, [SEARCH_BATCH_SIZE, SEARCH_BATCH_SIZE, 50])
+        self.assertEqual(self.field_values('speakerName'),
+                         set(['Grace Hopper']))
+
+    def test_deleted_session_loses_its_document(self):
+        self.session_keys[0].delete()
+        search_indexer.index_sessions(self.session_keys[:1])
+
+        index = search.Index(name=SESSION_INDEX_NAME)
+        self.assertIsNone(index.get(self.session_keys[0].urlsafe()))
+        self.assertIsNotNone(index.get(self.session_keys[1].urlsafe()))
@@ -0,0 +1,78 @@
+"""
+test_request_context.py -- Udacity conference server-side Python App Engine
+    the Profile of the signed in user is read from the datastore once per
+    request, whatever the endpoint does with it
+"""
+
+from google.appengine.ext import ndb
+
+from tests.base import AppEngineTestCase
+
+from conference import ConferenceApi
+from models import Conference
+from models import Profile
+import message_models as mm
+import seat_counter
+
+
+class RequestContextTest(AppEngineTestCase):
+
+    def setUp(self):
+        super(RequestContextTest, self).setUp()
+        self.api = ConferenceApi()
+        self.sign_in(self.api)
+        self.p_key = ndb.Key(Profile, 'ada@example.com')
+        Profile(key=self.p_key, displayName='Ada',
+                mainEmail='ada@example.com').put()
+        self.profile_gets = self.count_gets('Profile')
+
+    def assertOneProfileGet(self):
+        self.assertEqual(len(self.profile_gets), 1)
+        self.assertEqual(self.api.context.profile_gets, 1)
+
+    def test_profile_is_read_once(self):
+        self.api._doProfile()
+        self.api._getProfileFromUser()
+        self.assertEqual(self.api.user.displayName, 'Ada')
+        self.assertOneProfileGet()
+
+    def test_new_profile_is_read_once(self):
+        self.p_key.delete()
+        self.assertEqual(self.api._getProfileFromUser().key, self.p_key)
+        self.assertIsNotNone(self.api.user)
+        self.assertOneProfileGet()
+
+    def test_registration_reads_the_profile_once(self):
+        conf_key = Conference(parent=self.p_key, name='PyCon',
+                              seatsAvailable=10).put()
+        seat_counter.init_seats(conf_key, 10)
+        request = mm.CONF_GET_REQUEST.combined_message_class(
+            websafeConferenceKey=conf_key.urlsafe())
+
+        self.assertTrue(self.api._conferenceRegistration(request).data)
+        # the context keeps the Profile saved by the transaction
+        self.assertIn(conf_key.urlsafe(),
+                      self.api.user.conferenceKeysToAttend)
+        self.assertOneProfileGet()
+
+    def test_unregistration_reads_the_profile_once(self):
+        conf_key = Conference(parent=self.p_key, name='PyCon',
+                              seatsAvailable=10).put()
+        seat_counter.init_seats(conf_key, 10)
+        prof = self.p_key.get(use_cache=False)
+        prof.conferenceKeysToAttend = [conf_key.urlsafe()]
+        prof.put()
+        del self.profile_gets[:]
+        request = mm.CONF_GET_REQUEST.combined_message_class(
+            websafeConferenceKey=conf_key.urlsafe())
+
+        self.assertTrue(
+            self.api._conferenceRegistration(request, reg=False).data)
+        self.assertEqual(self.api.user.conferenceKeysToAttend, [])
+        self.assertOneProfileGet()
+
+    def test_calendar_feed_reads_the_profile_once(self):
+        url = self.api._getCalendarFeed().data
+        self.assertTrue(url.endswith(
+            '/%s.ics' % self.api.user.calendarSecret))
+        self.assertOneProfileGet()
@@ -0,0 +1,89 @@
+"""
+test_search_indexer.py -- Udacity conference server-side Python App Engine
+    the sessions queued for indexing are written SEARCH_BATCH_SIZE
+    documents per put however they were queued, and the documents that
+    failed with a transient error stay queued
+"""
+
+from datetime import date
+from datetime import time
+
+from google.appengine.api import search
+from google.appengine.ext import ndb
+
+from tests.base import AppEngineTestCase
+from tests.base import run_tasks
+
+from models import Conference
+from models import ConferenceSession
+from models import ConferenceSpeaker
+from models import Profile
+from settings import SEARCH_BATCH_SIZE
+from settings import SEARCH_PULL_QUEUE
+from settings import SEARCH_QUEUE
+from settings import SESSION_INDEX_NAME
+import search_indexer
+
+INDEX_TASKS = {
+    '/tasks/index_sessions': lambda params: search_indexer.index_queued(),
+}
+
+
+class SearchIndexerTest(AppEngineTestCase):
+
+    def setUp(self):
+        super(SearchIndexerTest, self).setUp()
+        conf_key = Conference(parent=ndb.Key(Profile, 'ada@example.com'),
+                              name='PyCon', city='London').put()
+        speaker_key = ConferenceSpeaker(displayName='Grace').put()
+        self.session_keys = ndb.put_multi([ConferenceSession(
+            parent=conf_key, name='Session %d' % i,
+            startDate=date(2016, 5, 1), startTime=time(9), duration=30,
+            speakerKey=speaker_key) for i in xrange(450)])
+        self.puts = []
+        original = search.Index.put
+
+        def put(index, docs, **kwargs):
+            self.puts.append(len(docs))
+            return original(index, docs, **kwargs)
+
+        search.Index.put = put
+        self.addCleanup(setattr, search.Index, 'put', original)
+
+    def indexed(self):
+        index = search.Index(name=SESSION_INDEX_NAME)
+        return set(doc.doc_id for doc in
+                   index.get_range(ids_only=True, limit=1000))
+
+    def test_queued_sessions_are_written_in_batches(self):
+        # one session at a time, as sessions are created
+        for key in self.session_keys:
+            search_indexer.queue_sessions([key])
+        # a single task per window leases them
+        self.assertEqual(len(self.taskqueue.get_filtered_tasks(
+            queue_names=[SEARCH_QUEUE])), 1)
+
+        run_tasks(self.taskqueue, INDEX_TASKS)
+        self.assertEqual(self.puts, [SEARCH_BATCH_SIZE, SEARCH_BATCH_SIZE, 50])
+        self.assertEqual(self.indexed(),
+                         set(key.urlsafe() for key in self.session_keys))
+
+    def test_transient_errors_stay_queued(self):
+        search_indexer.queue_sessions(self.session_keys[:10])
+        failed = self.session_keys[3].urlsafe()
+        original = search.Index.put
+
+        def put(index, docs, **kwargs):
+            results = [search.PutResult(
+                code=search.OperationResult.TRANSIENT_ERROR
+                if doc.doc_id == failed else search.OperationResult.OK,
+                id=doc.doc_id) for doc in docs]
+            raise search.PutError('transient error', results)
+
+        search.Index.put = put
+        self.addCleanup(setattr, search.Index, 'put', original)
+        search_indexer.index_queued()
+
+        self.assertEqual(
+            [task.payload for task in self.taskqueue.get_filtered_tasks(
+                queue_names=[SEARCH_PULL_QUEUE])], [failed])
@@ -0,0 +1,230 @@
+"""
+test_session_columns.py -- Udacity conference server-side Python App Engine
+    the interval index of session_columns finds the same overlapping
+    sessions as a scan of every session, speakers can't be double-booked
+    and the wish list schedule leaves out the sessions that clash
+"""
+
+import array
+import random
+from datetime import date
+from datetime import time
+from datetime import timedelta
+
+from google.appengine.ext import ndb
+
+from tests.base import AppEngineTestCase
+
+from conference import ConferenceApi
+from models import Conference
+from models import ConferenceSession
+from models import ConferenceSpeaker
+from models import Profile
+from models import WishListItem
+import session_columns
+
+
+def random_sessions(conf_key, count, speaker_keys, seed=1):
+    ''' returns count unsaved sessions of conf_key on three days, by
+    speaker_keys '''
+    rand = random.Random(seed)
+    return [ConferenceSession(
+        key=ndb.Key(ConferenceSession, i + 1, parent=conf_key),
+        name='Session %d' % i,
+        startDate=date(2016, 5, 1) + timedelta(days=rand.randint(0, 2)),
+        startTime=time(rand.randint(8, 18), rand.choice(range(0, 60, 5))),
+        duration=rand.choice((15, 30, 45, 60, 90, 120)),
+        speakerKey=rand.choice(speaker_keys)) for i in xrange(count)]
+
+
+def scan(sessions, start, end, speaker_key=None):
+    ''' the ids of the sessions overlapping [start, end), session by
+    session '''
+    ids = []
+    for sess in sessions:
+        sess_start, sess_end = session_columns.interval(sess)
+        if sess_start < end and sess_end > start and \
+                speaker_key in (None, sess.speakerKey):
+            ids.append(sess.key.id())
+    return sorted(ids)
+
+
+class SessionColumnsTest(AppEngineTestCase):
+
+    def setUp(self):
+        super(SessionColumnsTest, self).setUp()
+        self.p_key = ndb.Key(Profile, 'ada@example.com')
+        self.conf_key = Conference(parent=self.p_key, name='PyCon').put()
+        self.speaker_keys = [ndb.Key(ConferenceSpeaker, i + 1)
+                             for i in xrange(20)]
+
+    def columns_of(self, sessions):
+        columns = session_columns.SessionColumns(
+            key=session_columns._columns_key(self.conf_key))
+        for sess in sessions:
+            columns.add(sess)
+        return columns
+
+    def assertSameAsScan(self, columns, sessions, queries=200):
+        rand = random.Random(2)
+        intervals = [session_columns.interval(sess) for sess in sessions]
+        first = min(start for start, end in intervals)
+        last = max(end for start, end in intervals)
+        for _ in xrange(queries):
+            start = rand.randint(first - 60, last)
+            end = start + rand.randint(1, 180)
+            speaker_key = rand.choice([None] + self.speaker_keys)
+            self.assertEqual(
+                sorted(columns.overlapping(start, end, speaker_key)),
+                scan(sessions, start, end, speaker_key))
+
+    def test_overlapping_matches_a_scan(self):
+        sessions = random_sessions(self.conf_key, 500, self.speaker_keys)
+        self.assertSameAsScan(self.columns_of(sessions), sessions)
+
+    def test_sessions_added_after_indexing_are_found(self):
+        sessions = random_sessions(self.conf_key, 500, self.speaker_keys)
+        columns = self.columns_of(sessions[:250])
+        columns.overlapping(0, 1)
+        # fewer than INDEX_PENDING are checked one by one
+        for sess in sessions[250:260]:
+            columns.add(sess)
+        self.assertSameAsScan(columns, sessions[:260])
+        # more and the tree is built again
+        for sess in sessions[260:]:
+            columns.add(sess)
+        self.assertSameAsScan(columns, sessions)
+
+    def test_a_long_session_is_found(self):
+        sessions = random_sessions(self.conf_key, 500, self.speaker_keys)
+        sessions[0].startTime = time(0)
+        sessions[0].duration = session_columns.MINUTES_IN_DAY
+        self.assertSameAsScan(self.columns_of(sessions), sessions)
+
+    def test_rows_are_sorted_by_start(self):
+        sessions = random_sessions(self.conf_key, 500, self.speaker_keys)
+        columns = self.columns_of(sessions)
+        by_start = sorted(sessions,
+                          key=lambda sess: session_columns.interval(sess)[0])
+        self.assertEqual(
+            [session_columns.interval(sess)[0] for sess in by_start],
+            list(columns._starts))
+        self.assertEqual(columns.find(),
+                         [sess.key.id() for sess in by_start])
+
+    def test_unsorted_index_is_sorted_when_loaded(self):
+        sessions = random_sessions(self.conf_key, 500, self.speaker_keys)
+        columns = self.columns_of(sessions)
+        # rows in any order, as indexes were saved before the rows were
+        # kept sorted
+        order = range(len(sessions))
+        random.Random(4).shuffle(order)
+        rows = dict((name, [columns.columns()[name][i] for i in order])
+                    for name, code in session_columns.COLUMNS)
+        legacy = session_columns.SessionColumns(
+            key=columns.key, types=columns.types, speakers=columns.speakers,
+            data=session_columns.pack(dict(
+                (name, array.array(code, rows[name]))
+                for name, code in session_columns.COLUMNS)))
+        self.assertSameAsScan(legacy, sessions)
+        starts = dict((sess.key.id(), session_columns.interval(sess)[0])
+                      for sess in sessions)
+        found = [starts[sess_id] for sess_id in legacy.find()]
+        self.assertEqual(found, sorted(starts.values()))
+
+    def test_saved_index_matches_a_scan(self):
+        sessions = random_sessions(self.conf_key, 500, self.speaker_keys)
+        self.columns_of(sessions).put()
+        ndb.get_context().clear_cache()
+        self.assertSameAsScan(session_columns.get_columns(self.conf_key),
+                              sessions)
+
+    def test_sessions_that_touch_do_not_overlap(self):
+        sessions = [ConferenceSession(
+            key=ndb.Key(ConferenceSession, i + 1, parent=self.conf_key),
+            name='Session %d' % i, startDate=date(2016, 5, 1),
+            startTime=time(9 + i), duration=60,
+            speakerKey=self.speaker_keys[0]) for i in xrange(3)]
+        columns = self.columns_of(sessions)
+        start, end = session_columns.interval(sessions[1])
+        self.assertEqual(columns.overlapping(start, end), [2])
+        self.assertEqual(sorted(columns.overlapping(start, end + 1)), [2, 3])
+
+    def test_speaker_is_not_double_booked(self):
+        keynote, clash, other_speaker = [ConferenceSession(
+            key=ndb.Key(ConferenceSession, i + 1, parent=self.conf_key),
+            name='Session %d' % i, startDate=date(2016, 5, 1),
+            startTime=time(9, i * 15), duration=60,
+            speakerKey=self.speaker_keys[i // 2]) for i in xrange(3)]
+
+        self.assertEqual(session_columns.add_session(keynote), [])
+        self.assertEqual(session_columns.add_session(clash), [1])
+        self.assertEqual(session_columns.add_session(other_speaker), [])
+        columns = session_columns.get_columns(self.conf_key)
+        self.assertEqual(sorted(columns.columns()['ids']), [1, 3])
+
+    def assertKeptWhenPutDuringBuild(self, build_index):
+        ''' a session put, as _putSession does, while build_index reads the
+        sessions is in the index saved '''
+        ndb.put_multi(random_sessions(self.conf_key, 50, self.speaker_keys))
+        late = ConferenceSession(
+            key=ndb.Key(ConferenceSession, 100, parent=self.conf_key),
+            name='Late', startDate=date(2016, 5, 1), startTime=time(9),
+            duration=60, speakerKey=ndb.Key(ConferenceSpeaker, 100))
+
+        builds, putting = [], []
+        original = session_columns.build
+
+        def put_late():
+            putting.append(late)
+            self.assertEqual(session_columns.add_session(late), [])
+            late.put()
+
+        def build(conf_key):
+            columns = original(conf_key)
+            if putting:
+                return columns
+            builds.append(columns)
+            if len(builds) == 1:
+                ndb.non_transactional(ndb.transaction)(put_late)
+            return columns
+
+        session_columns.build = build
+        self.addCleanup(setattr, session_columns, 'build', original)
+        build_index(self.conf_key)
+
+        # the first build missed the late session and was retried
+        self.assertEqual(len(builds), 2)
+        ndb.get_context().clear_cache()
+        columns = session_columns.get_columns(self.conf_key)
+        self.assertIn(100, columns.columns()['ids'])
+        self.assertEqual(len(columns.columns()['ids']), 51)
+
+    def test_session_put_during_a_rebuild_is_kept(self):
+        self.assertKeptWhenPutDuringBuild(session_columns.rebuild)
+
+    def test_session_put_during_a_first_build_is_kept(self):
+        self.assertKeptWhenPutDuringBuild(session_columns.get_columns)
+
+    def test_wish_list_schedule_leaves_out_clashes(self):
+        api = ConferenceApi()
+        self.sign_in(api)
+        Profile(key=self.p_key, displayName='Ada',
+                mainEmail='ada@example.com').put()
+        speaker_key = ConferenceSpeaker(displayName='Grace').put()
+        # 9:00-10:00, 9:30-10:30 and 10:00-11:00
+        sessions = [ConferenceSession(
+            parent=self.conf_key, name='Session %d' % i,
+            startDate=date(2016, 5, 1), startTime=time(9 + i // 2,
+                                                       30 * (i % 2)),
+            duration=60, speakerKey=speaker_key) for i in xrange(3)]
+        ndb.put_multi(sessions)
+        ndb.put_multi([WishListItem.for_item(self.p_key, sess.key,
+                                             speaker_key)
+                       for sess in sessions])
+
+        schedule = api._getWishListSchedule()
+        self.assertEqual([item.name for item in schedule.sessions.items],
+                         ['Session 0', 'Session 2'])
+        self.assertEqual([item.name for item in schedule.conflicts.items],
+                         ['Session 1'])
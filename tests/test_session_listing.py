@@ -0,0 +1,107 @@
+"""
+test_session_listing.py -- Udacity conference server-side Python App Engine
+    the endpoints listing sessions run their query once and get the
+    distinct speakers of the sessions in a single batch
+"""
+
+from datetime import date
+from datetime import time
+
+from google.appengine.ext import ndb
+
+from tests.base import AppEngineTestCase
+
+from conference import ConferenceApi
+from models import Conference
+from models import ConferenceSession
+from models import ConferenceSpeaker
+from models import Profile
+import message_models as mm
+
+
+class SessionListingTest(AppEngineTestCase):
+
+    def setUp(self):
+        super(SessionListingTest, self).setUp()
+        self.api = ConferenceApi()
+        self.conf_key = Conference(parent=ndb.Key(Profile, 'ada@example.com'),
+                                   name='PyCon').put()
+        self.speakers = ndb.put_multi([ConferenceSpeaker(displayName='Grace'),
+                                       ConferenceSpeaker(displayName='Alan')])
+        # three sessions per speaker, all before 10 o'clock
+        self.names = {}
+        for i in xrange(6):
+            speaker_key = self.speakers[i % 2]
+            sess_key = ConferenceSession(
+                parent=self.conf_key, name='Session %d' % i,
+                type='Talk' if i < 3 else 'Workshop',
+                startDate=date(2016, 5, 1), startTime=time(9, i * 5),
+                duration=30, speakerKey=speaker_key).put()
+            self.names[sess_key.urlsafe()] = speaker_key.get().displayName
+        self.calls = self.count_calls()
+        self.speaker_gets = self.count_gets('ConferenceSpeaker')
+
+    def assertHydrated(self, forms, queries=1):
+        ''' the query ran once, each speaker was read once and the forms
+        have the name of the speaker of their session '''
+        self.assertEqual(self.calls.count('RunQuery'), queries)
+        self.assertEqual(len(self.speaker_gets), len(self.speakers))
+        self.assertEqual(len(forms.items), len(self.names))
+        for form in forms.items:
+            self.assertEqual(form.speakerName, self.names[form.sessionKey])
+
+    def test_conference_sessions(self):
+        request = mm.CONF_SESSIONS_REQUEST.combined_message_class(
+            websafeConferenceKey=self.conf_key.urlsafe())
+        self.assertHydrated(self.api.getConferenceSessions(request))
+
+    def test_conference_sessions_by_type(self):
+        request = mm.CONF_SESSION_TYPE_REQUEST.combined_message_class(
+            websafeConferenceKey=self.conf_key.urlsafe(),
+            typeOfSession=['Talk', 'Workshop'])
+        # IN runs a query per type
+        self.assertHydrated(
+            self.api.getConferenceSessionsByType(request), queries=2)
+
+    def test_query_problem(self):
+        request = mm.QUERY_PROBLEM.combined_message_class(afterTime=10)
+        # IN runs a query per hour before afterTime
+        self.assertHydrated(self.api._queryproblem(request), queries=10)
+
+    def test_sessions_by_speaker(self):
+        request = mm.SPEAKER_SESSION_GET_REQUEST.combined_message_class(
+            websafeSpeakerKey=self.speakers[0].urlsafe())
+        forms = self.api.getSessionsBySpeaker(request)
+
+        self.assertEqual(self.calls.count('RunQuery'), 1)
+        # the speaker is read once, to check that it exists
+        self.assertEqual(len(self.speaker_gets), 1)
+        self.assertEqual(len(forms.items), 3)
+        self.assertEqual(set(form.speakerName for form in forms.items),
+                         set(['Grace']))
+
+    def test_sessions_from_speaker_and_conference(self):
+        request = mm.GET_SESSIONS_BY_SPEAKER_CONFERENCE.combined_message_class(
+            websafeSpeakerKey=self.speakers[1].urlsafe(),
+            websafeConferenceKey=self.conf_key.urlsafe())
+        forms = self.api.getSessionsFromSpeakerAndConference(request)
+
+        self.assertEqual(self.calls.count('RunQuery'), 1)
+        self.assertEqual(len(self.speaker_gets), 1)
+        self.assertEqual(set(form.speakerName for form in forms.items),
+                         set(['Alan']))
+
+    def test_sessions_of_a_deleted_speaker(self):
+        self.speakers[1].delete()
+        request = mm.CONF_SESSIONS_REQUEST.combined_message_class(
+            websafeConferenceKey=self.conf_key.urlsafe())
+        forms = self.api.getConferenceSessions(request)
+
+        # the sessions are still listed, without a speaker
+        self.assertEqual(len(forms.items), len(self.names))
+        for form in forms.items:
+            if self.names[form.sessionKey] == 'Alan':
+                self.assertIsNone(form.speakerName)
+                self.assertIsNone(form.speakerKey)
+            else:
+                self.assertEqual(form.speakerName, 'Grace')
@@ -0,0 +1,75 @@
+"""
+test_speaker_index.py -- Udacity conference server-side Python App Engine
+    the directory of speaker names finds them by prefix and by similar
+    trigrams, and follows added, renamed and deleted speakers without
+    being rebuilt
+"""
+
+from google.appengine.api import memcache
+from google.appengine.ext import ndb
+
+from tests.base import AppEngineTestCase
+
+from models import ConferenceSpeaker
+from settings import MEMCACHE_SPEAKER_CHANGES_KEY
+from settings import MEMCACHE_SPEAKER_GENERATION_KEY
+import speaker_index
+
+
+class SpeakerIndexTest(AppEngineTestCase):
+
+    def setUp(self):
+        super(SpeakerIndexTest, self).setUp()
+        # the directory of the instance outlives a test
+        for name in ('_directory', '_generation', '_built_at'):
+            self.addCleanup(setattr, speaker_index, name,
+                            getattr(speaker_index, name))
+        speaker_index._directory = None
+        self.keys = ndb.put_multi([
+            ConferenceSpeaker(displayName=name) for name in
+            ('Grace Hopper', 'Alan Turing', 'Ada Lovelace', 'Alan Kay')])
+        speaker_index.bump(self.keys)
+        self.directory = speaker_index.get_directory()
+
+    def names(self, keys):
+        return [self.directory.names[key] for key in keys]
+
+    def test_complete(self):
+        self.assertEqual(self.names(self.directory.complete('al')),
+                         ['alan kay', 'alan turing'])
+        self.assertEqual(self.names(self.directory.complete('Al K')),
+                         ['alan kay'])
+        self.assertEqual(self.directory.complete('alice'), [])
+
+    def test_similar(self):
+        self.assertEqual(self.names(self.directory.similar('Alan Turring'))[0],
+                         'alan turing')
+
+    def test_changes_are_applied_without_rebuilding(self):
+        calls = self.count_calls()
+        speaker = ConferenceSpeaker(displayName='Alan Perlis')
+        speaker.put()
+        speaker_index.bump([speaker.key])
+        renamed = self.keys[3].get()
+        renamed.displayName = 'Alan Curtis Kay'
+        renamed.put()
+        speaker_index.bump([renamed.key])
+        self.keys[1].delete()
+
+        directory = speaker_index.get_directory()
+        self.assertIs(directory, self.directory)
+        self.assertEqual(self.names(directory.complete('alan')),
+                         ['alan perlis', 'alan curtis kay'])
+        self.assertEqual(directory.complete('turing'), [])
+        self.assertNotIn('RunQuery', calls)
+
+    def test_missing_changes_rebuild(self):
+        speaker = ConferenceSpeaker(displayName='Alan Perlis')
+        speaker.put()
+        speaker_index.bump([speaker.key])
+        memcache.delete(MEMCACHE_SPEAKER_CHANGES_KEY %
+                        memcache.get(MEMCACHE_SPEAKER_GENERATION_KEY))
+
+        directory = speaker_index.get_directory()
+        self.assertIsNot(directory, self.directory)
+        self.assertIn(speaker.key, directory.complete('perlis'))
@@ -0,0 +1,93 @@
+"""
+test_timetable.py -- Udacity conference server-side Python App Engine
+    the saved timetable of a conference stays the one built from its
+    sessions as sessions are put in it and it is rebuilt
+"""
+
+from datetime import date
+from datetime import time
+
+from google.appengine.api import datastore_errors
+from google.appengine.api import memcache
+from google.appengine.ext import ndb
+
+from tests.base import AppEngineTestCase
+
+from models import Conference
+from models import ConferenceSession
+from models import ConferenceSpeaker
+from models import Profile
+from settings import TIMETABLE_REBUILD_ATTEMPTS
+import timetable
+
+
+class TimetableTest(AppEngineTestCase):
+
+    def setUp(self):
+        super(TimetableTest, self).setUp()
+        self.conf_key = Conference(parent=ndb.Key(Profile, 'ada@example.com'),
+                                   name='PyCon').put()
+        self.speaker_key = ConferenceSpeaker(displayName='Grace').put()
+        self.session_keys = ndb.put_multi(
+            [self.session(day, hour) for day, hour in
+             ((2, 9), (1, 14), (1, 9), (1, 9))])
+
+    def session(self, day, hour, minute=0):
+        name = 'Session %d %d:%02d' % (day, hour, minute)
+        return ConferenceSession(
+            parent=self.conf_key, name=name,
+            startDate=date(2016, 5, day), startTime=time(hour, minute),
+            duration=30, speakerKey=self.speaker_key)
+
+    def assertUpToDate(self):
+        ''' the timetable, from memcache or the datastore, is the one built
+        from the sessions '''
+        ndb.get_context().clear_cache()
+        self.assertEqual(timetable.get_timetable(self.conf_key),
+                         timetable.build(self.conf_key))
+        memcache.flush_all()
+        self.assertEqual(timetable.get_timetable(self.conf_key),
+                         timetable.build(self.conf_key))
+
+    def test_slots(self):
+        form = timetable.get_timetable(self.conf_key)
+        self.assertEqual(
+            [(slot.startDate, slot.startTimeSlot, len(slot.items))
+             for slot in form.slots],
+            [('2016-05-01', 9, 2), ('2016-05-01', 14, 1),
+             ('2016-05-02', 9, 1)])
+        self.assertEqual(form.items, [])
+
+    def test_missing_conference(self):
+        self.conf_key.delete()
+        self.assertIsNone(timetable.get_timetable(self.conf_key))
+
+    def test_insert(self):
+        timetable.get_timetable(self.conf_key)
+        for day, hour, minute in ((1, 9, 30), (1, 11, 0), (3, 8, 0)):
+            session_key = self.session(day, hour, minute).put()
+            timetable.add_session(session_key)
+            # the task can run again
+            timetable.add_session(session_key)
+        self.assertUpToDate()
+
+    def test_insert_without_timetable_builds_it(self):
+        timetable.add_session(self.session(1, 10).put())
+        self.assertUpToDate()
+
+    def test_rebuild_after_removal(self):
+        timetable.get_timetable(self.conf_key)
+        ndb.delete_multi(self.session_keys[:2])
+        timetable.rebuild(self.conf_key)
+        self.assertUpToDate()
+
+    def test_rebuild_gives_up(self):
+        # as if sessions were added during every build
+        saves = []
+        original = timetable._save
+        timetable._save = lambda conf_key, form: saves.append(form)
+        self.addCleanup(setattr, timetable, '_save', original)
+
+        self.assertRaises(datastore_errors.TransactionFailedError,
+                          timetable.rebuild, self.conf_key)
+        self.assertEqual(len(saves), TIMETABLE_REBUILD_ATTEMPTS)
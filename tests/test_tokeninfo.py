@@ -0,0 +1,125 @@
+"""
+test_tokeninfo.py -- Udacity conference server-side Python App Engine
+    oauth tokens are resolved against a fake tokeninfo service: the user id
+    is cached in the instance and in memcache until the token expires and
+    failed lookups are retried
+"""
+
+import json
+import urlparse
+
+from google.appengine.api import apiproxy_stub
+from google.appengine.api import apiproxy_stub_map
+from google.appengine.api import memcache
+from google.appengine.ext import ndb
+
+from tests.base import AppEngineTestCase
+
+from settings import TOKEN_CACHE_LOCAL_TTL
+import utils
+
+FAKE_TOKENINFO_URL = 'http://tokeninfo.test/oauth2/v1/tokeninfo'
+
+
+class FakeTokeninfo(apiproxy_stub.APIProxyStub):
+
+    '''FakeTokeninfo -- urlfetch stub answering tokeninfo lookups from
+    tokens, a dict of token -> (user id, expires in); the statuses in
+    failures are sent first, one per call'''
+
+    def __init__(self, tokens):
+        super(FakeTokeninfo, self).__init__('urlfetch')
+        self.tokens = tokens
+        self.failures = []
+        self.urls = []
+
+    def _Dynamic_Fetch(self, request, response):
+        url = request.url()
+        self.urls.append(url)
+        if self.failures:
+            response.set_statuscode(self.failures.pop(0))
+            response.set_content('backend error')
+            return
+        query = urlparse.parse_qs(urlparse.urlparse(url).query)
+        token = (query.get('id_token') or query.get('access_token'))[0]
+        if token not in self.tokens:
+            response.set_statuscode(400)
+            response.set_content(json.dumps({'error': 'invalid_token'}))
+            return
+        user_id, expires_in = self.tokens[token]
+        response.set_statuscode(200)
+        response.set_content(json.dumps({'user_id': user_id,
+                                         'expires_in': expires_in}))
+
+
+class Clock(object):
+
+    '''Clock -- stands for the time module in utils, moved by hand'''
+
+    def __init__(self, now):
+        self.now = now
+
+    def time(self):
+        return self.now
+
+
+class TokeninfoTest(AppEngineTestCase):
+
+    def setUp(self):
+        super(TokeninfoTest, self).setUp()
+        self.tokeninfo = FakeTokeninfo({'token': ('1234', 3600)})
+        apiproxy_stub_map.apiproxy.RegisterStub('urlfetch', self.tokeninfo)
+        self.clock = Clock(utils.time.time())
+        for name, value in (('TOKENINFO_URL', FAKE_TOKENINFO_URL),
+                            ('time', self.clock),
+                            ('_token_cache', {})):
+            self.addCleanup(setattr, utils, name, getattr(utils, name))
+            setattr(utils, name, value)
+
+    def resolve(self, token='token'):
+        user_id = utils.resolve_token_async(token).get_result()
+        # a new request
+        ndb.get_context().clear_cache()
+        return user_id
+
+    def test_miss_then_hits(self):
+        self.assertEqual(self.resolve(), '1234')
+        self.assertEqual(len(self.tokeninfo.urls), 1)
+        self.assertTrue(self.tokeninfo.urls[0].startswith(
+            FAKE_TOKENINFO_URL + '?id_token='))
+
+        # from the instance, then from memcache on another instance
+        self.assertEqual(self.resolve(), '1234')
+        utils._token_cache.clear()
+        self.assertEqual(self.resolve(), '1234')
+        self.assertEqual(len(self.tokeninfo.urls), 1)
+
+    def test_expiry(self):
+        self.resolve()
+        # the instance keeps it for TOKEN_CACHE_LOCAL_TTL, then memcache
+        self.clock.now += TOKEN_CACHE_LOCAL_TTL + 1
+        self.assertEqual(self.resolve(), '1234')
+        self.assertEqual(len(self.tokeninfo.urls), 1)
+
+        # the token expired, memcache dropped it
+        self.clock.now += 3600
+        memcache.flush_all()
+        self.tokeninfo.tokens['token'] = ('5678', 3600)
+        self.assertEqual(self.resolve(), '5678')
+        self.assertEqual(len(self.tokeninfo.urls), 2)
+
+    def test_retry_after_transient_error(self):
+        self.tokeninfo.failures = [503]
+        self.assertEqual(self.resolve(), '1234')
+        self.assertEqual(len(self.tokeninfo.urls), 2)
+
+    def test_failures_are_not_cached(self):
+        self.tokeninfo.failures = [503, 503, 503]
+        self.assertEqual(self.resolve(), '')
+        self.assertEqual(self.resolve(), '1234')
+        self.assertEqual(len(self.tokeninfo.urls), 4)
+
+    def test_invalid_id_token_is_tried_as_access_token(self):
+        self.assertEqual(self.resolve('unknown'), '')
+        self.assertEqual(len(self.tokeninfo.urls), 3)
+        self.assertIn('?access_token=unknown', self.tokeninfo.urls[-1])
@@ -0,0 +1,176 @@
+"""
+timetable.py -- Udacity conference server-side Python App Engine
+    materialized timetable of the sessions of a conference
+
+    the timetable, the sessions ordered by start and grouped by day and
+    startTimeSlot with the speaker names inlined, is a ConferenceSessionForms
+    kept zlib compressed in a Timetable entity (a child of the Conference)
+    and in memcache, so reading it is a single get; a new session is put in
+    it by a task, removing sessions rebuilds it
+"""
+
+import zlib
+
+from google.appengine.api import memcache
+from google.appengine.api import taskqueue
+from google.appengine.api import datastore_errors
+from google.appengine.ext import ndb
+from protorpc import protojson
+
+from models import ConferenceSession
+from settings import MEMCACHE_TIMETABLE_KEY
+from settings import TIMETABLE_REBUILD_ATTEMPTS
+
+import entity_cache
+import message_models as mm
+
+# how long a dropped memcache entry can't be put back, so a reader that got
+# the entity before the change can't cache it again
+_INVALIDATE_LOCK = 10
+
+
+class Timetable(ndb.Model):
+
+    '''Timetable -- the compressed ConferenceSessionForms of the timetable
+    of a conference, its sessions are in slots and items is empty'''
+    data = ndb.BlobProperty()
+
+
+def _key(conf_key):
+    return ndb.Key(Timetable, 1, parent=conf_key)
+
+
+def _cache_key(conf_key):
+    return MEMCACHE_TIMETABLE_KEY % conf_key.urlsafe()
+
+
+def _encode(form):
+    return zlib.compress(protojson.encode_message(form))
+
+
+def _decode(data):
+    return protojson.decode_message(mm.ConferenceSessionForms,
+                                    zlib.decompress(data))
+
+
+def _order(item):
+    ''' sort key of a ConferenceSessionFormOut; dates and times are ISO
+    strings, they sort as they read '''
+    return item.startDate, item.startTime, item.name, item.sessionKey
+
+
+def _slots(items):
+    ''' groups ordered session forms by day and startTimeSlot '''
+    slots = []
+    for item in items:
+        slot = int(item.startTime.split(':')[0])
+        if not slots or (slots[-1].startDate, slots[-1].startTimeSlot) != \
+                (item.startDate, slot):
+            slots.append(mm.SessionSlotForm(startDate=item.startDate,
+                                            startTimeSlot=slot))
+        slots[-1].items.append(item)
+    return slots
+
+
+def build(conf_key):
+    ''' returns the timetable of a conference built from its sessions '''
+    sessions = ConferenceSession.query(ancestor=conf_key).fetch()
+    items = sorted(ConferenceSession.to_forms(sessions), key=_order)
+    return mm.ConferenceSessionForms(slots=_slots(items))
+
+
+def _drop_cached(conf_key):
+    ndb.get_context().call_on_commit(lambda: memcache.delete(
+        _cache_key(conf_key), seconds=_INVALIDATE_LOCK))
+
+
+@ndb.transactional()
+def _save(conf_key, form):
+    ''' saves a timetable built outside of the transaction (the speakers
+    are in other entity groups), returns its data or None if sessions were
+    added or removed since '''
+    session_keys = ConferenceSession.query(ancestor=conf_key).fetch(
+        keys_only=True)
+    if sorted(key.urlsafe() for key in session_keys) != sorted(
+            item.sessionKey for slot in form.slots for item in slot.items):
+        return None
+    timetable = Timetable(key=_key(conf_key), data=_encode(form))
+    timetable.put()
+    _drop_cached(conf_key)
+    return timetable.data
+
+
+def rebuild(conf_key):
+    ''' rebuilds and saves the timetable of a conference, returns its
+    data; gives up after TIMETABLE_REBUILD_ATTEMPTS builds that sessions
+    were added to or removed from, so a task is retried with the backoff
+    of its queue '''
+    for _ in xrange(TIMETABLE_REBUILD_ATTEMPTS):
+        data = _save(conf_key, build(conf_key))
+        if data is not None:
+            return data
+    raise datastore_errors.TransactionFailedError(
+        'the sessions of %s kept changing during the timetable rebuild' %
+        conf_key.urlsafe())
+
+
+@ndb.transactional()
+def _insert(conf_key, item):
+    ''' puts a session form in the timetable of conf_key, a session that
+    is already in it is left alone; returns False if there is no timetable
+    yet '''
+    timetable = _key(conf_key).get()
+    if not timetable:
+        return False
+    form = _decode(timetable.data)
+    items = [slot_item for slot in form.slots for slot_item in slot.items]
+    if item.sessionKey in set(slot_item.sessionKey for slot_item in items):
+        return True
+    items.append(item)
+    items.sort(key=_order)
+    form.slots = _slots(items)
+
+    timetable.data = _encode(form)
+    timetable.put()
+    _drop_cached(conf_key)
+    return True
+
+
+def add_session(session_key):
+    ''' puts a new session in the timetable of its conference, reading and
+    writing the timetable once; the task can be retried '''
+    session = session_key.get()
+    if not session:
+        return
+    item = ConferenceSession.to_forms([session])[0]
+    if not _insert(session_key.parent(), item):
+        rebuild(session_key.parent())
+
+
+def queue_add(session_key):
+    ''' queues putting a new session in its timetable, only if the current
+    transaction commits '''
+    taskqueue.add(params={'websafeSessionKey': session_key.urlsafe()},
+                  url='/tasks/update_timetable',
+                  transactional=ndb.in_transaction())
+
+
+def queue_rebuild(conf_key):
+    ''' queues rebuilding the timetable of a conference '''
+    taskqueue.add(params={'websafeConferenceKey': conf_key.urlsafe()},
+                  url='/tasks/update_timetable')
+
+
+def get_timetable(conf_key):
+    ''' returns the timetable of a conference, from memcache or else from
+    the datastore (putting it back in memcache), built on first use; None
+    if the conference doesn't exist '''
+    cache_key = _cache_key(conf_key)
+    data = memcache.get(cache_key)
+    if data is None:
+        timetable, conf = _key(conf_key).get(), entity_cache.get(conf_key)
+        if not conf:
+            return None
+        data = timetable.data if timetable else rebuild(conf_key)
+        memcache.add(cache_key, data)
+    return _decode(data)
@@ -1,11 +1,17 @@
 
+import hashlib
 import json
 import os
 import time
 import uuid
 import re
 
-from google.appengine.api import urlfetch
+from google.appengine.ext import ndb
+
+from settings import TOKENINFO_URL
+from settings import TOKEN_CACHE_LOCAL_SIZE
+from settings import TOKEN_CACHE_LOCAL_TTL
+from settings import MEMCACHE_TOKEN_KEY
 
 from datetime import datetime
 import datetime as datetimeTypes
@@ -19,9 +25,20 @@ def is_valid_name(name):
     return regex.match(name) is not None
 
 
+# token hash -> (user id, expiry timestamp), kept for the instance lifetime
+_token_cache = {}
+
+
 def getUserId(user, id_type="email"):
+    return getUserIdAsync(user, id_type).get_result()
+
+
+@ndb.tasklet
+def getUserIdAsync(user, id_type="email"):
+    ''' tasklet version of getUserId, the oauth token lookup runs alongside
+    the other rpcs of the request '''
     if id_type == "email":
-        return user.email()
+        raise ndb.Return(user.email())
 
     if id_type == "oauth":
         """A workaround implementation for getting userid."""
@@ -30,22 +47,59 @@ def getUserId(user, id_type="email"):
         token_type = 'id_token'
         if 'OAUTH_USER_ID' in os.environ:
             token_type = 'access_token'
-        url = ('https://www.googleapis.com/oauth2/v1/tokeninfo?%s=%s'
-               % (token_type, token))
-        user = {}
-        wait = 1
-        for i in range(3):
-            resp = urlfetch.fetch(url)
-            if resp.status_code == 200:
-                user = json.loads(resp.content)
-                break
-            elif resp.status_code == 400 and 'invalid_token' in resp.content:
-                url = ('https://www.googleapis.com/oauth2/v1/tokeninfo?%s=%s'
-                       % ('access_token', token))
-            else:
-                time.sleep(wait)
-                wait = wait + i
-        return user.get('user_id', '')
+        user_id = yield resolve_token_async(token, token_type)
+        raise ndb.Return(user_id)
+
+
+@ndb.tasklet
+def resolve_token_async(token, token_type='id_token'):
+    ''' returns the user id of an oauth token, cached in the instance and in
+    memcache until the token expires, '' if it can't be resolved '''
+    token_hash = hashlib.sha1(token).hexdigest()
+    now = time.time()
+    cached = _token_cache.get(token_hash)
+    if cached and cached[1] > now:
+        raise ndb.Return(cached[0])
+
+    ctx = ndb.get_context()
+    cached = yield ctx.memcache_get(MEMCACHE_TOKEN_KEY % token_hash)
+    if cached is None:
+        info = yield _fetch_tokeninfo_async(token, token_type)
+        user_id = info.get('user_id', '')
+        expires_in = int(info.get('expires_in', 0))
+        # failures are not cached, neither are tokens about to expire
+        if not user_id or expires_in <= 0:
+            raise ndb.Return(user_id)
+        cached = (user_id, now + expires_in)
+        yield ctx.memcache_set(MEMCACHE_TOKEN_KEY % token_hash, cached,
+                               time=expires_in)
+
+    if len(_token_cache) >= TOKEN_CACHE_LOCAL_SIZE:
+        _token_cache.clear()
+    user_id, expires = cached
+    _token_cache[token_hash] = (
+        user_id, min(expires, now + TOKEN_CACHE_LOCAL_TTL))
+    raise ndb.Return(user_id)
+
+
+@ndb.tasklet
+def _fetch_tokeninfo_async(token, token_type='id_token'):
+    ''' looks the token up on TOKENINFO_URL, up to 3 tries; an id_token
+    rejected as invalid is tried again as an access_token and failed calls
+    are retried after a wait that lets other rpcs of the request run '''
+    ctx = ndb.get_context()
+    wait = 1
+    for i in range(3):
+        resp = yield ctx.urlfetch('%s?%s=%s' % (TOKENINFO_URL, token_type,
+                                                token))
+        if resp.status_code == 200:
+            raise ndb.Return(json.loads(resp.content))
+        elif resp.status_code == 400 and 'invalid_token' in resp.content:
+            token_type = 'access_token'
+        elif i < 2:
+            yield ndb.sleep(wait)
+            wait = wait + i
+    raise ndb.Return({})
 
 
 def make_date(date_string):